@@ -0,0 +1,56 @@
+"""Micro-benchmark of the override tag parser on a synthetic KFX script.
+
+Run with ``python -m benchmarks.bench_parse_line [events]``.
+"""
+import random
+import sys
+import time
+
+from subpy.fonts import State, TagCache, parse_line
+
+SYLLABLES = ["ka", "ra", "o", "ke", "shi", "n", "ji", "tsu", "yo", "mi"]
+STYLES = {
+    "Romaji": State("Lato", False, 400, False),
+    "Kanji": State("Source Code Pro", False, 700, False),
+}
+
+
+def generate_kfx_lines(count: int, seed: int = 1) -> list[tuple[str, State]]:
+    """Per-syllable KFX events: every syllable of a line is repeated on every frame of its effect."""
+    rng = random.Random(seed)
+    lines: list[tuple[str, State]] = []
+    while len(lines) < count:
+        style = rng.choice(list(STYLES.values()))
+        x = rng.randrange(100, 1800, 20)
+        y = rng.choice([80, 1000])
+        for syl in rng.choices(SYLLABLES, k=8):
+            for frame in range(12):
+                lines.append(
+                    (
+                        rf"{{\an5\pos({x},{y})\blur2\bord3\fad(0,100)\t(0,200,\fscx120\fscy120)"
+                        rf"\fnLato\b1\i0}}{syl}{{\rRomaji\alpha&HFF&\k{frame * 5}}}{syl}",
+                        style,
+                    )
+                )
+            x += 40
+    return lines[:count]
+
+
+def bench(lines: list[tuple[str, State]], cache: TagCache | None) -> float:
+    start = time.perf_counter()
+    for text, style in lines:
+        for _ in parse_line(text, style, STYLES, cache):
+            pass
+    return len(lines) / (time.perf_counter() - start)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    lines = generate_kfx_lines(count)
+    print(f"parse_line on {count} synthetic KFX events")
+    print(f"  without tag cache: {bench(lines, None):>10.0f} events/s")
+    print(f"  with tag cache:    {bench(lines, {}):>10.0f} events/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""Generators of synthetic scripts and fonts for the benchmarks.
+
+Everything is generated from a seed, so the same scale always gives the same corpus.
+"""
+from __future__ import annotations
+
+import random
+from dataclasses import dataclass
+from pathlib import Path
+
+from fontTools.fontBuilder import FontBuilder
+from fontTools.misc.timeTools import timestampFromString
+from fontTools.pens.ttGlyphPen import TTGlyphPen
+from fontTools.ttLib import ttFont
+
+from subpy.font_subset import subset_font
+
+SYLLABLES = ["ka", "ra", "o", "ke", "shi", "n", "ji", "tsu", "yo", "mi", "ga", "ku", "se", "ta", "no"]
+WORDS = [
+    "hello", "world", "what", "are", "you", "doing", "here", "tomorrow", "never", "again", "sorry",
+    "wait", "the", "train", "leaves", "at", "five", "café", "naïve", "déjà", "vu", "ありがとう", "先輩",
+    "大丈夫", "さよなら", "本当", "…", "—", "“quoted”",
+]  # fmt: skip
+BASE_CODEPOINTS = [*range(0x20, 0x7F), *range(0xA0, 0x100), 0x2014, 0x2026, 0x201C, 0x201D]
+CJK_CODEPOINTS = [*range(0x3041, 0x3097), *range(0x30A1, 0x30FB), *range(0x4E00, 0x5600)]
+# codepoints of every glyph used by WORDS that are not in BASE_CODEPOINTS
+WORD_CODEPOINTS = sorted({ord(char) for word in WORDS for char in word} - set(BASE_CODEPOINTS))
+# subfamily, weight, italic
+FONT_STYLES = [("Regular", 400, False), ("Italic", 400, True), ("Bold", 700, False), ("Bold Italic", 700, True)]
+STYLE_FORMAT = (
+    "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, "
+    "Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, "
+    "MarginR, MarginV, Encoding"
+)
+# fixed date of the generated fonts, so they are the same on every run
+FONT_TIMESTAMP = timestampFromString("Mon Jan  1 00:00:00 2024")
+EVENT_FORMAT = "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text"
+
+
+def family_name(number: int) -> str:
+    return f"Bench Sans {number:02d}"
+
+
+def ass_time(ms: int) -> str:
+    cs = ms // 10
+    return f"{cs // 360000}:{cs // 6000 % 60:02d}:{cs // 100 % 60:02d}.{cs % 100:02d}"
+
+
+def style_line(name: str, font: str, size: int = 60, bold: bool = False, italic: bool = False) -> str:
+    return (
+        f"Style: {name},{font},{size},&H00FFFFFF,&H000000FF,&H00000000,&H00000000,"
+        f"{-1 if bold else 0},{-1 if italic else 0},0,0,100,100,0,0,1,2,0,2,10,10,10,1"
+    )
+
+
+def event_line(start: int, end: int, style: str, text: str, layer: int = 0, actor: str = "", effect: str = "") -> str:
+    kind = "Comment" if effect else "Dialogue"
+    return f"{kind}: {layer},{ass_time(start)},{ass_time(end)},{style},{actor},0,0,0,{effect},{text}"
+
+
+def script_text(styles: list[str], events: list[str], title: str) -> str:
+    return "\n".join(
+        [
+            "[Script Info]",
+            f"Title: {title}",
+            "ScriptType: v4.00+",
+            "PlayResX: 1920",
+            "PlayResY: 1080",
+            "",
+            "[Aegisub Project Garbage]",
+            "Video File: bench.mkv",
+            "Active Line: 0",
+            "",
+            "[V4+ Styles]",
+            STYLE_FORMAT,
+            *styles,
+            "",
+            "[Events]",
+            EVENT_FORMAT,
+            *events,
+            "",
+        ]
+    )
+
+
+def generate_dialog_script(events: int = 5_000, families: int = 4, chapters: int = 6, seed: int = 1) -> str:
+    """Dialog of an episode, with a few italics, font overrides and chapter comments."""
+    rng = random.Random(seed)
+    styles = [
+        style_line("Default", family_name(0)),
+        style_line("Italic", family_name(0), italic=True),
+        style_line("Top", family_name(min(1, families - 1)), bold=True),
+    ]
+    lines: list[str] = []
+    chapter_every = max(1, events // chapters)
+    time = 0
+    for index in range(events):
+        if index % chapter_every == 0 and index // chapter_every < chapters:
+            name = f"Part {index // chapter_every + 1}"
+            lines.append(event_line(time, time, "Default", f"{{{name}}}", actor="chapter", effect="chapter"))
+        words = rng.choices(WORDS, k=rng.randint(3, 12))
+        if rng.random() < 0.2:
+            words[rng.randrange(len(words))] = rf"{{\i1}}{rng.choice(WORDS)}{{\i0}}"
+        if rng.random() < 0.05:
+            words.insert(0, rf"{{\fn{family_name(rng.randrange(families))}\b1}}")
+        duration = rng.randint(800, 4000)
+        lines.append(
+            event_line(time, time + duration, rng.choice(["Default", "Default", "Italic", "Top"]), " ".join(words))
+        )
+        time += duration + rng.randint(0, 500)
+    return script_text(styles, lines, "Dialog")
+
+
+def generate_kfx_script(events: int = 100_000, families: int = 4, seed: int = 2) -> str:
+    """OP/ED karaoke effect: every syllable of a line repeated on every frame, with heavy override tags."""
+    rng = random.Random(seed)
+    styles = [style_line("Romaji", family_name(0), 50), style_line("Kanji", family_name(1 % families), 70, bold=True)]
+    lines = [
+        event_line(0, 0, "Romaji", r"{\an5\pos($x,$y)\blur2}", 0, "", "template syl"),
+        event_line(0, 0, "Romaji", "function bench() end", 0, "", "code once"),
+        event_line(0, 0, "Romaji", "", 0, "", "sync"),
+    ]
+    start = 0
+    while len(lines) < events:
+        style = rng.choice(["Romaji", "Kanji"])
+        font = family_name(rng.randrange(families))
+        x, y = rng.randrange(100, 1800, 20), rng.choice([80, 1000])
+        for syl in rng.choices(SYLLABLES, k=8):
+            for frame in range(12):
+                frame_start = start + frame * 42
+                lines.append(
+                    event_line(
+                        frame_start,
+                        frame_start + 42,
+                        style,
+                        rf"{{\an5\pos({x},{y})\blur2\bord3\fad(0,100)\t(0,200,\fscx120\fscy120)"
+                        rf"\fn{font}\b1\i0\1c&H{rng.randrange(1 << 24):06X}&}}{syl}"
+                        rf"{{\r{style}\alpha&HFF&\k{frame * 5}}}{syl}",
+                        layer=frame % 3,
+                    )
+                )
+            x += 40
+        start += 4000
+    return script_text(styles, lines[:events], "KFX")
+
+
+def generate_styles_script(styles: int = 2_000, families: int = 4, seed: int = 3) -> str:
+    """Typesetting with a style per sign, each used by a few events and reset tags."""
+    rng = random.Random(seed)
+    style_lines: list[str] = []
+    lines: list[str] = []
+    for index in range(styles):
+        name = f"Sign {index:04d}"
+        bold, italic = rng.random() < 0.3, rng.random() < 0.2
+        style_lines.append(style_line(name, family_name(rng.randrange(families)), rng.randint(20, 90), bold, italic))
+        for _ in range(3):
+            start = rng.randrange(0, 1_440_000, 10)
+            other = f"Sign {rng.randrange(styles):04d}"
+            lines.append(
+                event_line(
+                    start, start + 2000, name, rf"{{\pos(960,540)}}{rng.choice(WORDS)} {{\r{other}}}{rng.choice(WORDS)}"
+                )
+            )
+    return script_text(style_lines, lines, "Styles")
+
+
+def _box_glyph():
+    pen = TTGlyphPen(None)
+    pen.moveTo((50, 0))
+    pen.lineTo((50, 700))
+    pen.lineTo((550, 700))
+    pen.lineTo((550, 0))
+    pen.closePath()
+    return pen.glyph()
+
+
+def build_base_font(subfamily: str, weight: int, italic: bool) -> ttFont.TTFont:
+    """A font of boxes covering BASE_CODEPOINTS and CJK_CODEPOINTS, to be subset into the families."""
+    codepoints = sorted({*BASE_CODEPOINTS, *CJK_CODEPOINTS, *WORD_CODEPOINTS})
+    glyph_names = {cp: f"uni{cp:04X}" for cp in codepoints}
+    glyph_order = [".notdef", *glyph_names.values()]
+    builder = FontBuilder(1000, isTTF=True)
+    builder.setupGlyphOrder(glyph_order)
+    builder.setupCharacterMap(glyph_names)
+    builder.setupGlyf({name: _box_glyph() for name in glyph_order})
+    builder.setupHorizontalMetrics({name: (600, 50) for name in glyph_order})
+    builder.setupHorizontalHeader(ascent=800, descent=-200)
+    family = "Bench Base"
+    builder.setupNameTable(
+        {
+            "familyName": family,
+            "styleName": subfamily,
+            "uniqueFontIdentifier": f"{family} {subfamily}",
+            "fullName": f"{family} {subfamily}",
+            "psName": f"{family}-{subfamily}".replace(" ", ""),
+        }
+    )
+    bold = weight >= 700
+    fs_selection = (1 if italic else 0) | (1 << 5 if bold else 0) | (1 << 6 if not (bold or italic) else 0)
+    builder.setupOS2(usWeightClass=weight, fsSelection=fs_selection, sTypoAscender=800, sTypoDescender=-200)
+    builder.setupPost()
+    builder.font["head"].macStyle = (1 if bold else 0) | (2 if italic else 0)
+    builder.font["head"].created = builder.font["head"].modified = FONT_TIMESTAMP
+    builder.font.recalcTimestamp = False
+    return builder.font
+
+
+def generate_font_folder(folder: Path, families: int = 4, seed: int = 4) -> list[Path]:
+    """Write the four styles of `families` families, subset from the base fonts with varying CJK coverage."""
+    rng = random.Random(seed)
+    folder.mkdir(parents=True, exist_ok=True)
+    base_fonts: list[Path] = []
+    for subfamily, weight, italic in FONT_STYLES:
+        base_font = folder / f"base-{subfamily.replace(' ', '')}.ttf.tmp"
+        build_base_font(subfamily, weight, italic).save(str(base_font))
+        base_fonts.append(base_font)
+    fonts: list[Path] = []
+    for number in range(families):
+        coverage = rng.uniform(0.2, 1.0)
+        codepoints = {*BASE_CODEPOINTS, *(cp for cp in [*CJK_CODEPOINTS, *WORD_CODEPOINTS] if rng.random() < coverage)}
+        for base_font, (subfamily, _, _) in zip(base_fonts, FONT_STYLES):
+            font = subset_font(str(base_font), 0, codepoints, family_name(number))
+            target = folder / f"BenchSans{number:02d}-{subfamily.replace(' ', '')}.ttf"
+            font.save(str(target))
+            font.close()
+            fonts.append(target)
+    for base_font in base_fonts:
+        base_font.unlink()
+    return fonts
+
+
+@dataclass
+class Corpus:
+    dialog: Path
+    kfx: Path
+    styles: Path
+    fonts: Path
+
+
+def generate_corpus(folder: Path, scale: float = 1.0) -> Corpus:
+    """Write every input of the benchmarks to `folder`, reusing the files of a previous run at the same scale."""
+    folder = folder / f"scale-{scale:g}"
+    corpus = Corpus(folder / "dialog.ass", folder / "kfx.ass", folder / "styles.ass", folder / "fonts")
+    if (folder / "done").exists():
+        return corpus
+    folder.mkdir(parents=True, exist_ok=True)
+    families = max(2, round(6 * scale))
+    corpus.dialog.write_text(generate_dialog_script(max(100, int(5_000 * scale)), families), encoding="utf-8")
+    corpus.kfx.write_text(generate_kfx_script(max(1_000, int(100_000 * scale)), families), encoding="utf-8")
+    corpus.styles.write_text(generate_styles_script(max(50, int(2_000 * scale)), families), encoding="utf-8")
+    generate_font_folder(corpus.fonts, families)
+    (folder / "done").touch()
+    return corpus
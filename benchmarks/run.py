@@ -0,0 +1,185 @@
+"""Timing and memory benchmarks of the main subpy operations on a synthetic corpus.
+
+Run with ``python -m benchmarks.run``. The results are printed as JSON, or written to ``--output``.
+With ``--baseline``, they are compared to the results of a previous run and the exit status is 1
+when a benchmark got slower or uses more memory than the baseline by more than ``--threshold``.
+
+The corpus is generated in ``--corpus`` (a temporary folder by default) and nothing is downloaded.
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable
+from dataclasses import dataclass
+from pathlib import Path
+
+from subpy import __version__
+from subpy.chapters import get_chapters_from_ass
+from subpy.fonts import FontCollection, find_fonts, validate_fonts
+from subpy.merger import merge_ass_and_sync
+from subpy.reader import read_ass
+from subpy.writer import write_ass
+
+from .corpus import Corpus, generate_corpus
+
+# Bump this whenever the JSON layout changes
+RESULTS_VERSION = 1
+# Changes below these are noise, whatever the threshold
+TIME_SLACK = 0.002
+MEMORY_SLACK = 64 * 1024
+
+
+@dataclass
+class Benchmark:
+    name: str
+    #: prepares the arguments of `run`, not timed
+    setup: Callable[[], tuple]
+    run: Callable[..., object]
+
+
+def make_benchmarks(corpus: Corpus) -> list[Benchmark]:
+    fonts_cache: list[FontCollection] = []
+
+    def font_collection() -> FontCollection:
+        # read the fonts once, every run gets a collection with an empty match cache
+        if not fonts_cache:
+            fonts_cache.append(find_fonts(corpus.fonts, jobs=1)[0])
+        return fonts_cache[0].restrict([font.fontfile for font in fonts_cache[0].fonts])
+
+    def merge_inputs() -> tuple:
+        return read_ass(corpus.dialog), read_ass(corpus.kfx), 60_000
+
+    return [
+        Benchmark("read_ass[dialog]", lambda: (corpus.dialog,), read_ass),
+        Benchmark("read_ass[kfx]", lambda: (corpus.kfx,), read_ass),
+        Benchmark("read_ass[styles]", lambda: (corpus.styles,), read_ass),
+        Benchmark("merge_ass_and_sync[dialog+kfx]", merge_inputs, merge_ass_and_sync),
+        Benchmark(
+            "merge_ass_and_sync[dialog+styles]",
+            lambda: (read_ass(corpus.dialog), read_ass(corpus.styles)),
+            merge_ass_and_sync,
+        ),
+        Benchmark("write_ass[kfx]", lambda: (read_ass(corpus.kfx), io.StringIO()), write_ass),
+        Benchmark("write_ass[styles]", lambda: (read_ass(corpus.styles), io.StringIO()), write_ass),
+        Benchmark("get_chapters_from_ass[dialog]", lambda: (read_ass(corpus.dialog),), get_chapters_from_ass),
+        Benchmark("find_fonts", lambda: (corpus.fonts,), lambda folder: find_fonts(folder, jobs=1)),
+        Benchmark("find_fonts[lazy]", lambda: (corpus.fonts,), lambda folder: find_fonts(folder, lazy=True, jobs=1)),
+        Benchmark("validate_fonts[dialog]", lambda: (read_ass(corpus.dialog), font_collection()), validate_fonts),
+        Benchmark("validate_fonts[kfx]", lambda: (read_ass(corpus.kfx), font_collection()), validate_fonts),
+        Benchmark("validate_fonts[styles]", lambda: (read_ass(corpus.styles), font_collection()), validate_fonts),
+    ]
+
+
+def measure(benchmark: Benchmark, repeat: int) -> dict:
+    """Time `repeat` runs of `benchmark`, then trace the memory allocated by one more run."""
+    times: list[float] = []
+    for _ in range(repeat):
+        args = benchmark.setup()
+        gc.collect()
+        start = time.perf_counter()
+        benchmark.run(*args)
+        times.append(time.perf_counter() - start)
+        del args
+    args = benchmark.setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        benchmark.run(*args)
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "seconds": min(times),
+        "median": statistics.median(times),
+        "repeat": repeat,
+        "peak_memory": peak_memory,
+    }
+
+
+def run_benchmarks(corpus: Corpus, repeat: int = 3, only: list[str] | None = None) -> dict[str, dict]:
+    results: dict[str, dict] = {}
+    for benchmark in make_benchmarks(corpus):
+        if only and not any(pattern in benchmark.name for pattern in only):
+            continue
+        print(f"[?] Running {benchmark.name}...", file=sys.stderr)
+        results[benchmark.name] = measure(benchmark, repeat)
+    return results
+
+
+def compare(results: dict[str, dict], baseline: dict[str, dict], threshold: float) -> list[str]:
+    """Print the change of every benchmark against `baseline`. Returns the names of the regressed benchmarks."""
+    regressions: list[str] = []
+    print(f"  {'Benchmark':<36} {'Time':>9} {'Base':>9} {'Change':>8} {'Memory':>9} {'Base':>9} {'Change':>8}")
+    for name, result in results.items():
+        if (base := baseline.get(name)) is None:
+            print(f"  {name:<36} {result['seconds']:>8.3f}s {'-':>9} {'new':>8}")
+            continue
+        time_change = result["seconds"] / base["seconds"] - 1 if base["seconds"] else 0.0
+        memory_change = result["peak_memory"] / base["peak_memory"] - 1 if base["peak_memory"] else 0.0
+        regressed = (time_change > threshold and result["seconds"] - base["seconds"] > TIME_SLACK) or (
+            memory_change > threshold and result["peak_memory"] - base["peak_memory"] > MEMORY_SLACK
+        )
+        if regressed:
+            regressions.append(name)
+        print(
+            f"  {name:<36} {result['seconds']:>8.3f}s {base['seconds']:>8.3f}s {time_change:>+8.1%} "
+            f"{result['peak_memory'] / 2**20:>7.1f}MB {base['peak_memory'] / 2**20:>7.1f}MB {memory_change:>+8.1%}"
+            + (" [!]" if regressed else "")
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark subpy on a synthetic corpus")
+    parser.add_argument("--scale", type=float, default=1.0, help="Size of the corpus, 1 is a 100k events KFX script")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed runs of every benchmark")
+    parser.add_argument("--corpus", type=Path, help="Folder of the generated corpus, reused between runs")
+    parser.add_argument("-k", "--only", action="append", help="Only run the benchmarks containing this text")
+    parser.add_argument("-o", "--output", type=Path, help="Write the results to this JSON file")
+    parser.add_argument("--baseline", type=Path, help="Compare the results to this JSON file of a previous run")
+    parser.add_argument(
+        "--threshold", type=float, default=0.1, help="Allowed slowdown or memory increase (default: 0.1 for 10%%)"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="subpy-bench-") as temp_dir:
+        print("[?] Generating corpus...", file=sys.stderr)
+        corpus = generate_corpus(args.corpus or Path(temp_dir), args.scale)
+        results = run_benchmarks(corpus, args.repeat, args.only)
+
+    report = {
+        "version": RESULTS_VERSION,
+        "subpy": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scale": args.scale,
+        "results": results,
+    }
+    if args.output is not None:
+        args.output.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.baseline is not None:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        if baseline.get("scale") != args.scale:
+            print(f"[!] Baseline was run at scale {baseline.get('scale')}, not {args.scale}", file=sys.stderr)
+        # keep stdout for the JSON when it is printed there
+        with contextlib.redirect_stdout(sys.stderr) if args.output is None else contextlib.nullcontext():
+            regressions = compare(results, baseline["results"], args.threshold)
+            if regressions:
+                print(f"[!] Regressed benchmark(s): {', '.join(regressions)}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
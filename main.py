@@ -1,116 +1,40 @@
+from __future__ import annotations
+
 import argparse
+import contextlib
+import io
+import os
 import sys
+import time
+import traceback
+from dataclasses import asdict, dataclass, field
 from pathlib import Path
-from zipfile import ZIP_DEFLATED, ZipFile
-
-from pymkv import MKVFile, MKVTrack
+from typing import TYPE_CHECKING
 
 from subpy import __version__ as subpy_version
-from subpy.chapters import Chapter, generate_chapter_file, get_chapters_from_ass
+from subpy.analysis import ScriptAnalysis, analyze_script
+from subpy.chapters import Chapter, generate_chapter_file
 from subpy.extended_ass import ExtendedAssFile
-from subpy.fonts import find_fonts, validate_fonts
-from subpy.merger import merge_ass_and_sync, parse_sync_timestamp
-from subpy.properties import SyncPoint, read_and_parse_properties
-from subpy.reader import read_ass
-from subpy.utils import incr_layer
+from subpy.manifest import BuildManifest
+from subpy.merger import merge_many, parse_sync_timestamp
+from subpy.parse_cache import AssParseCache
+from subpy.profiling import disable_profiling, enable_profiling, get_profiler, span
+from subpy.properties import EpisodeProperties, Subtitle, SyncPoint, read_and_parse_properties
+from subpy.reader import ScriptCache, read_ass
+from subpy.timing import EventColumns
 from subpy.writer import write_ass
 
+# fontTools and the packing modules are only imported by the commands that need them
+if TYPE_CHECKING:
+    from subpy.font_subset import FontSubsetCache
+    from subpy.fonts import FontCollection, FontValidator
+
 CURRENT_DIR = Path(__file__).parent
 COMMON_DIR = CURRENT_DIR / "common"
-
-properties, raw_prop = read_and_parse_properties(CURRENT_DIR / "properties.yaml", CURRENT_DIR)
-
-parser = argparse.ArgumentParser()
-parser.add_argument("episode", type=int)
-
-args = parser.parse_args()
-episode: int = args.episode
-current_episode = f"{episode:02d}"
-
-basename = raw_prop.get("basename")
-episode_meta = properties.get(current_episode)
-if episode_meta is None:
-    print(f"[!] Episode {current_episode} not found in properties.yaml")
-    sys.exit(1)
-
-print(f"[?] Processing episode {current_episode}...")
-print(f"[?] Using basename: {basename}")
-chapters_data: dict[str, Chapter] = {}
-base_ass: ExtendedAssFile | None = None
-base_ass_path: Path | None = None
-fonts_folder: set[Path] = set()
-total_scripts = 0
-for fmt, paths in episode_meta.scripts.items():
-    if len(paths) < 1:
-        continue
-    read_paths = paths[:]
-    if base_ass is None:
-        print(f"[+] Using {read_paths[0].name} as base ASS file!")
-        base_ass_path = read_paths[0]
-        base_ass = read_ass(read_paths[0])
-        font_folder = paths[0].parent / "fonts"
-        fonts_folder.add(font_folder)
-        if "dialog" in fmt.lower():
-            for line in base_ass.events:
-                incr_layer(line, 50)
-        chapters_data |= get_chapters_from_ass(base_ass)
-        read_paths.pop(0)
-        total_scripts += 1
-
-    for path in read_paths:
-        print(f"[+] Merging {fmt}: {path.name}")
-        merge_ass = read_ass(path)
-        font_folder = path.parent / "fonts"
-        fonts_folder.add(font_folder)
-        chapters_data |= get_chapters_from_ass(merge_ass)
-        bump_layer = 50 if "dialog" in fmt.lower() else 0
-        sync_time = episode_meta.syncs.get(fmt, SyncPoint("-", "-"))
-        chapter_point = chapters_data.get(sync_time.chapter)
-        sync_act = sync_time.value if sync_time.value != "-" else None
-        try:
-            sync_act = parse_sync_timestamp(sync_act or "-")
-        except ValueError:
-            sync_act = None
-        if sync_act is None and chapter_point is not None:
-            print(f'    [+] Syncing to chapter "{sync_time.chapter}" ({chapter_point.milisecond})')
-            sync_act = chapter_point.milisecond
-        merge_ass_and_sync(base_ass, merge_ass, sync_act, bump_layer, total_scripts, config=raw_prop)
-        total_scripts += 1
-
-if base_ass is None:
-    print("[!] Somehow we got an empty episode case?")
-    sys.exit(1)
-if base_ass_path is None:
-    print("[!] Somehow we got an empty episode case?")
-    sys.exit(1)
-
-
-basetitle = raw_prop.get("basetitle")
-# Set script information
-if basetitle is not None:
-    base_ass.script_info["Title"] = f"{basetitle} - {current_episode}"
-# base_ass.script_info["Original Translation"] = "Suaminya Kita Ikuyo"
-# base_ass.script_info["Original Editing"] = "Suaminya Kita Ikuyo dan Suaminya Nijika-chan"
-# base_ass.script_info["Original Timing"] = "Suaminya Kita Ikuyo"
-base_ass.script_info["Synch Point"] = base_ass_path.stem  # type: ignore
-base_ass.script_info["Script Updated By"] = f"SubPy/v{subpy_version} Script Merger"
-base_ass.script_info["Update Details"] = f"Merged {total_scripts} scripts with SubPy/v{subpy_version} Script Merger"
-# Set Aegisub project garbage
-if base_ass.project_garbage.get("Video File"):
-    # Seek to 0
-    base_ass.project_garbage["Scroll Position"] = "0"
-    base_ass.project_garbage["Active Line"] = "0"
-    base_ass.project_garbage["Video Position"] = "0"
-
-print("[+] Writing merged files!")
-final_folder = CURRENT_DIR / "final"
-final_folder.mkdir(parents=True, exist_ok=True)
-final_file = final_folder / f"{basename}{current_episode}.merged.ass"
-write_ass(base_ass, final_file)
-
-print("[?] Validating fonts...")
-ttfont, complete_fonts = find_fonts(list(fonts_folder))
-font_report = validate_fonts(base_ass, ttfont, True, False)
+CACHE_DIR = CURRENT_DIR / ".subpy_cache"
+# properties.yaml keys that affect the merged file
+MERGE_PROPERTIES = ("basetitle", "yeettemplater", "dedupestyles")
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
 
 
 def format_lines(lines, limit=10):
@@ -121,68 +45,742 @@ def format_lines(lines, limit=10):
     return " ".join(map(str, sorted_lines))
 
 
-real_problems = False
-for font, lines in sorted(font_report["missing_font"].items(), key=lambda x: x[0]):
-    print(f"  - Could not find font {font} on line(s): {format_lines(lines)}")
-    real_problems = True
+def parse_episodes(spec: str) -> list[str]:
+    """Parse an episode selection like ``3``, ``1-12`` or ``1,3,5-7``."""
+    episodes: list[str] = []
+    for part in spec.split(","):
+        first, _, last = part.strip().partition("-")
+        for episode in range(int(first), int(last or first) + 1):
+            if (current_episode := f"{episode:02d}") not in episodes:
+                episodes.append(current_episode)
+    return episodes
+
+
+def episode_font_folders(episode_meta: Subtitle) -> list[Path]:
+    fonts_folder: dict[Path, None] = {}
+    for paths in episode_meta.scripts.values():
+        for path in paths:
+            fonts_folder[path.parent / "fonts"] = None
+    return list(fonts_folder)
+
+
+def load_fonts(font_files: list[Path], args: argparse.Namespace) -> FontCollection:
+    from subpy.font_cache import FontCache
+    from subpy.fonts import FontCollection
+
+    font_cache: FontCache | None = None
+    if not args.no_font_cache:
+        font_cache = FontCache(CACHE_DIR / "fonts.sqlite3")
+        if args.rebuild_font_cache:
+            font_cache.clear()
+        if args.prune_font_cache and (pruned := font_cache.prune()) > 0:
+            print(f"[+] Pruned {pruned} deleted font(s) from the font cache")
+    try:
+        return FontCollection([(ff.name, str(ff)) for ff in font_files], font_cache, args.lazy_fonts, args.font_jobs)
+    finally:
+        if font_cache is not None:
+            font_cache.close()
+
+
+def store_font_coverage(all_fonts: FontCollection) -> None:
+    """Store the glyph coverage read since the fonts were loaded with --lazy-fonts in the font cache."""
+    if not all_fonts.loaded_coverage():
+        return
+    import sqlite3
+
+    from subpy.font_cache import FontCache
+
+    try:
+        with FontCache(CACHE_DIR / "fonts.sqlite3") as font_cache:
+            all_fonts.store_coverage(font_cache)
+    except sqlite3.Error as e:
+        print(f"[!] Could not store the font coverage in the font cache: {e}")
+
+
+def load_episode_fonts(
+    properties: EpisodeProperties, episodes: list[str], args: argparse.Namespace
+) -> tuple[dict[str, list[Path]], FontCollection]:
+    """Scan the fonts of every selected episode once, each episode is validated against its own fonts only."""
+    from subpy.fonts import find_font_files
+
+    episode_fonts = {
+        current_episode: find_font_files(episode_font_folders(properties[current_episode]))
+        for current_episode in episodes
+    }
+    print("[?] Loading fonts...")
+    with span("load_fonts"):
+        all_fonts = load_fonts(list(dict.fromkeys(ff for fonts in episode_fonts.values() for ff in fonts)), args)
+    return episode_fonts, all_fonts
+
+
+def merge_episode(
+    current_episode: str, episode_meta: Subtitle, raw_prop: dict, scripts: ScriptCache
+) -> tuple[ExtendedAssFile, dict[str, Chapter]] | None:
+    chapters_data: dict[str, Chapter] = {}
+    base_ass: ExtendedAssFile | None = None
+    base_ass_path: Path | None = None
+    to_merge: list[tuple[ExtendedAssFile, int | None, int]] = []
+    analyses: list[ScriptAnalysis] = []
+    for fmt, paths in episode_meta.scripts.items():
+        if len(paths) < 1:
+            continue
+        read_paths = paths[:]
+        if base_ass is None:
+            print(f"[+] Using {read_paths[0].name} as base ASS file!")
+            base_ass_path = read_paths[0]
+            base_ass = scripts.read(read_paths[0]).copy()
+            if "dialog" in fmt.lower():
+                with EventColumns(base_ass.events) as columns:
+                    columns.bump_layer(50)
+            chapters_data |= scripts.analyze(read_paths[0]).chapters
+            read_paths.pop(0)
+
+        for path in read_paths:
+            print(f"[+] Merging {fmt}: {path.name}")
+            merge_ass = scripts.read(path)
+            analysis = scripts.analyze(path)
+            chapters_data |= analysis.chapters
+            bump_layer = 50 if "dialog" in fmt.lower() else 0
+            sync_time = episode_meta.syncs.get(fmt, SyncPoint("-", "-"))
+            chapter_point = chapters_data.get(sync_time.chapter)
+            sync_act = sync_time.value if sync_time.value != "-" else None
+            try:
+                sync_act = parse_sync_timestamp(sync_act or "-")
+            except ValueError:
+                sync_act = None
+            if sync_act is None and chapter_point is not None:
+                print(f'    [+] Syncing to chapter "{sync_time.chapter}" ({chapter_point.milisecond})')
+                sync_act = chapter_point.milisecond
+            to_merge.append((merge_ass, sync_act, bump_layer))
+            analyses.append(analysis)
+
+    if base_ass is None:
+        print("[!] Somehow we got an empty episode case?")
+        return None
+    merge_many(base_ass, to_merge, config=raw_prop, analyses=analyses)
+    total_scripts = len(to_merge) + 1
+    if base_ass_path is None:
+        print("[!] Somehow we got an empty episode case?")
+        return None
+    basetitle = raw_prop.get("basetitle")
+    # Set script information
+    if basetitle is not None:
+        base_ass.script_info["Title"] = f"{basetitle} - {current_episode}"
+    # base_ass.script_info["Original Translation"] = "Suaminya Kita Ikuyo"
+    # base_ass.script_info["Original Editing"] = "Suaminya Kita Ikuyo dan Suaminya Nijika-chan"
+    # base_ass.script_info["Original Timing"] = "Suaminya Kita Ikuyo"
+    base_ass.script_info["Synch Point"] = base_ass_path.stem  # type: ignore
+    base_ass.script_info["Script Updated By"] = f"SubPy/v{subpy_version} Script Merger"
+    base_ass.script_info["Update Details"] = f"Merged {total_scripts} scripts with SubPy/v{subpy_version} Script Merger"
+    # Set Aegisub project garbage
+    if base_ass.project_garbage.get("Video File"):
+        # Seek to 0
+        base_ass.project_garbage["Scroll Position"] = "0"
+        base_ass.project_garbage["Active Line"] = "0"
+        base_ass.project_garbage["Video Position"] = "0"
+    return base_ass, chapters_data
+
+
+def print_font_report(font_report: dict) -> bool:
+    """Print the problems found by validate_fonts. Returns True if there are real problems."""
+    real_problems = False
+    for font, lines in sorted(font_report["missing_font"].items(), key=lambda x: x[0]):
+        print(f"  - Could not find font {font} on line(s): {format_lines(lines)}")
+        real_problems = True
 
-for (font, reqweight, realweight), lines in sorted(font_report["faux_bold"].items(), key=lambda x: x[0]):
-    print(
-        f"  - Faux bold used for font {font} (requested weight {reqweight}, got {realweight}) "
-        f"on line(s): {format_lines(lines)}"
+    for (font, reqweight, realweight), lines in sorted(font_report["faux_bold"].items(), key=lambda x: x[0]):
+        print(
+            f"  - Faux bold used for font {font} (requested weight {reqweight}, got {realweight}) "
+            f"on line(s): {format_lines(lines)}"
+        )
+
+    for font, lines in sorted(font_report["faux_italic"].items(), key=lambda x: x[0]):
+        print(f"  - Faux italic used for font {font} on line(s): {format_lines(lines)}")
+
+    for (font, reqweight, realweight), lines in sorted(font_report["mismatch_bold"].items(), key=lambda x: x[0]):
+        print(
+            f"  - Requested weight {reqweight} but got {realweight} for font {font} "
+            f"on line(s): {format_lines(lines)}"
+        )
+
+    for font, lines in sorted(font_report["mismatch_italic"].items(), key=lambda x: x[0]):
+        print(f"  - Requested non-italic but got italic for font {font} on line(s): " + format_lines(lines))
+
+    for font, lines in sorted(font_report["missing_glyphs_lines"].items(), key=lambda x: x[0]):
+        missing = " ".join(f"{g}(U+{ord(g):04X})" for g in sorted(font_report["missing_glyphs"][font]))
+        print(f"  - Font {font} is missing glyphs {missing} " f"on line(s): {format_lines(lines)}")
+    return real_problems
+
+
+def write_fonts_zip(font_zip: Path, complete_fonts: list[Path], manifest: BuildManifest):
+    """Write the fonts zip with a stable member order and timestamps, so equal fonts give an equal zip.
+
+    Fonts are compressed once into the cache and copied from there afterwards.
+    """
+    from subpy.font_archive import FontArchiveStore, write_font_archive
+
+    write_font_archive(
+        font_zip,
+        complete_fonts,
+        FontArchiveStore(CACHE_DIR / "zip"),
+        comment=f"Generated with SubPy/v{subpy_version} Script Merger".encode("utf-8"),
+        date_time=ZIP_DATE_TIME,
+        hash_font=manifest.hash_file,
     )
 
-for font, lines in sorted(font_report["faux_italic"].items(), key=lambda x: x[0]):
-    print(f"  - Faux italic used for font {font} on line(s): {format_lines(lines)}")
 
-for (font, reqweight, realweight), lines in sorted(font_report["mismatch_bold"].items(), key=lambda x: x[0]):
-    print(
-        f"  - Requested weight {reqweight} but got {realweight} for font {font} " f"on line(s): {format_lines(lines)}"
+@dataclass
+class EpisodeBuild:
+    """State of an episode passed from one build stage to the next."""
+
+    episode: str
+    meta: Subtitle
+    raw_prop: dict
+    scripts: ScriptCache
+    ttfont: FontCollection | None
+    complete_fonts: list[Path]
+    manifest: BuildManifest
+    final_folder: Path
+    subset_cache: FontSubsetCache | None = None
+    base_ass: ExtendedAssFile | None = None
+    chapters: dict[str, Chapter] = field(default_factory=dict)
+    validator: FontValidator | None = None
+    merged_hash: str = ""
+    fonts_hash: list[list[str]] = field(default_factory=list)
+    attached_file: Path | None = None
+    attached_ass: ExtendedAssFile | None = None
+
+    def output(self, suffix: str) -> Path:
+        return self.final_folder / f"{self.raw_prop.get('basename')}{self.episode}{suffix}"
+
+    def script(self) -> ExtendedAssFile:
+        """The merged script, read back from the final file when the merge was skipped."""
+        if self.base_ass is None:
+            self.base_ass = read_ass(self.output(".merged.ass"))
+        return self.base_ass
+
+    def font_validator(self) -> FontValidator:
+        """The font validator of the merged script, run on first use."""
+        if self.validator is None:
+            from subpy.fonts import FontValidator
+
+            script = self.script()
+            with span("validate_fonts", episode=self.episode):
+                self.validator = FontValidator(script, self.ttfont, True, False)
+                analyze_script(script, [self.validator], default_visitors=())
+        return self.validator
+
+
+def merge_stage(build: EpisodeBuild) -> bool:
+    manifest = build.manifest
+    final_file = build.output(".merged.ass")
+    merge_key = manifest.hash_inputs(
+        subpy_version,
+        {fmt: [[str(path), manifest.hash_file(path)] for path in paths] for fmt, paths in build.meta.scripts.items()},
+        asdict(build.meta),
+        {key: build.raw_prop.get(key) for key in MERGE_PROPERTIES},
     )
+    if manifest.is_fresh("merge", merge_key, [final_file]):
+        print("[?] Merged file is up to date, skipping merge")
+        build.chapters = {chp["name"]: Chapter(**chp) for chp in manifest.get("merge")["chapters"]}
+    else:
+        merged = merge_episode(build.episode, build.meta, build.raw_prop, build.scripts)
+        if merged is None:
+            return False
+        build.base_ass, build.chapters = merged
+        print("[+] Writing merged files!")
+        write_ass(build.base_ass, final_file)
+        manifest.record("merge", merge_key, [final_file], chapters=[asdict(chp) for chp in build.chapters.values()])
+    build.merged_hash = manifest.hash_file(final_file)
+    return True
+
 
-for font, lines in sorted(font_report["mismatch_italic"].items(), key=lambda x: x[0]):
-    print(f"  - Requested non-italic but got italic for font {font} on line(s): " + format_lines(lines))
-
-for font, lines in sorted(font_report["missing_glyphs_lines"].items(), key=lambda x: x[0]):
-    missing = " ".join(f"{g}(U+{ord(g):04X})" for g in sorted(font_report["missing_glyphs"][font]))
-    print(f"  - Font {font} is missing glyphs {missing} " f"on line(s): {format_lines(lines)}")
-
-if real_problems:
-    sys.exit(1)
-
-print("[+] Creating font collection zip...")
-# Make fonts collections
-font_zip = final_folder / f"{basename}{current_episode}.fonts.zip"
-with ZipFile(str(font_zip), "w", compression=ZIP_DEFLATED) as zipf:
-    for font in complete_fonts:
-        zipf.write(str(font), arcname=font.name)
-    zipf.comment = f"Generated with SubPy/v{subpy_version} Script Merger".encode("utf-8")
-
-print("[+] Preparing .mks file...")
-mkv = MKVFile()
-for font in complete_fonts:
-    mkv.add_attachment(str(font))
-
-chapter_txts = generate_chapter_file(list(chapters_data.values()))
-chapter_file = final_folder / f"{basename}{current_episode}.chapters.txt"
-if chapter_txts is not None:
-    print(f"[+] Generating chapter file for {current_episode}")
+def chapters_stage(build: EpisodeBuild) -> bool:
+    chapter_txts = generate_chapter_file(list(build.chapters.values()))
+    if chapter_txts is None:
+        print("[?] No chapters found, skipping chapter file")
+        return True
+    chapter_file = build.output(".chapters.txt")
+    print(f"[+] Writing chapter file to {chapter_file.name}")
     chapter_file.write_text(chapter_txts, encoding="utf-8")
-    mkv.chapters(str(chapter_file), "ind")
-if (eptitle := episode_meta.title) is not None:
-    merge_title = f"#{current_episode} - {eptitle}"
-    if basetitle is not None:
-        merge_title = f"{basetitle} - {merge_title}"
-    mkv.title = merge_title
-mkv.add_track(
-    MKVTrack(
-        str(final_file),
-        0,
-        "Bahasa Indonesia oleh Interrobang?!",
-        "ind",
-        default_track=True,
+    return True
+
+
+def validate_stage(build: EpisodeBuild) -> bool:
+    manifest = build.manifest
+    build.fonts_hash = [[ff.name, manifest.hash_file(ff)] for ff in build.complete_fonts]
+    validate_key = manifest.hash_inputs(subpy_version, build.merged_hash, build.fonts_hash)
+    if manifest.is_fresh("validate", validate_key, []):
+        print("[?] Fonts are already validated, skipping validation")
+        return True
+    print("[?] Validating fonts...")
+    if print_font_report(build.font_validator().report):
+        return False
+    manifest.record("validate", validate_key, [])
+    return True
+
+
+def subset_stage(build: EpisodeBuild) -> bool:
+    if build.subset_cache is None:
+        return True
+    from subpy.font_subset import CACHE_VERSION, subset_fonts
+
+    manifest = build.manifest
+    subset_file = build.output(".subset.ass")
+    subset_key = manifest.hash_inputs(subpy_version, CACHE_VERSION, build.merged_hash, build.fonts_hash)
+    if manifest.is_fresh("subset", subset_key, [subset_file]) and all(
+        Path(ff).exists() for ff in manifest.get("subset")["fonts"]
+    ):
+        print("[?] Font subsets are up to date, skipping")
+        build.complete_fonts = [Path(ff) for ff in manifest.get("subset")["fonts"]]
+    else:
+        print("[+] Subsetting fonts...")
+        subset_ass, build.complete_fonts = subset_fonts(
+            build.script(), build.font_validator().font_usage(), build.subset_cache, manifest.hash_file
+        )
+        write_ass(subset_ass, subset_file)
+        build.attached_ass = subset_ass
+        manifest.record("subset", subset_key, [subset_file], fonts=[str(ff) for ff in build.complete_fonts])
+    build.attached_file = subset_file
+    build.fonts_hash = [[ff.name, manifest.hash_file(ff)] for ff in build.complete_fonts]
+    return True
+
+
+def zip_stage(build: EpisodeBuild) -> bool:
+    font_zip = build.output(".fonts.zip")
+    zip_key = build.manifest.hash_inputs(subpy_version, build.fonts_hash)
+    if build.manifest.is_fresh("zip", zip_key, [font_zip]):
+        print("[?] Font collection zip is up to date, skipping")
+        return True
+    print("[+] Creating font collection zip...")
+    # Make fonts collections
+    write_fonts_zip(font_zip, build.complete_fonts, build.manifest)
+    build.manifest.record("zip", zip_key, [font_zip])
+    return True
+
+
+def mux_stage(build: EpisodeBuild) -> bool:
+    from subpy.matroska import write_mks
+
+    manifest = build.manifest
+    basetitle = build.raw_prop.get("basetitle")
+    attached_file, attached_ass = build.attached_file, build.attached_ass
+    if attached_file is None:
+        attached_file, attached_ass = build.output(".merged.ass"), build.base_ass
+    merge_title: str | None = None
+    if (eptitle := build.meta.title) is not None:
+        merge_title = f"#{build.episode} - {eptitle}"
+        if basetitle is not None:
+            merge_title = f"{basetitle} - {merge_title}"
+    mks_file = build.output(".mks")
+    mux_key = manifest.hash_inputs(
+        subpy_version,
+        manifest.hash_file(attached_file),
+        build.fonts_hash,
+        [asdict(chp) for chp in build.chapters.values()],
+        merge_title,
     )
-)
-mks_file = final_folder / f"{basename}{current_episode}.mks"
-print(f"[+] Writing .mks file to {mks_file.name}")
-mkv.mux(str(mks_file))
+    if manifest.is_fresh("mux", mux_key, [mks_file]):
+        print("[?] .mks file is up to date, skipping")
+        return True
+
+    print("[+] Preparing .mks file...")
+    if attached_ass is None:
+        attached_ass = read_ass(attached_file)
+    print(f"[+] Writing .mks file to {mks_file.name}")
+    write_mks(
+        mks_file,
+        attached_ass,
+        list(build.chapters.values()),
+        build.complete_fonts,
+        title=merge_title,
+        track_name="Bahasa Indonesia oleh Interrobang?!",
+        language="ind",
+    )
+    manifest.record("mux", mux_key, [mks_file])
+    return True
+
+
+STAGES = {
+    "merge": merge_stage,
+    "chapters": chapters_stage,
+    "validate": validate_stage,
+    "subset": subset_stage,
+    "zip": zip_stage,
+    "mux": mux_stage,
+}
+# Stages run by every command, in order
+COMMANDS = {
+    "merge": ("merge",),
+    "chapters": ("merge", "chapters"),
+    "validate": ("merge", "validate"),
+    "pack": ("merge", "validate", "subset", "zip"),
+    "mux": ("merge", "chapters", "validate", "subset", "zip", "mux"),
+}
+
+
+def build_episode(
+    command: str,
+    current_episode: str,
+    episode_meta: Subtitle,
+    raw_prop: dict,
+    scripts: ScriptCache,
+    ttfont: FontCollection | None,
+    complete_fonts: list[Path],
+    force: bool = False,
+    subset_cache: FontSubsetCache | None = None,
+) -> bool:
+    """Run the stages of `command` for a single episode. Returns False if a stage failed, e.g. the fonts have
+    real problems.
+
+    Every stage is skipped when its inputs did not change since the last build, unless `force` is set.
+    With `subset_cache`, only the fonts used by the script are packed, subset and renamed, along with
+    a copy of the script using the renamed fonts.
+    """
+    print(f"[?] Processing episode {current_episode}...")
+    print(f"[?] Using basename: {raw_prop.get('basename')}")
+    final_folder = CURRENT_DIR / "final"
+    final_folder.mkdir(parents=True, exist_ok=True)
+    manifest = BuildManifest(final_folder / f"{raw_prop.get('basename')}{current_episode}.manifest.json", force)
+    build = EpisodeBuild(
+        current_episode,
+        episode_meta,
+        raw_prop,
+        scripts,
+        ttfont,
+        complete_fonts,
+        manifest,
+        final_folder,
+        subset_cache,
+    )
+    with span("episode", episode=current_episode):
+        for stage in COMMANDS[command]:
+            with span(f"stage:{stage}", episode=current_episode):
+                if not STAGES[stage](build):
+                    return False
+    return True
+
+
+@dataclass
+class EpisodeResult:
+    episode: str
+    status: str
+    elapsed: float
+    log: str = ""
+    #: profiler records of a worker process, see Profiler.merge
+    profile: tuple | None = None
+
+
+# Shared between the episodes built by the same (worker) process, see init_worker
+_worker_state: dict = {}
+
+
+def init_worker(
+    raw_prop: dict,
+    all_fonts: FontCollection | None,
+    command: str = "mux",
+    force: bool = False,
+    script_cache: bool = True,
+    subset: bool = False,
+    profile_memory: bool | None = None,
+    font_cache: bool = False,
+):
+    _worker_state["raw_prop"] = raw_prop
+    _worker_state["command"] = command
+    _worker_state["force"] = force
+    # None when not profiling
+    _worker_state["profile_memory"] = profile_memory
+    _worker_state["fonts"] = all_fonts
+    # whether to store the glyph coverage loaded on demand with --lazy-fonts
+    _worker_state["font_cache"] = font_cache
+    _worker_state["scripts"] = ScriptCache(AssParseCache(CACHE_DIR / "ass") if script_cache else None)
+    _worker_state["subsets"] = None
+    if subset:
+        from subpy.font_subset import FontSubsetCache
+
+        _worker_state["subsets"] = FontSubsetCache(CACHE_DIR / "subsets")
+
+
+def run_episode(
+    current_episode: str, episode_meta: Subtitle, complete_fonts: list[Path], buffered: bool = False
+) -> EpisodeResult:
+    """Build an episode with the state set up by init_worker, optionally buffering its output."""
+    start = time.perf_counter()
+    buffer = io.StringIO()
+    # episodes built by worker processes (buffered) are profiled on their own, the main process merges the records
+    own_profiler = buffered and _worker_state["profile_memory"] is not None
+    if own_profiler:
+        enable_profiling(_worker_state["profile_memory"])
+    with contextlib.redirect_stdout(buffer) if buffered else contextlib.nullcontext():
+        try:
+            ttfont = None
+            if (all_fonts := _worker_state["fonts"]) is not None:
+                ttfont = all_fonts.restrict([str(ff) for ff in complete_fonts])
+            success = build_episode(
+                _worker_state["command"],
+                current_episode,
+                episode_meta,
+                _worker_state["raw_prop"],
+                _worker_state["scripts"],
+                ttfont,
+                complete_fonts,
+                _worker_state["force"],
+                _worker_state["subsets"],
+            )
+            status = "ok" if success else "failed"
+        except Exception:
+            traceback.print_exc(file=sys.stdout)
+            status = "error"
+        if _worker_state["font_cache"] and (fonts := _worker_state["fonts"]) is not None:
+            store_font_coverage(fonts)
+    result = EpisodeResult(current_episode, status, time.perf_counter() - start, buffer.getvalue())
+    if own_profiler and (profiler := disable_profiling()) is not None:
+        result.profile = profiler.records()
+    return result
+
+
+def episode_inputs(episode_meta: Subtitle) -> tuple[set[Path], set[Path], set[Path]]:
+    """The scripts of an episode, their folders and its fonts folders, as absolute paths."""
+    scripts = {Path(os.path.abspath(path)) for paths in episode_meta.scripts.values() for path in paths}
+    fonts_folders = {Path(os.path.abspath(folder)) for folder in episode_font_folders(episode_meta)}
+    return scripts, {path.parent for path in scripts}, fonts_folders
+
+
+def watch_episodes(
+    args: argparse.Namespace,
+    episodes: list[str],
+    properties: EpisodeProperties,
+    episode_fonts: dict[str, list[Path]],
+    results: list[EpisodeResult],
+) -> list[EpisodeResult]:
+    """Rebuild the episodes whose inputs changed until interrupted, with the state of init_worker kept in memory.
+
+    Only the modified scripts are parsed again. New or removed scripts in the folders of the scripts and changes
+    to properties.yaml resolve the episodes again, changes to the fonts folders reload the fonts.
+
+    :return: the last result of every episode
+    """
+    from subpy.watcher import FileWatcher
+
+    properties_file = Path(os.path.abspath(CURRENT_DIR / "properties.yaml"))
+    validate = "validate" in COMMANDS[args.command]
+    last_results = {result.episode: result for result in results}
+    # the fonts are reloaded with the cache as it is
+    args.rebuild_font_cache = args.prune_font_cache = False
+    watcher = FileWatcher()
+    try:
+        while True:
+            inputs = {current_episode: episode_inputs(properties[current_episode]) for current_episode in episodes}
+            watcher.watch(
+                [properties_file, *(path for scripts, _, _ in inputs.values() for path in scripts)],
+                [
+                    folder
+                    for _, script_folders, fonts_folders in inputs.values()
+                    for folder in (*script_folders, *(fonts_folders if validate else ()))
+                ],
+            )
+            print(f"[?] Watching episode(s) {', '.join(episodes)} with {watcher.method}, press Ctrl+C to stop...")
+            changes = watcher.wait()
+            start = time.perf_counter()
+            reload_properties = properties_file in changes
+            reload_fonts = False
+            rebuild: list[str] = []
+            for current_episode, (scripts, script_folders, fonts_folders) in inputs.items():
+                # scripts added to or removed from the folders can change the scripts of the episode
+                new_scripts = {
+                    path
+                    for path in changes
+                    if path.parent in script_folders
+                    and path.suffix.lower() == ".ass"
+                    and (path not in scripts or not path.exists())
+                }
+                fonts_changed = validate and any(
+                    path in fonts_folders or path.parent in fonts_folders for path in changes
+                )
+                reload_properties = reload_properties or bool(new_scripts)
+                reload_fonts = reload_fonts or fonts_changed
+                if reload_properties or fonts_changed or changes & scripts:
+                    rebuild.append(current_episode)
+            if reload_properties:
+                rebuild = episodes
+            if not rebuild:
+                continue
+            print(f"[?] Changed: {format_lines(os.path.relpath(path, CURRENT_DIR) for path in changes)}")
+            try:
+                if reload_properties:
+                    print("[?] Reloading properties.yaml...")
+                    properties, _worker_state["raw_prop"] = read_and_parse_properties(
+                        CURRENT_DIR / "properties.yaml", CURRENT_DIR, CACHE_DIR / "properties"
+                    )
+                    reload_fonts = validate
+                    if missing := [
+                        current_episode for current_episode in episodes if current_episode not in properties
+                    ]:
+                        print(f"[!] Episode(s) {', '.join(missing)} not found in properties.yaml")
+                        continue
+                if reload_fonts:
+                    episode_fonts, _worker_state["fonts"] = load_episode_fonts(properties, episodes, args)
+            except Exception:
+                traceback.print_exc(file=sys.stdout)
+                print("[!] Could not reload the inputs, waiting for the next change")
+                continue
+            for current_episode in rebuild:
+                result = run_episode(current_episode, properties[current_episode], episode_fonts[current_episode])
+                last_results[current_episode] = result
+                print(f"[{'+' if result.status == 'ok' else '!'}] Episode {current_episode}: {result.status}")
+            print(f"[+] Rebuilt {len(rebuild)} episode(s) in {time.perf_counter() - start:.2f}s")
+    except KeyboardInterrupt:
+        print("[?] Stopped watching")
+    finally:
+        watcher.close()
+    return list(last_results.values())
+
+
+def print_summary(results: list[EpisodeResult]):
+    print("[?] Summary:")
+    print(f"  {'Episode':<8} {'Status':<8} {'Time':>8}")
+    for result in sorted(results, key=lambda x: x.episode):
+        print(f"  {result.episode:<8} {result.status:<8} {result.elapsed:>7.2f}s")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("episodes", nargs="?", help="Episode number, range (1-12) or list (1,3,5-7) to build")
+    common.add_argument("--all", action="store_true", help="Build every episode in properties.yaml")
+    common.add_argument("--force", action="store_true", help="Rebuild everything even if the inputs did not change")
+    common.add_argument("-j", "--jobs", type=int, default=1, help="Number of episodes to build in parallel")
+    common.add_argument("--no-script-cache", action="store_true", help="Do not use the persistent parsed script cache")
+    common.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and rebuild the episodes whose scripts, fonts or properties.yaml changed",
+    )
+    common.add_argument(
+        "--profile",
+        type=Path,
+        metavar="TRACE",
+        help="Print the time spent in every step and write it to TRACE as a Chrome trace (chrome://tracing, Perfetto)",
+    )
+    common.add_argument(
+        "--profile-memory", action="store_true", help="With --profile, also record the peak memory of every step"
+    )
+
+    fonts = argparse.ArgumentParser(add_help=False)
+    fonts.add_argument(
+        "--lazy-fonts", action="store_true", help="Only read font names when scanning, load glyphs when a font is used"
+    )
+    fonts.add_argument(
+        "--font-jobs", type=int, default=None, help="Number of processes used to scan fonts (default: CPU count)"
+    )
+    fonts.add_argument("--no-font-cache", action="store_true", help="Do not use the persistent font metadata cache")
+    fonts.add_argument("--rebuild-font-cache", action="store_true", help="Rescan every font and rebuild the font cache")
+    fonts.add_argument("--prune-font-cache", action="store_true", help="Remove deleted fonts from the font cache")
+
+    attach = argparse.ArgumentParser(add_help=False)
+    attach.add_argument(
+        "--subset-fonts",
+        action="store_true",
+        help="Only attach the fonts used by the script, subset to the characters used and renamed",
+    )
+
+    parser = argparse.ArgumentParser(description="Without a command, mux is run.")
+    commands = parser.add_subparsers(dest="command", metavar="command", required=True)
+    commands.add_parser("merge", parents=[common], help="Merge the scripts of every episode")
+    commands.add_parser("chapters", parents=[common], help="Merge, then write the chapters of every episode")
+    commands.add_parser("validate", parents=[common, fonts], help="Merge, then check the fonts used by every episode")
+    commands.add_parser(
+        "pack", parents=[common, fonts, attach], help="Merge, validate, then zip the fonts of every episode"
+    )
+    commands.add_parser(
+        "mux",
+        parents=[common, fonts, attach],
+        help="Merge, write the chapters, validate, zip the fonts, then write the .mks files",
+    )
+    return parser
+
+
+def main(argv: list[str] | None = None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    # Plain `main.py 1-12` still does a full build
+    if not argv or argv[0] not in (*COMMANDS, "-h", "--help"):
+        argv.insert(0, "mux")
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.profile is not None:
+        enable_profiling(args.profile_memory)
+    properties, raw_prop = read_and_parse_properties(
+        CURRENT_DIR / "properties.yaml", CURRENT_DIR, CACHE_DIR / "properties"
+    )
+    if args.all:
+        episodes = sorted(properties.keys())
+    elif args.episodes is None:
+        parser.error("an episode selection or --all is required")
+    else:
+        try:
+            episodes = parse_episodes(args.episodes)
+        except ValueError:
+            parser.error(f"invalid episode selection: {args.episodes}")
+
+    not_found = [current_episode for current_episode in episodes if current_episode not in properties]
+    for current_episode in not_found:
+        print(f"[!] Episode {current_episode} not found in properties.yaml")
+    if not_found:
+        sys.exit(1)
+
+    all_fonts: FontCollection | None = None
+    episode_fonts: dict[str, list[Path]] = {current_episode: [] for current_episode in episodes}
+    if "validate" in COMMANDS[args.command]:
+        episode_fonts, all_fonts = load_episode_fonts(properties, episodes, args)
+
+    worker_args = (
+        raw_prop,
+        all_fonts,
+        args.command,
+        args.force,
+        not args.no_script_cache,
+        getattr(args, "subset_fonts", False),
+        args.profile_memory if args.profile is not None else None,
+        all_fonts is not None and not args.no_font_cache,
+    )
+    results: list[EpisodeResult] = []
+    # watch mode keeps the caches of a single process warm between rebuilds
+    jobs = 1 if args.watch else min(args.jobs, len(episodes))
+    if jobs <= 1:
+        init_worker(*worker_args)
+        for current_episode in episodes:
+            results.append(run_episode(current_episode, properties[current_episode], episode_fonts[current_episode]))
+    else:
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+
+        print(f"[?] Building {len(episodes)} episodes with {jobs} jobs...")
+        with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker, initargs=worker_args) as executor:
+            futures = [
+                executor.submit(
+                    run_episode, current_episode, properties[current_episode], episode_fonts[current_episode], True
+                )
+                for current_episode in episodes
+            ]
+            for future in as_completed(futures):
+                result = future.result()
+                print(result.log, end="", flush=True)
+                results.append(result)
+                if result.profile is not None and (profiler := get_profiler()) is not None:
+                    profiler.merge(result.profile)
+
+    if len(results) > 1:
+        print_summary(results)
+    if args.watch:
+        results = watch_episodes(args, episodes, properties, episode_fonts, results)
+    if (profiler := disable_profiling()) is not None:
+        print("[?] Profile:")
+        print(profiler.summary())
+        profiler.write_chrome_trace(args.profile)
+        print(f"[+] Wrote trace to {args.profile}")
+    failed = [result.episode for result in results if result.status != "ok"]
+    if failed:
+        print(f"[!] Failed to build episode(s): {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,71 @@
+"""Submodules are imported on first access of their names, so that e.g. merging never loads fontTools."""
+import importlib
+
 from ._metadata import __version__
-from .chapters import *
-from .extended_ass import *
-from .fonts import *
-from .merger import *
-from .properties import *
-from .reader import *
-from .utils import *
-from .writer import *
+
+# Public names -> submodule defining them, keep in sync with the __all__ of each submodule
+_LAZY_NAMES = {
+    "analysis": ("EventVisitor", "ScriptAnalysis", "analyze_script", "TEMPLATE_KINDS"),
+    "chapters": ("Chapter", "get_chapters_from_ass", "generate_chapter_file"),
+    "extended_ass": ("ExtendedAssFile", "AssAegisubProjectGarbage", "StyleRegistry"),
+    "font_archive": ("ArchiveEntry", "FontArchiveStore", "write_font_archive"),
+    "font_cache": ("FontCache",),
+    "font_subset": ("FontSubsetCache", "subset_family_name", "subset_font", "rename_fonts", "subset_fonts"),
+    "fonts": (
+        "FontInfo",
+        "FontValidator",
+        "deduplicates_fonts",
+        "get_fonts",
+        "find_font_files",
+        "find_fonts",
+        "validate_fonts",
+    ),
+    "lazy_ass": ("LazyAssEventList", "read_ass_lazy"),
+    "manifest": ("BuildManifest",),
+    "matroska": ("write_mks",),
+    "merger": (
+        "timedelta_to_miliseconds",
+        "parse_sync_timestamp",
+        "find_sync_point_from_chapter",
+        "fmt_style",
+        "rename_reset_tags",
+        "split_leading_comments",
+        "compute_sync_offset",
+        "prepare_merged_events",
+        "merge_many",
+        "merge_ass_and_sync",
+    ),
+    "parse_cache": ("AssParseCache",),
+    "profiling": (
+        "Profiler",
+        "SpanRecord",
+        "span",
+        "count",
+        "traced",
+        "enable_profiling",
+        "disable_profiling",
+        "get_profiler",
+    ),
+    "properties": ("DirectoryListings", "EpisodeProperties", "read_and_parse_properties"),
+    "reader": ("read_ass", "ScriptCache"),
+    "timing": ("FrameTimes", "EventColumns"),
+    "utils": ("incr_layer", "reset_layer", "event_values", "make_event"),
+    "watcher": ("FileWatcher",),
+    "writer": ("write_ass",),
+}
+_LAZY_ATTRS = {name: module for module, names in _LAZY_NAMES.items() for name in names}
+
+__all__ = ("__version__", *_LAZY_ATTRS)
+
+
+def __getattr__(name: str):
+    module = _LAZY_ATTRS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted({*globals(), *_LAZY_ATTRS})
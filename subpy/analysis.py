@@ -0,0 +1,125 @@
+"""Single-pass analysis of the events of a script."""
+from __future__ import annotations
+
+import collections
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from typing import Any
+
+from ass_parser import AssEvent
+
+from .chapters import Chapter, chapter_from_event
+from .extended_ass import ExtendedAssFile
+
+__all__ = (
+    "EventVisitor",
+    "ScriptAnalysis",
+    "analyze_script",
+    "TEMPLATE_KINDS",
+)
+# Effects of karaoke templater lines, the kind is the first word
+TEMPLATE_KINDS = ("code", "template", "mixin")
+
+
+@dataclass
+class ScriptAnalysis:
+    """What the visitors found in a script."""
+
+    #: chapter comments, by name
+    chapters: dict[str, Chapter] = field(default_factory=dict)
+    #: start of the last line with the "sync" effect
+    sync_start: int | None = None
+    #: index of every templater line -> its kind, see TEMPLATE_KINDS
+    template_lines: dict[int, str] = field(default_factory=dict)
+    #: number of events per style name
+    style_usage: collections.Counter[str] = field(default_factory=collections.Counter)
+    #: results of additional visitors, by visitor name
+    extra: dict[str, Any] = field(default_factory=dict)
+
+
+class EventVisitor:
+    """Collects something from the events of a script, see analyze_script."""
+
+    def visit(self, index: int, event: AssEvent) -> None:
+        raise NotImplementedError
+
+    def finish(self, analysis: ScriptAnalysis) -> None:
+        """Store the results in `analysis`, called after the last event.
+
+        Additional visitors finish after the default ones and store their results in `analysis.extra`.
+        """
+
+
+class ChapterVisitor(EventVisitor):
+    def __init__(self) -> None:
+        self.chapters: dict[str, Chapter] = {}
+
+    def visit(self, index: int, event: AssEvent) -> None:
+        if (chapter := chapter_from_event(event)) is not None:
+            self.chapters[chapter.name] = chapter
+
+    def finish(self, analysis: ScriptAnalysis) -> None:
+        analysis.chapters = self.chapters
+
+
+class SyncPointVisitor(EventVisitor):
+    def __init__(self) -> None:
+        self.sync_start: int | None = None
+
+    def visit(self, index: int, event: AssEvent) -> None:
+        if event.effect == "sync":
+            self.sync_start = event.start
+
+    def finish(self, analysis: ScriptAnalysis) -> None:
+        analysis.sync_start = self.sync_start
+
+
+class TemplateVisitor(EventVisitor):
+    def __init__(self) -> None:
+        self.template_lines: dict[int, str] = {}
+
+    def visit(self, index: int, event: AssEvent) -> None:
+        kind, space, _ = event.effect.partition(" ")
+        if space and kind in TEMPLATE_KINDS:
+            self.template_lines[index] = kind
+
+    def finish(self, analysis: ScriptAnalysis) -> None:
+        analysis.template_lines = self.template_lines
+
+
+class StyleUsageVisitor(EventVisitor):
+    def __init__(self) -> None:
+        self.style_usage: collections.Counter[str] = collections.Counter()
+
+    def visit(self, index: int, event: AssEvent) -> None:
+        self.style_usage[event.style_name] += 1
+
+    def finish(self, analysis: ScriptAnalysis) -> None:
+        analysis.style_usage = self.style_usage
+
+
+DEFAULT_VISITORS = (ChapterVisitor, SyncPointVisitor, TemplateVisitor, StyleUsageVisitor)
+
+
+def analyze_script(
+    ass_file: ExtendedAssFile,
+    visitors: Iterable[EventVisitor] = (),
+    default_visitors: Iterable[type[EventVisitor]] = DEFAULT_VISITORS,
+) -> ScriptAnalysis:
+    """Run the default visitors and `visitors` over the events of `ass_file`, in a single pass.
+
+    :param ass_file: script to analyze
+    :param visitors: additional visitors, their results end up in ScriptAnalysis.extra
+    :param default_visitors: visitors filling the other fields of ScriptAnalysis, empty to only run `visitors`
+    :return: analysis of the script
+    """
+    all_visitors = [visitor_type() for visitor_type in default_visitors]
+    all_visitors.extend(visitors)
+    visits = [visitor.visit for visitor in all_visitors]
+    for index, event in enumerate(ass_file.events):
+        for visit in visits:
+            visit(index, event)
+    analysis = ScriptAnalysis()
+    for visitor in all_visitors:
+        visitor.finish(analysis)
+    return analysis
@@ -1,6 +1,8 @@
 import re
 from dataclasses import dataclass
 
+from ass_parser import AssEvent
+
 from .extended_ass import ExtendedAssFile
 
 __all__ = (
@@ -17,16 +19,22 @@ class Chapter:
     milisecond: int
 
 
+def chapter_from_event(event: AssEvent) -> Chapter | None:
+    if not event.is_comment:
+        return None
+    if event.effect != "chapter" or event.actor != "chapter":
+        return None
+    if (ev_match := chapter_re.match(event.text)) is not None:
+        if (ev_text := ev_match.group(1)).strip() != "":
+            return Chapter(ev_text, event.start)
+    return None
+
+
 def get_chapters_from_ass(ass_file: ExtendedAssFile):
     chapters: dict[str, Chapter] = {}
     for event in ass_file.events:
-        if not event.is_comment:
-            continue
-        if event.effect != "chapter" or event.actor != "chapter":
-            continue
-        if (ev_match := chapter_re.match(event.text)) is not None:
-            if (ev_text := ev_match.group(1)).strip() != "":
-                chapters[ev_text] = Chapter(ev_text, event.start)
+        if (chapter := chapter_from_event(event)) is not None:
+            chapters[chapter.name] = chapter
     return chapters
 
 
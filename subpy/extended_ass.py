@@ -1,5 +1,9 @@
-from typing import IO, Any
+from collections.abc import Iterable
+from copy import copy
+from dataclasses import fields
+from typing import IO, Any, Optional
 
+from ass_parser import AssStyle
 from ass_parser.ass_file import AssFile, _collect_section_info_list
 from ass_parser.ass_sections import (
     AssBaseSection,
@@ -14,8 +18,15 @@ from ass_parser.ass_sections.const import EVENTS_SECTION_NAME, SCRIPT_INFO_SECTI
 __all__ = (
     "ExtendedAssFile",
     "AssAegisubProjectGarbage",
+    "StyleRegistry",
 )
 AEGI_PROJECT_GARBAGE = "Aegisub Project Garbage"
+# Everything that defines how a style renders, i.e. all the public fields except its name
+STYLE_DEFINITION_FIELDS = tuple(f.name for f in fields(AssStyle) if not f.name.startswith("_") and f.name != "name")
+
+
+def style_definition(style: AssStyle) -> tuple:
+    return tuple(getattr(style, name) for name in STYLE_DEFINITION_FIELDS)
 
 
 class AssAegisubProjectGarbage(AssKeyValueMapping):
@@ -26,6 +37,105 @@ class AssAegisubProjectGarbage(AssKeyValueMapping):
         super().__init__(AEGI_PROJECT_GARBAGE)
 
 
+class StyleRegistry:
+    """Styles of an ASS file indexed by their definition.
+
+    Used to add styles from other files without duplicating the ones that
+    already exist under another name. The index is rebuilt whenever the
+    style list changes behind the registry's back.
+    """
+
+    def __init__(self, styles: AssStyleList) -> None:
+        """Initialize self.
+
+        :param styles: style list to manage
+        """
+        self.styles = styles
+        self._by_definition: Optional[dict[tuple, str]] = None
+        self._adding = False
+        styles.changed.subscribe(self._invalidate)
+
+    def _invalidate(self, _event: Any) -> None:
+        if not self._adding:
+            self._by_definition = None
+
+    def _index(self) -> dict[tuple, str]:
+        if self._by_definition is None:
+            self._by_definition = {}
+            for style in self.styles:
+                # first style wins, like AssStyleList.get_by_name
+                self._by_definition.setdefault(style_definition(style), style.name)
+        return self._by_definition
+
+    def find(self, style: AssStyle) -> Optional[str]:
+        """Find a style with the same definition as `style`.
+
+        :param style: style to look for, its name is ignored
+        :return: name of the matching style, None if there is none
+        """
+        return self._index().get(style_definition(style))
+
+    def add(self, style: AssStyle, name: str, dedupe: bool = True) -> str:
+        """Add a copy of `style` named `name`.
+
+        :param style: style to add, it is not modified
+        :param name: name of the added style
+        :param dedupe: reuse a style with the same definition instead of adding one
+        :return: name to reference the style with
+        """
+        index = self._index()
+        definition = style_definition(style)
+        if dedupe and (existing := index.get(definition)) is not None:
+            return existing
+        style_copy = copy(style)
+        style_copy.name = name
+        self._adding = True
+        try:
+            self.styles.append(style_copy)
+        finally:
+            self._adding = False
+        index.setdefault(definition, name)
+        return name
+
+    def __getstate__(self) -> dict[str, Any]:
+        # Subscriptions are not pickled, so the index can't be trusted after unpickling
+        return {**self.__dict__, "_by_definition": None}
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self.styles.changed.subscribe(self._invalidate)
+
+
+class _RowCollector:
+    """Tabular section that keeps the parsed rows in a plain list.
+
+    Appending rows to an observable section one by one reindexes it every time, which is quadratic.
+    The collected rows are inserted all at once instead.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.rows: list[Any] = []
+
+    def append(self, value: Any) -> None:
+        self.rows.append(value)
+
+
+class _EventRows(_RowCollector, AssEventList):
+    pass
+
+
+class _StyleRows(_RowCollector, AssStyleList):
+    pass
+
+
+def _consume_rows(section: Any, collector: Any, lines: list[tuple[int, str]]) -> None:
+    collector.consume_ass_lines(lines)
+    section.name = collector.name
+    section.clear()
+    section.extend(collector.rows)
+
+
 class ExtendedAssFile:
     """ASS file (master container for all ASS stuff)."""
 
@@ -35,6 +145,7 @@ class ExtendedAssFile:
         self.project_garbage = AssAegisubProjectGarbage()
         self.events = AssEventList()
         self.styles = AssStyleList()
+        self.style_registry = StyleRegistry(self.styles)
         self.extra_sections: list[AssBaseSection] = []
 
     def consume_ass_stream(self, handle: IO[str]) -> None:
@@ -48,25 +159,58 @@ class ExtendedAssFile:
         self.events.clear()
         self.styles.clear()
         self.extra_sections.clear()
-        for section_info in _collect_section_info_list(handle):
+        self.consume_section_lines(
+            (section_info.name, section_info.is_tabular, section_info.lines)
+            for section_info in _collect_section_info_list(handle)
+        )
+
+    def consume_section_lines(self, sections: Iterable[tuple[str, bool, list[tuple[int, str]]]]) -> None:
+        """Load already split ASS sections.
+
+        :param sections: tuples of section name, whether it is tabular and its (line_num, line) lines
+        """
+        for name, is_tabular, lines in sections:
             section: AssBaseSection
-            if section_info.name == STYLES_SECTION_NAME:
-                self.styles.consume_ass_lines(section_info.lines)
-            elif section_info.name == EVENTS_SECTION_NAME:
-                self.events.consume_ass_lines(section_info.lines)
-            elif section_info.name == SCRIPT_INFO_SECTION_NAME:
-                self.script_info.consume_ass_lines(section_info.lines)
-            elif section_info.name == AEGI_PROJECT_GARBAGE:
-                self.project_garbage.consume_ass_lines(section_info.lines)
-            elif section_info.is_tabular:
-                section = AssStringTable(name=section_info.name)
-                section.consume_ass_lines(section_info.lines)
+            if name == STYLES_SECTION_NAME:
+                _consume_rows(self.styles, _StyleRows(), lines)
+            elif name == EVENTS_SECTION_NAME:
+                _consume_rows(self.events, _EventRows(), lines)
+            elif name == SCRIPT_INFO_SECTION_NAME:
+                self.script_info.consume_ass_lines(lines)
+            elif name == AEGI_PROJECT_GARBAGE:
+                self.project_garbage.consume_ass_lines(lines)
+            elif is_tabular:
+                section = AssStringTable(name=name)
+                section.consume_ass_lines(lines)
                 self.extra_sections.append(section)
             else:
-                section = AssKeyValueMapping(name=section_info.name)
-                section.consume_ass_lines(section_info.lines)
+                section = AssKeyValueMapping(name=name)
+                section.consume_ass_lines(lines)
                 self.extra_sections.append(section)
 
+    def copy(self) -> "ExtendedAssFile":
+        """Create a copy of self that can be modified without touching the original.
+
+        :return: copied ASS file
+        """
+        ass_file = ExtendedAssFile()
+        ass_file.script_info.update(self.script_info)
+        ass_file.project_garbage.update(self.project_garbage)
+        ass_file.styles.extend(copy(style) for style in self.styles)
+        ass_file.events.extend(copy(event) for event in self.events)
+        for section in self.extra_sections:
+            section_copy: AssBaseSection
+            if isinstance(section, AssStringTable):
+                section_copy = AssStringTable(name=section.name)
+                section_copy.extend((item_type, dict(item)) for item_type, item in section)
+            elif isinstance(section, AssKeyValueMapping):
+                section_copy = AssKeyValueMapping(name=section.name)
+                section_copy.update(section)
+            else:
+                raise TypeError(f"Cannot copy section {section.name} of type {type(section).__name__}")
+            ass_file.extra_sections.append(section_copy)
+        return ass_file
+
     def __eq__(self, other: Any) -> bool:
         """Check for equality.
 
@@ -0,0 +1,229 @@
+"""Deterministic font zips assembled from a store of compressed fonts."""
+from __future__ import annotations
+
+import os
+import shutil
+import struct
+import sys
+import zlib
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import NamedTuple
+
+from .profiling import traced
+from .utils import hash_file
+
+__all__ = (
+    "ArchiveEntry",
+    "FontArchiveStore",
+    "write_font_archive",
+)
+# Bump this whenever the stored entries change
+STORE_VERSION = 1
+# crc32, uncompressed size
+ENTRY_HEADER = struct.Struct("<IQ")
+# Same values zipfile.ZipFile writes for a deflated member
+ZIP_VERSION = 20
+ZIP_DEFLATED = 8
+ZIP_CREATE_SYSTEM = 0 if sys.platform == "win32" else 3
+ZIP_UTF8_FLAG = 0x800
+ZIP_MAX_SIZE = 0xFFFFFFFF
+LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+CENTRAL_HEADER = struct.Struct("<4s4B4HL2L5H2L")
+END_RECORD = struct.Struct("<4s4H2LH")
+
+
+class ArchiveEntry(NamedTuple):
+    path: Path
+    crc: int
+    file_size: int
+    compress_size: int
+
+
+class FontArchiveStore:
+    """Directory of raw deflate streams of font files.
+
+    Entries are keyed by the content hash of the font and the compression
+    level, so fonts shared by episodes or unchanged between builds are only
+    compressed once. The directory is kept under `max_size` bytes by evicting
+    the least recently used entries.
+    """
+
+    def __init__(self, folder: Path, max_size: int = 256 * 1024 * 1024) -> None:
+        folder.mkdir(parents=True, exist_ok=True)
+        self.folder = folder
+        self.max_size = max_size
+
+    def _entry(self, content_hash: str, level: int) -> Path:
+        return self.folder / f"{content_hash}-{level}-v{STORE_VERSION}.deflate"
+
+    def entry(self, font: Path, content_hash: str, level: int) -> ArchiveEntry:
+        """Return the compressed entry of `font`, compressing it if needed."""
+        path = self._entry(content_hash, level)
+        try:
+            with path.open("rb") as fp:
+                crc, file_size = ENTRY_HEADER.unpack(fp.read(ENTRY_HEADER.size))
+            compress_size = path.stat().st_size - ENTRY_HEADER.size
+            # mark as recently used
+            os.utime(path)
+        except (FileNotFoundError, struct.error):
+            return self._store(font, path, level)
+        return ArchiveEntry(path, crc, file_size, compress_size)
+
+    def _store(self, font: Path, path: Path, level: int) -> ArchiveEntry:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        crc = file_size = compress_size = 0
+        temp_path = path.with_name(f"{path.name}.{os.getpid()}.{os.urandom(4).hex()}.tmp")
+        with font.open("rb") as src, temp_path.open("wb") as dst:
+            dst.write(ENTRY_HEADER.pack(0, 0))
+            while chunk := src.read(1 << 20):
+                crc = zlib.crc32(chunk, crc)
+                file_size += len(chunk)
+                compress_size += dst.write(compressor.compress(chunk))
+            compress_size += dst.write(compressor.flush())
+            dst.seek(0)
+            dst.write(ENTRY_HEADER.pack(crc, file_size))
+        os.replace(temp_path, path)
+        return ArchiveEntry(path, crc, file_size, compress_size)
+
+    def entries(
+        self, fonts: list[Path], content_hashes: list[str], level: int, jobs: int | None = None
+    ) -> list[ArchiveEntry]:
+        """Return the compressed entries of `fonts`, compressing the missing ones in parallel threads."""
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            return list(executor.map(self.entry, fonts, content_hashes, [level] * len(fonts)))
+
+    def evict(self) -> None:
+        """Remove the least recently used entries until the store fits in `max_size`."""
+        entries = []
+        for entry in self.folder.glob("*.deflate"):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry))
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries, key=lambda x: x[0]):
+            if total <= self.max_size:
+                break
+            try:
+                entry.unlink(missing_ok=True)
+            except PermissionError:
+                # still open on Windows, by a zip being written
+                continue
+            total -= size
+
+    def clear(self) -> None:
+        for entry in self.folder.glob("*.deflate"):
+            entry.unlink(missing_ok=True)
+
+
+def _encode_name(name: str) -> tuple[bytes, int]:
+    try:
+        return name.encode("ascii"), 0
+    except UnicodeEncodeError:
+        return name.encode("utf-8"), ZIP_UTF8_FLAG
+
+
+@traced()
+def write_font_archive(
+    target: Path,
+    fonts: list[Path],
+    store: FontArchiveStore,
+    comment: bytes = b"",
+    level: int = 6,
+    date_time: tuple[int, int, int, int, int, int] = (1980, 1, 1, 0, 0, 0),
+    jobs: int | None = None,
+    hash_font: Callable[[Path], str] = hash_file,
+) -> None:
+    """Write a zip of `fonts`, copying their compressed data from `store`.
+
+    Members are sorted by name and get the same timestamp and permissions,
+    so equal fonts give an equal zip. The result is the same as writing the
+    fonts with zipfile.ZipFile at the same compression level.
+
+    :param target: path of the zip file
+    :param fonts: font files, stored by file name
+    :param store: compressed entries of the fonts
+    :param comment: archive comment
+    :param level: zlib compression level
+    :param date_time: modification time of every member
+    :param jobs: number of threads compressing the fonts missing from `store`
+    :param hash_font: content hash of a font file
+    """
+    fonts = sorted(fonts, key=lambda x: x.name)
+    content_hashes = [hash_font(font) for font in fonts]
+    entries = store.entries(fonts, content_hashes, level, jobs)
+    dos_time = date_time[3] << 11 | date_time[4] << 5 | date_time[5] // 2
+    dos_date = (date_time[0] - 1980) << 9 | date_time[1] << 5 | date_time[2]
+    central_directory: list[bytes] = []
+    temp_target = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+    with temp_target.open("wb") as fp:
+        for font, content_hash, entry in zip(fonts, content_hashes, entries):
+            name, flags = _encode_name(font.name)
+            offset = fp.tell()
+            if offset > ZIP_MAX_SIZE:
+                raise ValueError("Too many fonts for a zip without ZIP64 extensions")
+            try:
+                src = entry.path.open("rb")
+            except FileNotFoundError:
+                # evicted by another build sharing the store, e.g. with --jobs
+                entry = store.entry(font, content_hash, level)
+                src = entry.path.open("rb")
+            with src:
+                if entry.file_size > ZIP_MAX_SIZE or entry.compress_size > ZIP_MAX_SIZE:
+                    raise ValueError(f"{font.name} is too large for a zip without ZIP64 extensions")
+                fp.write(
+                    LOCAL_HEADER.pack(
+                        b"PK\003\004",
+                        ZIP_VERSION,
+                        0,
+                        flags,
+                        ZIP_DEFLATED,
+                        dos_time,
+                        dos_date,
+                        entry.crc,
+                        entry.compress_size,
+                        entry.file_size,
+                        len(name),
+                        0,
+                    )
+                )
+                fp.write(name)
+                src.seek(ENTRY_HEADER.size)
+                shutil.copyfileobj(src, fp)
+            central_directory.append(
+                CENTRAL_HEADER.pack(
+                    b"PK\001\002",
+                    ZIP_VERSION,
+                    ZIP_CREATE_SYSTEM,
+                    ZIP_VERSION,
+                    0,
+                    flags,
+                    ZIP_DEFLATED,
+                    dos_time,
+                    dos_date,
+                    entry.crc,
+                    entry.compress_size,
+                    entry.file_size,
+                    len(name),
+                    0,
+                    0,
+                    0,
+                    0,
+                    0o644 << 16,
+                    offset,
+                )
+                + name
+            )
+        directory_offset = fp.tell()
+        for record in central_directory:
+            fp.write(record)
+        directory_size = fp.tell() - directory_offset
+        count = len(central_directory)
+        fp.write(
+            END_RECORD.pack(b"PK\005\006", 0, 0, count, count, directory_size, directory_offset, len(comment)) + comment
+        )
+    os.replace(temp_target, target)
+    store.evict()
@@ -0,0 +1,156 @@
+"""Persistent font metadata cache."""
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+from pathlib import Path
+
+from .fonts import FontInfo
+from .utils import hash_file
+
+__all__ = ("FontCache",)
+# Bump this whenever the stored FontInfo data changes
+CACHE_VERSION = 2
+
+
+def pack_codepoints(codepoints: frozenset[int] | None) -> list[list[int]] | None:
+    """Pack codepoints into a list of inclusive ``[start, end]`` ranges."""
+    if codepoints is None:
+        return None
+    ranges: list[list[int]] = []
+    for cp in sorted(codepoints):
+        if ranges and ranges[-1][1] == cp - 1:
+            ranges[-1][1] = cp
+        else:
+            ranges.append([cp, cp])
+    return ranges
+
+
+def unpack_codepoints(ranges: list[list[int]] | None) -> frozenset[int] | None:
+    if ranges is None:
+        return None
+    return frozenset(cp for start, end in ranges for cp in range(start, end + 1))
+
+
+def _info_to_dict(info: FontInfo) -> dict:
+    return {
+        "font_number": info.font_number,
+        "num_fonts": info.num_fonts,
+        "postscript": info.postscript,
+        "weight": info.weight,
+        "italic": info.italic,
+        "family_names": info.family_names,
+        "full_names": info.full_names,
+        "postscript_name": info.postscript_name,
+        "codepoints": pack_codepoints(info.codepoints),
+        "lazy": info.lazy,
+    }
+
+
+def _info_from_dict(fontfile: str, data: dict) -> FontInfo:
+    return FontInfo(
+        fontfile=fontfile,
+        font_number=data["font_number"],
+        num_fonts=data["num_fonts"],
+        postscript=data["postscript"],
+        weight=data["weight"],
+        italic=data["italic"],
+        family_names=data["family_names"],
+        full_names=data["full_names"],
+        postscript_name=data["postscript_name"],
+        codepoints=unpack_codepoints(data["codepoints"]),
+        lazy=data["lazy"],
+    )
+
+
+class FontCache:
+    """SQLite-backed cache of :class:`FontInfo` records.
+
+    Entries are keyed by the font path and invalidated when the file size or
+    modification time changes. When only the modification time differs, the
+    content hash is compared before throwing the entry away, so copying a
+    fonts folder around does not force a rescan.
+    """
+
+    def __init__(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(str(path))
+        (version,) = self._conn.execute("PRAGMA user_version").fetchone()
+        if version != CACHE_VERSION:
+            self._conn.execute("DROP TABLE IF EXISTS fonts")
+            self._conn.execute(f"PRAGMA user_version = {CACHE_VERSION}")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS fonts ("
+            "path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, hash TEXT, error TEXT, data TEXT)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _key(fontfile: str | Path) -> str:
+        return str(Path(fontfile).resolve())
+
+    def load(self, fontfile: str, lazy: bool = False) -> tuple[list[FontInfo], str | None] | None:
+        """Return the cached faces and read error of `fontfile`, or None if not cached or stale.
+
+        :param lazy: accept faces whose glyph coverage was not read, otherwise they are a cache miss
+        """
+        key = self._key(fontfile)
+        row = self._conn.execute("SELECT size, mtime, hash, error, data FROM fonts WHERE path = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        size, mtime, content_hash, error, data = row
+        try:
+            stat = os.stat(fontfile)
+        except OSError:
+            return None
+        if stat.st_size != size:
+            return None
+        if stat.st_mtime_ns != mtime:
+            if hash_file(fontfile) != content_hash:
+                return None
+            self._conn.execute("UPDATE fonts SET mtime = ? WHERE path = ?", (stat.st_mtime_ns, key))
+        infos = [_info_from_dict(fontfile, info) for info in json.loads(data)]
+        if not lazy and any(info.lazy for info in infos):
+            return None
+        return infos, error
+
+    def store(self, fontfile: str, infos: list[FontInfo], error: str | None) -> None:
+        stat = os.stat(fontfile)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO fonts (path, size, mtime, hash, error, data) VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                self._key(fontfile),
+                stat.st_size,
+                stat.st_mtime_ns,
+                hash_file(fontfile),
+                error,
+                json.dumps([_info_to_dict(info) for info in infos]),
+            ),
+        )
+
+    def prune(self) -> int:
+        """Remove entries of fonts that no longer exist, returning the number of removed entries."""
+        stale = [(path,) for (path,) in self._conn.execute("SELECT path FROM fonts") if not os.path.exists(path)]
+        self._conn.executemany("DELETE FROM fonts WHERE path = ?", stale)
+        self._conn.commit()
+        return len(stale)
+
+    def clear(self) -> None:
+        """Drop every entry, forcing a full rescan on the next use."""
+        self._conn.execute("DELETE FROM fonts")
+        self._conn.commit()
+
+    def commit(self) -> None:
+        self._conn.commit()
+
+    def close(self) -> None:
+        self._conn.commit()
+        self._conn.close()
+
+    def __enter__(self) -> FontCache:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,205 @@
+"""Font subsetting for attachments, with a cache of the subset fonts."""
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import shutil
+from collections.abc import Callable
+from pathlib import Path
+
+from fontTools import subset
+from fontTools.ttLib import ttFont
+
+from ._metadata import __version__
+from .extended_ass import ExtendedAssFile
+from .fonts import Font, strip_fontname
+from .merger import OVERRIDE_BLOCK_PATTERN
+from .profiling import count, traced
+from .utils import hash_file
+
+__all__ = (
+    "FontSubsetCache",
+    "subset_family_name",
+    "subset_font",
+    "rename_fonts",
+    "subset_fonts",
+)
+# Bump this whenever the produced subsets change
+CACHE_VERSION = 3
+# \fn followed by a font name, which ends at the next tag or at the end of the block
+FONT_TAG_PATTERN = re.compile(r"(\\\s*fn)(\s*)(@?)([^\\(}]*?)(?=\s*(?:\\|$))")
+
+
+def subset_family_name(font_name: str) -> str:
+    """Unique family name given to the subsets of the fonts requested as `font_name`."""
+    digest = hashlib.blake2b(font_name.lower().encode("utf-8"), digest_size=5).hexdigest()
+    return f"SubPy {digest.upper()}"
+
+
+def _rename_font(font: ttFont.TTFont, family: str) -> None:
+    name_table = font["name"]
+    subfamily = name_table.getDebugName(17) or name_table.getDebugName(2) or "Regular"
+    full_name = f"{family} {subfamily}"
+    postscript_name = f"{family}-{subfamily}".replace(" ", "")
+    new_names = {1: family, 3: postscript_name, 4: full_name, 6: postscript_name, 16: family, 21: family}
+    for record in name_table.names:
+        if (new_name := new_names.get(record.nameID)) is not None:
+            record.string = new_name
+    if "CFF " in font:
+        cff = font["CFF "].cff
+        cff.fontNames = [postscript_name]
+        top_dict = cff.topDictIndex[0]
+        top_dict.FamilyName = family
+        top_dict.FullName = full_name
+
+
+def subset_font(fontfile: str, font_number: int, codepoints: set[int], family: str) -> ttFont.TTFont:
+    """Subset a font to `codepoints` and rename it to `family`.
+
+    :param fontfile: path to the font file
+    :param font_number: index of the font in a collection
+    :param codepoints: codepoints to keep, with the glyphs they need for layout
+    :param family: new family name
+    :return: the subset font
+    """
+    # keep the modified date of the original font, so equal subsets give equal files
+    font = ttFont.TTFont(fontfile, fontNumber=font_number, recalcTimestamp=False)
+    options = subset.Options()
+    options.layout_features = ["*"]
+    options.name_IDs = ["*"]
+    options.name_languages = ["*"]
+    options.notdef_outline = True
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(unicodes=codepoints)
+    subsetter.subset(font)
+    _rename_font(font, family)
+    return font
+
+
+class FontSubsetCache:
+    """Directory of subset fonts.
+
+    Entries are keyed by the content hash of the font, the codepoints and the
+    family name of the subset, so unchanged episodes reuse their subsets. The
+    directory is kept under `max_size` bytes by evicting the least recently
+    used entries.
+    """
+
+    def __init__(self, folder: Path, max_size: int = 256 * 1024 * 1024) -> None:
+        folder.mkdir(parents=True, exist_ok=True)
+        self.folder = folder
+        self.max_size = max_size
+
+    def _entry(self, font_hash: str, font_number: int, codepoints: set[int], family: str) -> Path:
+        data = repr((CACHE_VERSION, __version__, font_hash, font_number, family, sorted(codepoints)))
+        return self.folder / hashlib.blake2b(data.encode("utf-8"), digest_size=16).hexdigest()
+
+    def subset(self, font: Font, font_hash: str, codepoints: set[int], family: str) -> Path:
+        """Return the path of the subset of `font`, creating it if needed.
+
+        The file is named after the family and the original font file, and is
+        meant to be attached as is.
+        """
+        entry = self._entry(font_hash, font.font_number, codepoints, family)
+        for cached in entry.glob("*"):
+            # mark as recently used
+            os.utime(entry)
+            return cached
+        subset_ttf = subset_font(font.fontfile, font.font_number, codepoints, family)
+        stem = Path(font.fontfile).stem
+        if font.num_fonts > 1:
+            stem = f"{stem}-{font.font_number}"
+        suffix = ".otf" if subset_ttf.sfntVersion == "OTTO" else ".ttf"
+        name = f"{family.replace(' ', '')}-{stem}{suffix}"
+        temp_entry = entry.with_name(f"{entry.name}.{os.getpid()}.tmp")
+        temp_entry.mkdir(exist_ok=True)
+        subset_ttf.save(str(temp_entry / name))
+        subset_ttf.close()
+        try:
+            os.replace(temp_entry, entry)
+        except OSError:
+            # stored by another process in the meantime
+            shutil.rmtree(temp_entry, ignore_errors=True)
+        self._evict()
+        return entry / name
+
+    def _evict(self) -> None:
+        entries = []
+        for entry in self.folder.iterdir():
+            if entry.suffix == ".tmp":
+                continue
+            try:
+                stat = entry.stat()
+                size = sum(path.stat().st_size for path in entry.iterdir())
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, size, entry))
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries, key=lambda x: x[0]):
+            if total <= self.max_size:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+    def clear(self) -> None:
+        for entry in self.folder.iterdir():
+            shutil.rmtree(entry, ignore_errors=True)
+
+
+def rename_fonts(ass_file: ExtendedAssFile, renames: dict[str, str]) -> None:
+    """Rename the fonts used by the styles and the \\fn tags of `ass_file`.
+
+    :param ass_file: script to modify
+    :param renames: new name of each font, by lowercase font name
+    """
+
+    def rename(font_name: str) -> str | None:
+        return renames.get(strip_fontname(font_name).lower())
+
+    def replace_tag(match: re.Match) -> str:
+        tag, space, vertical, name = match.groups()
+        if not name or (new_name := renames.get(name.lower())) is None:
+            return match.group(0)
+        return f"{tag}{space}{vertical}{new_name}"
+
+    def replace_block(match: re.Match) -> str:
+        return FONT_TAG_PATTERN.sub(replace_tag, match.group(0)[1:-1]).join("{}")
+
+    for style in ass_file.styles:
+        if (new_name := rename(style.font_name)) is not None:
+            prefix = "@" if style.font_name.startswith("@") else ""
+            style.font_name = prefix + new_name
+    for event in ass_file.events:
+        text = event.text
+        if "fn" in text and (new_text := OVERRIDE_BLOCK_PATTERN.sub(replace_block, text)) != text:
+            event.text = new_text
+
+
+@traced()
+def subset_fonts(
+    doc: ExtendedAssFile,
+    font_usage: dict[tuple[str, Font], set[str]],
+    cache: FontSubsetCache,
+    hash_font: Callable[[Path], str] = hash_file,
+) -> tuple[ExtendedAssFile, list[Path]]:
+    """Subset the fonts used by `doc` and rename them to unique families.
+
+    :param doc: script the fonts were resolved for, left untouched
+    :param font_usage: characters used per (requested font name, resolved font), see FontValidator.font_usage
+    :param cache: where the subsets are stored
+    :param hash_font: content hash of a font file
+    :return: a copy of `doc` using the renamed fonts, and the subset font files
+    """
+    renames: dict[str, str] = {}
+    subset_files: dict[Path, None] = {}
+    for (font_name, font), chars in sorted(
+        font_usage.items(), key=lambda x: (x[0][0], x[0][1].fontfile, x[0][1].font_number)
+    ):
+        family = renames.setdefault(font_name, subset_family_name(font_name))
+        codepoints = {ord(char) for char in chars}
+        subset_files[cache.subset(font, hash_font(Path(font.fontfile)), codepoints, family)] = None
+    count("fonts subset", len(subset_files))
+    renamed = doc.copy()
+    rename_fonts(renamed, renames)
+    return renamed, list(subset_files)
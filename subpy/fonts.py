@@ -3,20 +3,33 @@
 from __future__ import annotations
 import collections
 
+import bisect
 import itertools
+import os
 import re
-from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, replace
+from functools import partial
 from pathlib import Path
-from typing import Generator
+from typing import TYPE_CHECKING, Generator, NamedTuple
 
+from ass_parser import AssEvent
 from fontTools.misc import encodingTools
 from fontTools.ttLib import ttFont
 
+from .analysis import EventVisitor, ScriptAnalysis, analyze_script
 from .extended_ass import ExtendedAssFile
+from .profiling import count, span, traced
+
+if TYPE_CHECKING:
+    from .font_cache import FontCache
 
 __all__ = (
+    "FontInfo",
+    "FontValidator",
     "deduplicates_fonts",
     "get_fonts",
+    "find_font_files",
     "find_fonts",
     "validate_fonts",
 )
@@ -26,7 +39,7 @@ LINE_PATTERN = re.compile(r"(?:\{(?P<tags>[^}]*)\}?)?(?P<text>[^{]*)")
 TEXT_WHITESPACE_PATTERN = re.compile(r"\\[nNh]")
 
 
-@dataclass
+@dataclass(frozen=True)
 class State:
     font: str
     italic: int
@@ -34,6 +47,10 @@ class State:
     drawing: bool
 
 
+# (override block, incoming state, line style) -> resulting state
+TagCache = dict[tuple[str, State, State], State]
+
+
 def strip_fontname(s: str):
     if s.startswith("@"):
         return s[1:]
@@ -48,133 +65,269 @@ def parse_int(s: str) -> int:
         return 0
 
 
+def _tag_fn(args: list[str], state: State, line_style: State, styles: dict[str, State]) -> State:
+    if len(args) == 0:
+        font = line_style.font
+    else:
+        font = strip_fontname(args[0])
+    return replace(state, font=font)
+
+
+def _tag_b(args: list[str], state: State, line_style: State, styles: dict[str, State]) -> State:
+    weight = None if len(args) == 0 else parse_int(args[0])
+    if weight is None:
+        transformed = None
+    elif weight == 0:
+        transformed = 400
+    elif weight in (1, -1):
+        transformed = 700
+    elif 100 <= weight <= 900:
+        transformed = weight
+    else:
+        transformed = None
+
+    return replace(state, weight=transformed or line_style.weight)
+
+
+def _tag_i(args: list[str], state: State, line_style: State, styles: dict[str, State]) -> State:
+    slant = None if len(args) == 0 else parse_int(args[0])
+    return replace(state, italic=slant == 1 if slant in (0, 1) else line_style.italic)
+
+
+def _tag_p(args: list[str], state: State, line_style: State, styles: dict[str, State]) -> State:
+    scale = 0 if len(args) == 0 else parse_int(args[0])
+    return replace(state, drawing=scale != 0)
+
+
+def _tag_r(args: list[str], state: State, line_style: State, styles: dict[str, State]) -> State:
+    if len(args) == 0:
+        style = line_style
+    else:
+        if (style := styles.get(args[0])) is None:
+            print(rf"Warning: \r argument {args[0]} does not exist; defaulting to line style")
+            style = line_style
+    return replace(state, font=style.font, italic=style.italic, weight=style.weight)
+
+
+def _tag_t(args: list[str], state: State, line_style: State, styles: dict[str, State]) -> State:
+    if len(args) > 0:
+        state = parse_tags(args[0], state, line_style, styles)
+    return state
+
+
+# first character of a tag -> (tag name, names of other tags sharing the prefix, handler)
+TAG_DISPATCH = {
+    "f": ("fn", (), _tag_fn),
+    "b": ("b", ("blur", "be", "bord"), _tag_b),
+    "i": ("i", ("iclip",), _tag_i),
+    "p": ("p", ("pos", "pbo"), _tag_p),
+    "r": ("r", (), _tag_r),
+    "t": ("t", (), _tag_t),
+}
+
+
 def parse_tags(s: str, state: State, line_style: State, styles: dict[str, State]) -> State:
     for match in TAG_PATTERN.finditer(s):
         value, paren = match.groups()
-
-        def get_tag(name, *exclude):
-            if value.startswith(name) and not any(value.startswith(ex) for ex in exclude):
-                args = []
-                if paren is not None:
-                    args.append(paren)
-                if len(stripped := value[len(name) :].lstrip()) > 0:
-                    args.append(stripped)
-                return args
-            else:
-                return None
-
-        if (args := get_tag("fn")) is not None:
-            if len(args) == 0:
-                font = line_style.font
-            else:
-                font = strip_fontname(args[0])
-            state.font = font
-        elif (args := get_tag("b", "blur", "be", "bord")) is not None:
-            weight = None if len(args) == 0 else parse_int(args[0])
-            if weight is None:
-                transformed = None
-            elif weight == 0:
-                transformed = 400
-            elif weight in (1, -1):
-                transformed = 700
-            elif 100 <= weight <= 900:
-                transformed = weight
-            else:
-                transformed = None
-
-            state.weight = transformed or line_style.weight
-        elif (args := get_tag("i", "iclip")) is not None:
-            slant = None if len(args) == 0 else parse_int(args[0])
-            state.italic = slant == 1 if slant in (0, 1) else line_style.italic
-        elif (args := get_tag("p", "pos", "pbo")) is not None:
-            scale = 0 if len(args) == 0 else parse_int(args[0])
-            state.drawing = scale != 0
-        elif (args := get_tag("r")) is not None:
-            if len(args) == 0:
-                style = line_style
-            else:
-                if (style := styles.get(args[0])) is None:
-                    print(rf"Warning: \r argument {args[0]} does not exist; defaulting to line style")
-                    style = line_style
-            state.font = style.font
-            state.italic = style.italic
-            state.weight = style.weight
-        elif (args := get_tag("t")) is not None:
-            if len(args) > 0:
-                state = parse_tags(args[0], state, line_style, styles)
+        if (tag := TAG_DISPATCH.get(value[0])) is None:
+            continue
+        name, exclude, handler = tag
+        if not value.startswith(name) or value.startswith(exclude):
+            continue
+        args = []
+        if paren is not None:
+            args.append(paren)
+        if len(stripped := value[len(name) :].lstrip()) > 0:
+            args.append(stripped)
+        state = handler(args, state, line_style, styles)
 
     return state
 
 
 def parse_text(text: str) -> str:
-    return re.sub(TEXT_WHITESPACE_PATTERN, " ", text)
+    if "\\" not in text:
+        return text
+    return TEXT_WHITESPACE_PATTERN.sub(" ", text)
+
 
+def parse_line(
+    line: str, line_style: State, styles: dict[str, State], cache: TagCache | None = None
+) -> Generator[tuple[State, str], None, None]:
+    """Split `line` into text segments and the state they are rendered with.
 
-def parse_line(line: str, line_style: State, styles: dict[str, State]) -> Generator[tuple[State, str], None, None]:
+    Override blocks are looked up in `cache` first, so repeated blocks are only parsed once.
+    """
     state = line_style
     for tags, text in LINE_PATTERN.findall(line):
         if len(tags) > 0:
-            state = parse_tags(tags, state, line_style, styles)
+            if cache is None:
+                state = parse_tags(tags, state, line_style, styles)
+            else:
+                key = (tags, state, line_style)
+                try:
+                    state = cache[key]
+                except KeyError:
+                    state = cache[key] = parse_tags(tags, state, line_style, styles)
         if len(text) > 0:
             yield state, parse_text(text)
 
 
-class Font:
-    def __init__(self, fontfile, font_number=0):
-        self.fontfile = fontfile
-        self.font = ttFont.TTFont(fontfile, fontNumber=font_number)
-        self.num_fonts = getattr(self.font.reader, "numFonts", 1)
-        self.postscript = self.font.has_key("CFF ")
-        self.glyphs = self.font.getGlyphSet()
-
-        os2 = self.font["OS/2"]
-        self.weight = os2.usWeightClass  # type: ignore
-        self.italic = os2.fsSelection & 0b1 > 0  # type: ignore
-        self.slant = self.italic * 110
-        self.width = 100
+@dataclass
+class FontInfo:
+    """Metadata of a single font face, enough to match and validate without fontTools."""
+
+    fontfile: str
+    font_number: int
+    num_fonts: int
+    postscript: bool
+    weight: int
+    italic: bool
+    family_names: list[str]
+    full_names: list[str]
+    postscript_name: str
+    # None means that the font has no usable cmap
+    codepoints: frozenset[int] | None
+    # True if the coverage has not been read yet, see Font.load_coverage
+    lazy: bool = False
+
+
+def read_coverage(font: ttFont.TTFont) -> frozenset[int] | None:
+    if uniTable := font.getBestCmap():
+        return frozenset(uniTable)
+    elif symbolTable := font["cmap"].getcmap(3, 0):  # type: ignore
+        macTable = font["cmap"].getcmap(1, 0)  # type: ignore
+        encoding = encodingTools.getEncoding(1, 0, macTable.language) if macTable else "mac_roman"
+        coverage: set[int] = set()
+        for byte in range(256):
+            if byte + 0xF000 not in symbolTable.cmap:
+                continue
+            try:
+                coverage.update(map(ord, bytes([byte]).decode(encoding)))
+            except UnicodeDecodeError:
+                pass
+        return frozenset(coverage)
+    else:
+        return None
+
+
+def read_font_info(fontfile: str, font_number: int = 0, lazy: bool = False) -> FontInfo:
+    """Read the metadata of a font face.
+
+    With `lazy`, only the ``name``, ``OS/2`` and ``head`` tables are read and the
+    glyph coverage is left to be loaded on demand.
+    """
+    font = ttFont.TTFont(fontfile, fontNumber=font_number, lazy=lazy or None)
+    try:
+        num_fonts = getattr(font.reader, "numFonts", 1)
+        postscript = font.has_key("CFF ")
+        if not lazy:
+            # fail early if glyph tables can't be accessed
+            font.getGlyphSet()
 
-        self.names = [name for name in self.font["name"].names if name.platformID == 3 and name.platEncID in (0, 1)]  # type: ignore # noqa
-        self.family_names = [name.string.decode("utf_16_be") for name in self.names if name.nameID == 1]
-        self.full_names = [name.string.decode("utf_16_be") for name in self.names if name.nameID == 4]
-        self.postscript_name = ""
+        os2 = font["OS/2"]
+        weight = os2.usWeightClass  # type: ignore
+        italic = os2.fsSelection & 0b1 > 0  # type: ignore
 
-        for name in self.font["name"].names:  # type: ignore
+        names = [name for name in font["name"].names if name.platformID == 3 and name.platEncID in (0, 1)]  # type: ignore # noqa
+        family_names = [name.string.decode("utf_16_be") for name in names if name.nameID == 1]
+        full_names = [name.string.decode("utf_16_be") for name in names if name.nameID == 4]
+        postscript_name = ""
+
+        for name in font["name"].names:  # type: ignore
             if (
                 name.nameID == 6
                 and (encoding := encodingTools.getEncoding(name.platformID, name.platEncID, name.langID)) is not None
             ):
-                self.postscript_name = name.string.decode(encoding).strip()
+                postscript_name = name.string.decode(encoding).strip()
 
                 # these are the two recommended formats, prioritize them
                 if (name.platformID, name.platEncID, name.langID) in [(1, 0, 0), (3, 1, 0x409)]:
                     break
 
+        mac_italic = font["head"].macStyle & 0b10 > 0  # type: ignore
+        if mac_italic != italic:
+            print(f"warning: different italic values in macStyle and fsSelection for font {postscript_name}")
+
+        return FontInfo(
+            fontfile=fontfile,
+            font_number=font_number,
+            num_fonts=num_fonts,
+            postscript=postscript,
+            weight=weight,
+            italic=italic,
+            family_names=family_names,
+            full_names=full_names,
+            postscript_name=postscript_name,
+            codepoints=None if lazy else read_coverage(font),
+            lazy=lazy,
+        )
+    finally:
+        font.close()
+
+
+def read_font_infos(fontfile: str, lazy: bool = False) -> tuple[list[FontInfo], str | None]:
+    """Read every face of `fontfile`, returning the faces read so far and the error (if any)."""
+    infos: list[FontInfo] = []
+    try:
+        info = read_font_info(fontfile, lazy=lazy)
+        infos.append(info)
+        for i in range(1, info.num_fonts):
+            infos.append(read_font_info(fontfile, font_number=i, lazy=lazy))
+    except Exception as e:
+        return infos, str(e)
+    return infos, None
+
+
+class Font:
+    def __init__(self, fontfile, font_number=0, info: FontInfo | None = None):
+        if info is None:
+            info = read_font_info(fontfile, font_number)
+        self.info = info
+        self.fontfile = info.fontfile
+        self.font_number = info.font_number
+        self.num_fonts = info.num_fonts
+        self.postscript = info.postscript
+
+        self.weight = info.weight
+        self.italic = info.italic
+        self.slant = self.italic * 110
+        self.width = 100
+
+        self.family_names = info.family_names
+        self.full_names = info.full_names
+        self.postscript_name = info.postscript_name
+
         exact_names = [self.postscript_name] if (self.postscript and self.postscript_name) else self.full_names
         self.exact_names = [
             name for name in exact_names if all(name.lower() != family.lower() for family in self.family_names)
         ]
 
-        mac_italic = self.font["head"].macStyle & 0b10 > 0  # type: ignore
-        if mac_italic != self.italic:
-            print(f"warning: different italic values in macStyle and fsSelection for font {self.postscript_name}")
+        if not info.lazy:
+            # warn early if glyph tables can't be accessed
+            self.missing_glyphs("")
 
-        # fail early if glyph tables can't be accessed
-        self.missing_glyphs("")
+    def load_coverage(self) -> None:
+        """Read the glyph coverage of a lazily loaded font."""
+        try:
+            font = ttFont.TTFont(self.fontfile, fontNumber=self.font_number, lazy=True)
+            try:
+                self.info.codepoints = read_coverage(font)
+            finally:
+                font.close()
+        except Exception as e:
+            print(f"Error reading glyphs of {self.fontfile}: {e}")
+            self.info.codepoints = None
+        self.info.lazy = False
+
+    @property
+    def codepoints(self) -> frozenset[int] | None:
+        if self.info.lazy:
+            self.load_coverage()
+        return self.info.codepoints
 
     def missing_glyphs(self, text):
-        if uniTable := self.font.getBestCmap():
-            return [c for c in text if ord(c) not in uniTable]
-        elif symbolTable := self.font["cmap"].getcmap(3, 0):  # type: ignore
-            macTable = self.font["cmap"].getcmap(1, 0)  # type: ignore
-            encoding = encodingTools.getEncoding(1, 0, macTable.language) if macTable else "mac_roman"
-            missing = []
-            for c in text:
-                try:
-                    if (c.encode(encoding)[0] + 0xF000) not in symbolTable.cmap:
-                        missing.append(c)
-                except UnicodeEncodeError:
-                    missing.append(c)
-            return missing
+        if (codepoints := self.codepoints) is not None:
+            return [c for c in text if ord(c) not in codepoints]
         else:
             print(f"warning: could not read glyphs for font {self}")
 
@@ -182,20 +335,156 @@ class Font:
         return f"{self.postscript_name}(italic={self.italic}, weight={self.weight})"
 
 
+class FamilyIndex:
+    """Fonts of a single family, grouped by slant and sorted by weight.
+
+    Finds the same font as ``min(fonts, key=FontCollection.similarity)`` by bisecting
+    the nearest weights of each slant group instead of scanning the whole family.
+    """
+
+    def __init__(self, fonts: list[Font]):
+        groups: dict[int, list[tuple[int, int, Font]]] = collections.defaultdict(list)
+        for order, font in enumerate(fonts):
+            groups[font.slant].append((font.weight, order, font))
+        self.groups: list[tuple[int, list[int], list[tuple[int, int, Font]]]] = []
+        for slant, entries in groups.items():
+            entries.sort(key=lambda x: (x[0], x[1]))
+            self.groups.append((slant, [weight for weight, _, _ in entries], entries))
+
+    def best(self, weight: int, italic: int) -> Font:
+        best: tuple[int, int, Font] | None = None
+        for slant, weights, entries in self.groups:
+            idx = bisect.bisect_left(weights, weight)
+            candidates = []
+            if idx < len(entries):
+                candidates.append(entries[idx])
+            if idx > 0:
+                # first (in family order) of the fonts with the closest lower weight
+                candidates.append(entries[bisect.bisect_left(weights, weights[idx - 1])])
+            for font_weight, order, font in candidates:
+                score = abs(weight - font_weight) + abs(italic * 100 - slant)
+                if best is None or (score, order) < best[:2]:
+                    best = (score, order, font)
+        assert best is not None
+        return best[2]
+
+
+class MatchCacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+def scan_fonts(
+    fontfiles: list[str], lazy: bool = False, jobs: int | None = None
+) -> list[tuple[list[FontInfo], str | None]]:
+    """Read the faces of every font file, in worker processes if `jobs` allows it.
+
+    The results are returned in the same order as `fontfiles`.
+    """
+    jobs = min(jobs or os.cpu_count() or 1, len(fontfiles))
+    if jobs <= 1:
+        return [read_font_infos(f, lazy) for f in fontfiles]
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        chunksize = max(1, len(fontfiles) // (jobs * 4))
+        return list(executor.map(partial(read_font_infos, lazy=lazy), fontfiles, chunksize=chunksize))
+
+
+def _stat_key(fontfile: str) -> tuple[int, int] | None:
+    try:
+        stat = os.stat(fontfile)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _coverage_count(fonts: list[Font]) -> int:
+    return sum(not font.info.lazy for font in fonts)
+
+
 class FontCollection:
-    def __init__(self, fontfiles: list[tuple[str, str]]):
-        self.fonts: list[Font] = []
-        for name, f in fontfiles:
-            try:
-                font = Font(f)
-                self.fonts.append(font)
-                if font.num_fonts > 1:
-                    for i in range(1, font.num_fonts):
-                        self.fonts.append(Font(f, font_number=i))
-            except Exception as e:
-                print(f"Error reading {name}: {e}")
-
-        self.cache = {}
+    def __init__(
+        self,
+        fontfiles: list[tuple[str, str]],
+        cache: FontCache | None = None,
+        lazy: bool = False,
+        jobs: int | None = None,
+        match_cache_size: int = 4096,
+    ):
+        with span("scan_fonts", files=len(fontfiles)):
+            results = [cache.load(f, lazy) if cache is not None else None for _, f in fontfiles]
+            missing = [f for (_, f), result in zip(fontfiles, results) if result is None]
+            scanned = iter(scan_fonts(missing, lazy, jobs))
+
+            fonts: list[Font] = []
+            lazy_files: dict[str, tuple[list[Font], str | None, tuple[int, int] | None]] = {}
+            for (name, f), cached in zip(fontfiles, results):
+                if cached is None:
+                    infos, error = next(scanned)
+                    if cache is not None:
+                        cache.store(f, infos, error)
+                else:
+                    infos, error = cached
+                file_fonts = [Font(f, info=info) for info in infos]
+                fonts.extend(file_fonts)
+                if cache is not None and any(info.lazy for info in infos):
+                    lazy_files[f] = (file_fonts, error, _stat_key(f))
+                if error is not None:
+                    print(f"Error reading {name}: {error}")
+            if cache is not None:
+                cache.commit()
+        count("fonts loaded", len(fonts))
+        count("font cache hits", len(fontfiles) - len(missing))
+        self._index(fonts, match_cache_size)
+        # faces of the files read lazily with their read error and stat, and the number of faces with coverage stored
+        self._lazy_files = lazy_files
+        self._stored_coverage = {f: _coverage_count(file_fonts) for f, (file_fonts, _, _) in lazy_files.items()}
+
+    @classmethod
+    def from_fonts(cls, fonts: list[Font], match_cache_size: int = 4096) -> FontCollection:
+        """Create a collection out of already loaded fonts."""
+        collection = cls.__new__(cls)
+        collection._index(fonts, match_cache_size)
+        collection._lazy_files = {}
+        collection._stored_coverage = {}
+        return collection
+
+    def loaded_coverage(self) -> list[str]:
+        """Font files read lazily with faces whose coverage was loaded since it was last stored."""
+        return [
+            f
+            for f, (file_fonts, _, _) in self._lazy_files.items()
+            if _coverage_count(file_fonts) > self._stored_coverage[f]
+        ]
+
+    def store_coverage(self, cache: FontCache) -> int:
+        """Store the coverage loaded on demand in `cache`, so the next runs don't read the fonts again.
+
+        Files that changed since they were read are skipped. Returns the number of stored files.
+        """
+        stored = 0
+        for f in self.loaded_coverage():
+            file_fonts, error, stat_key = self._lazy_files[f]
+            self._stored_coverage[f] = _coverage_count(file_fonts)
+            if stat_key is None or _stat_key(f) != stat_key:
+                continue
+            cache.store(f, [font.info for font in file_fonts], error)
+            stored += 1
+        cache.commit()
+        return stored
+
+    def restrict(self, fontfiles: list[str]) -> FontCollection:
+        """Create a collection of only the fonts read from `fontfiles`, without reading them again."""
+        keep = set(fontfiles)
+        return FontCollection.from_fonts([font for font in self.fonts if font.fontfile in keep], self.cache_size)
+
+    def _index(self, fonts: list[Font], match_cache_size: int) -> None:
+        self.fonts = fonts
+        self.cache: collections.OrderedDict[tuple[str, int, int], tuple[Font | None, bool]] = collections.OrderedDict()
+        self.cache_size = match_cache_size
+        self.hits = 0
+        self.misses = 0
         self.by_full: dict[str, Font] = {name.lower(): font for font in self.fonts for name in font.exact_names}
         self.by_family: dict[str, list[Font]] = {
             name.lower(): [font for (_, font) in fonts]
@@ -204,6 +493,7 @@ class FontCollection:
                 key=lambda x: x[0],
             )
         }
+        self.family_index = {name: FamilyIndex(fonts) for name, fonts in self.by_family.items()}
 
     def similarity(self, state: State, font: Font) -> int:
         return abs(state.weight - font.weight) + abs(state.italic * 100 - font.slant)
@@ -211,81 +501,130 @@ class FontCollection:
     def _match(self, state: State) -> tuple[Font | None, bool]:
         if exact := self.by_full.get(state.font):
             return exact, True
-        elif family := self.by_family.get(state.font):
-            return min(family, key=lambda font: self.similarity(state, font)), False
+        elif family := self.family_index.get(state.font):
+            return family.best(state.weight, state.italic), False
         else:
             return None, False
 
     def match(self, state: State) -> tuple[Font | None, bool]:
-        state.font = state.font.lower()
-        state.drawing = False
+        key = (state.font.lower(), state.weight, state.italic)
         try:
-            return self.cache[state.font]
+            result = self.cache[key]
         except KeyError:
-            font = self._match(state)
-            self.cache[state.font] = font
-            return font
-
-
-def validate_fonts(
-    doc: ExtendedAssFile, fonts: FontCollection, ignore_drawings: bool = True, warn_on_exact: bool = False
-):
-    report = {
-        "missing_font": collections.defaultdict(set),
-        "missing_glyphs": collections.defaultdict(set),
-        "missing_glyphs_lines": collections.defaultdict(set),
-        "faux_bold": collections.defaultdict(set),
-        "faux_italic": collections.defaultdict(set),
-        "mismatch_bold": collections.defaultdict(set),
-        "mismatch_italic": collections.defaultdict(set),
-    }
-
-    styles = {
-        style.name: State(strip_fontname(style.font_name), style.italic, 700 if style.bold else 400, False)
-        for style in doc.styles
-    }
-
-    for i, line in enumerate(doc.events):
+            self.misses += 1
+            result = self._match(replace(state, font=key[0]))
+            self.cache[key] = result
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        else:
+            self.hits += 1
+            self.cache.move_to_end(key)
+        return result
+
+    def cache_info(self) -> MatchCacheInfo:
+        return MatchCacheInfo(self.hits, self.misses, self.cache_size, len(self.cache))
+
+
+class FontValidator(EventVisitor):
+    """Checks the fonts used by the events against a FontCollection, see validate_fonts."""
+
+    def __init__(
+        self, doc: ExtendedAssFile, fonts: FontCollection, ignore_drawings: bool = True, warn_on_exact: bool = False
+    ):
+        self.fonts = fonts
+        self.ignore_drawings = ignore_drawings
+        self.warn_on_exact = warn_on_exact
+        self.report = {
+            "missing_font": collections.defaultdict(set),
+            "missing_glyphs": collections.defaultdict(set),
+            "missing_glyphs_lines": collections.defaultdict(set),
+            "faux_bold": collections.defaultdict(set),
+            "faux_italic": collections.defaultdict(set),
+            "mismatch_bold": collections.defaultdict(set),
+            "mismatch_italic": collections.defaultdict(set),
+        }
+        self.styles = {
+            style.name: State(strip_fontname(style.font_name), style.italic, 700 if style.bold else 400, False)
+            for style in doc.styles
+        }
+        # Characters used per (requested font, resolved font) and line, checked once at the end
+        self.glyph_usage: dict[tuple[str, Font], dict[int, set[str]]] = collections.defaultdict(
+            lambda: collections.defaultdict(set)
+        )
+        # Characters rendered per (requested font, resolved font), including the text of lines with drawings
+        self.rendered: dict[tuple[str, Font], set[str]] = collections.defaultdict(set)
+        self.tag_cache: TagCache = {}
+        self.hits_before, self.misses_before = fonts.hits, fonts.misses
+
+    def visit(self, index: int, line: AssEvent) -> None:
         if line.is_comment:
-            continue
-        nline = i + 1
+            return
+        report = self.report
+        nline = index + 1
         drawing_force = "\\p1" in line.text
 
         try:
-            style = styles[line.style_name]
+            style = self.styles[line.style_name]
         except KeyError:
             print(f"Warning: unknown style {line.style_name} on line {nline}, assuming default styles")
             style = State("Arial", False, 400, False)
 
-        for state, text in parse_line(line.text, style, styles):
-            font, exact_match = fonts.match(state)
+        for state, text in parse_line(line.text, style, self.styles, self.tag_cache):
+            font, exact_match = self.fonts.match(state)
+            font_name = state.font.lower()
+
+            if font is not None and not state.drawing:
+                self.rendered[font_name, font].update(text)
 
-            if ignore_drawings and (state.drawing or drawing_force):
+            # drawing_force only silences the warnings, the text of the line is rendered all the same
+            if self.ignore_drawings and (state.drawing or drawing_force):
                 continue
 
             if font is None:
-                report["missing_font"][state.font].add(nline)
+                report["missing_font"][font_name].add(nline)
                 continue
 
             if state.weight >= font.weight + 150:
-                report["faux_bold"][state.font, state.weight, font.weight].add(nline)
+                report["faux_bold"][font_name, state.weight, font.weight].add(nline)
 
-            if state.weight <= font.weight - 150 and (not exact_match or warn_on_exact):
-                report["mismatch_bold"][state.font, state.weight, font.weight].add(nline)
+            if state.weight <= font.weight - 150 and (not exact_match or self.warn_on_exact):
+                report["mismatch_bold"][font_name, state.weight, font.weight].add(nline)
 
             if state.italic and not font.italic:
-                report["faux_italic"][state.font].add(nline)
+                report["faux_italic"][font_name].add(nline)
 
-            if not state.italic and font.italic and (not exact_match or warn_on_exact):
-                report["mismatch_italic"][state.font].add(nline)
+            if not state.italic and font.italic and (not exact_match or self.warn_on_exact):
+                report["mismatch_italic"][font_name].add(nline)
 
             if not state.drawing:
-                missing = font.missing_glyphs(text) or []
-                report["missing_glyphs"][state.font].update(missing)
-                if len(missing) > 0:
-                    report["missing_glyphs_lines"][state.font].add(nline)
-
-    return report
+                self.glyph_usage[font_name, font][nline].update(text)
+
+    def finish(self, analysis: ScriptAnalysis) -> None:
+        report = self.report
+        for (font_name, font), used_by_line in self.glyph_usage.items():
+            used_chars = set().union(*used_by_line.values())
+            missing = set(font.missing_glyphs(used_chars) or [])
+            report["missing_glyphs"][font_name].update(missing)
+            if len(missing) > 0:
+                report["missing_glyphs_lines"][font_name].update(
+                    nline for nline, chars in used_by_line.items() if not missing.isdisjoint(chars)
+                )
+        analysis.extra["fonts"] = report
+        count("font match cache hits", self.fonts.hits - self.hits_before)
+        count("font match cache misses", self.fonts.misses - self.misses_before)
+
+    def font_usage(self) -> dict[tuple[str, Font], set[str]]:
+        """Characters rendered with each resolved font, by (requested font name, font)."""
+        return dict(self.rendered)
+
+
+@traced()
+def validate_fonts(
+    doc: ExtendedAssFile, fonts: FontCollection, ignore_drawings: bool = True, warn_on_exact: bool = False
+):
+    validator = FontValidator(doc, fonts, ignore_drawings, warn_on_exact)
+    analyze_script(doc, [validator], default_visitors=())
+    return validator.report
 
 
 def deduplicates_fonts(fonts: list[Path]):
@@ -303,13 +642,19 @@ def get_fonts(path: Path) -> list[Path]:
     return list(path.glob("*.[to]t[fc]"))
 
 
-def find_fonts(base_folder: Path | list[Path]) -> tuple[FontCollection, list[Path]]:
+def find_font_files(base_folder: Path | list[Path]) -> list[Path]:
     base_folders = base_folder if isinstance(base_folder, list) else [base_folder]
     fonts: list[Path] = []
     for folder in base_folders:
         if not folder.exists():
             continue
         fonts.extend(get_fonts(folder))
-    fonts = deduplicates_fonts(fonts)
+    return deduplicates_fonts(fonts)
+
+
+def find_fonts(
+    base_folder: Path | list[Path], cache: FontCache | None = None, lazy: bool = False, jobs: int | None = None
+) -> tuple[FontCollection, list[Path]]:
+    fonts = find_font_files(base_folder)
     ft_forms = [(ff.name, str(ff)) for ff in fonts]
-    return FontCollection(ft_forms), fonts
+    return FontCollection(ft_forms, cache, lazy, jobs), fonts
@@ -0,0 +1,247 @@
+"""Memory-mapped ASS reading with lazily materialized events."""
+from __future__ import annotations
+
+import mmap
+import re
+from array import array
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from typing import Any, Optional, Union
+
+from ass_parser import AssEvent
+from ass_parser.ass_sections import AssEventList
+from ass_parser.ass_sections.const import EVENTS_SECTION_NAME, SECTION_HEADING_RE
+from ass_parser.errors import CorruptAssError, CorruptAssLineError
+
+from .extended_ass import ExtendedAssFile, _EventRows
+
+__all__ = ("LazyAssEventList", "read_ass_lazy")
+BOM = "\N{BOM}"
+BARE_CR_RE = re.compile(rb"\r(?!\n)")
+# Files up to this size are copied to memory instead of staying mapped
+COPY_SIZE = 4 << 20
+
+
+class LazyAssEventList(AssEventList):
+    """Event list that parses its lines from a memory-mapped file on first access.
+
+    Reading an event (by index, slice or iteration) only parses that event.
+    Any modification of the list parses every remaining event first, after
+    which it behaves exactly like an AssEventList. Errors in event lines are
+    reported when the offending event is parsed.
+    """
+
+    def __init__(self, name: str = EVENTS_SECTION_NAME) -> None:
+        super().__init__(name=name)
+        self._source: Optional[mmap.mmap] = None
+        self._header: tuple[int, str] = (0, "")
+        self._rows = _EventRows()
+        self._line_nums = array("q")
+        self._offsets = array("q")
+        self._ends = array("q")
+        self._pending = 0
+
+    def attach(self, source: mmap.mmap, header: tuple[int, str], line_nums: array, offsets: array, ends: array) -> None:
+        """Replace the content of self with the event lines at the given offsets of `source`.
+
+        `header` is the Format line of the section, as (line_num, line).
+        """
+        self.clear()
+        self._source = source
+        self._header = header
+        self._line_nums = line_nums
+        self._offsets = offsets
+        self._ends = ends
+        self._pending = len(offsets)
+        self._data = [None] * self._pending  # type: ignore[list-item]
+
+    @property
+    def materialized(self) -> int:
+        """Number of events parsed so far."""
+        return len(self._data) - self._pending
+
+    def _materialize(self, index: int) -> AssEvent:
+        assert self._source is not None
+        line_num = self._line_nums[index]
+        line = self._source[self._offsets[index] : self._ends[index]].decode("utf-8")
+        if line.startswith(BOM):
+            line = line[len(BOM) :]
+        line = line.strip()
+        event = self._parse_event(line_num, line)
+        event._parent = self  # pylint: disable=protected-access
+        event._index = index  # pylint: disable=protected-access
+        self._data[index] = event
+        self._pending -= 1
+        if not self._pending:
+            self._release()
+        return event
+
+    def _parse_event(self, line_num: int, line: str) -> AssEvent:
+        # ass_parser parses the row, with the same rules and errors as an eagerly read file
+        self._rows.consume_ass_body_lines([self._header, (line_num, line)])
+        return self._rows.rows.pop()
+
+    def _release(self) -> None:
+        self._source = None
+        self._line_nums = array("q")
+        self._offsets = array("q")
+        self._ends = array("q")
+
+    def materialize_all(self) -> None:
+        """Parse every event that was not accessed yet."""
+        if self._pending:
+            for index, event in enumerate(self._data):
+                if event is None:
+                    self._materialize(index)
+
+    def __getitem__(self, index: Union[int, slice]) -> Any:
+        if not self._pending:
+            return self._data[index]
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self._data)))]
+        event = self._data[index]
+        if event is None:
+            event = self._materialize(index if index >= 0 else index + len(self._data))
+        return event
+
+    def __iter__(self) -> Iterator[AssEvent]:
+        for index in range(len(self._data)):
+            yield self[index]
+
+    def __delitem__(self, index: Union[int, slice]) -> None:
+        self.materialize_all()
+        super().__delitem__(index)
+
+    def __setitem__(self, index: Union[int, slice], value: Any) -> None:
+        self.materialize_all()
+        super().__setitem__(index, value)
+
+    def insert(self, index: int, value: AssEvent) -> None:
+        self.materialize_all()
+        super().insert(index, value)
+
+    def extend(self, values: Iterable[AssEvent]) -> None:
+        self.materialize_all()
+        super().extend(values)
+
+    def clear(self) -> None:
+        # Events that were never parsed can't be observed by the removal subscribers
+        self._data = [event for event in self._data if event is not None]
+        self._pending = 0
+        self._release()
+        super().clear()
+
+    def __eq__(self, other: Any) -> bool:
+        self.materialize_all()
+        if isinstance(other, LazyAssEventList):
+            other.materialize_all()
+        return super().__eq__(other)
+
+
+def _index_events(
+    source: mmap.mmap, first_line_num: int, events: LazyAssEventList, section_lines: list[tuple[int, str]]
+) -> int:
+    """Index the body of the events section starting at the current position of `source`.
+
+    Stops before the next section heading and returns the number of lines consumed.
+    """
+    header: tuple[int, str] | None = None
+    line_nums, offsets, ends = array("q"), array("q"), array("q")
+    line_num = first_line_num
+    while True:
+        offset = source.tell()
+        raw = source.readline()
+        if not raw:
+            break
+        stripped = raw.strip()
+        if not stripped or stripped.startswith(b";"):
+            line_num += 1
+            continue
+        if stripped.startswith(b"[") and SECTION_HEADING_RE.match(stripped.decode("utf-8")):
+            source.seek(offset)
+            break
+        if header is None:
+            line = stripped.decode("utf-8")
+            section_lines.append((line_num, line))
+            try:
+                item_type, rest = line.split(":", 1)
+            except ValueError as exc:
+                raise CorruptAssLineError(line_num, line, "expected a colon") from exc
+            if item_type != "Format":
+                raise CorruptAssLineError(line_num, line, 'expected the table header to be named "Format"')
+            header = (line_num, line)
+        else:
+            line_nums.append(line_num)
+            offsets.append(offset)
+            ends.append(offset + len(raw))
+        line_num += 1
+    if header is None:
+        raise CorruptAssError("expected a table header")
+    events.attach(source, header, line_nums, offsets, ends)
+    return line_num - first_line_num
+
+
+def _consume_mmap(ass_file: ExtendedAssFile, source: mmap.mmap) -> None:
+    # Collect every non-event section as (line_num, line) like ass_parser does, only event lines are indexed
+    sections: list[tuple[str, bool, list[tuple[int, str]]]] = []
+    line_num = 1
+    while raw := source.readline():
+        line = raw.decode("utf-8")
+        if line.startswith(BOM):
+            line = line[len(BOM) :]
+        line = line.strip()
+        if line and not line.startswith(";"):
+            if match := SECTION_HEADING_RE.match(line):
+                name = match.group("section_name")
+                lines = [(line_num, line)]
+                if name == EVENTS_SECTION_NAME:
+                    assert isinstance(ass_file.events, LazyAssEventList)
+                    line_num += _index_events(source, line_num + 1, ass_file.events, lines)
+                    sections.append((name, True, lines))
+                else:
+                    sections.append((name, False, lines))
+            elif not sections:
+                raise CorruptAssLineError(line_num, line, "expected a section")
+            else:
+                if line.startswith("Format:"):
+                    sections[-1] = (sections[-1][0], True, sections[-1][2])
+                sections[-1][2].append((line_num, line))
+        line_num += 1
+    ass_file.consume_section_lines(
+        (name, is_tabular, lines) for name, is_tabular, lines in sections if name != EVENTS_SECTION_NAME
+    )
+
+
+def read_ass_lazy(path: Path) -> ExtendedAssFile:
+    """Read ASS from the specified path, parsing events only when they are accessed.
+
+    Files larger than COPY_SIZE are memory-mapped for as long as some events are not parsed yet. Such a
+    file must not be rewritten in place meanwhile: the events parsed afterwards would be read from the new
+    content, or the process killed by SIGBUS if the file got shorter. Smaller files are copied to memory.
+    Files that use bare carriage returns as line breaks are read normally.
+
+    :param path: path to the ASS file
+    :return: parsed ASS file
+    """
+    ass_file = ExtendedAssFile()
+    with path.open("rb") as fp:
+        try:
+            source = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty file
+            source = None
+    if source is not None and len(source) <= COPY_SIZE:
+        mapped, source = source, mmap.mmap(-1, len(source))
+        source.write(mapped[:])
+        source.seek(0)
+        mapped.close()
+    if source is None or BARE_CR_RE.search(source):
+        # ass_parser reads in universal newlines mode, which mmap can't replicate
+        with path.open("r", encoding="utf-8") as handle:
+            ass_file.consume_ass_stream(handle)
+        return ass_file
+    ass_file.events = LazyAssEventList()
+    _consume_mmap(ass_file, source)
+    if not ass_file.events._pending:  # pylint: disable=protected-access
+        source.close()
+    return ass_file
@@ -0,0 +1,76 @@
+"""Build manifest for incremental builds."""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any
+
+from .utils import hash_file
+
+__all__ = ("BuildManifest",)
+MANIFEST_VERSION = 1
+
+
+class BuildManifest:
+    """Content hashes of the inputs and outputs of every build stage.
+
+    A stage is fresh when the hash of its inputs matches the recorded one and
+    all of its outputs still exist unchanged. File hashes are reused as long as
+    the size and modification time of the file did not change.
+    """
+
+    def __init__(self, path: Path, force: bool = False) -> None:
+        self.path = path
+        self._files: dict[str, list] = {}
+        self._stages: dict[str, dict[str, Any]] = {}
+        if path.exists():
+            try:
+                data = json.loads(path.read_text(encoding="utf-8"))
+            except ValueError:
+                data = {}
+            if data.get("version") == MANIFEST_VERSION:
+                self._files = data["files"]
+                # with force every stage is considered stale, but the file hashes are still valid
+                self._stages = {} if force else data["stages"]
+
+    def hash_file(self, path: Path) -> str:
+        key = str(path.resolve())
+        stat = os.stat(key)
+        cached = self._files.get(key)
+        if cached is not None and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+        content_hash = hash_file(path)
+        self._files[key] = [stat.st_size, stat.st_mtime_ns, content_hash]
+        return content_hash
+
+    @staticmethod
+    def hash_inputs(*inputs: Any) -> str:
+        """Hash JSON-serializable inputs of a stage."""
+        data = json.dumps(inputs, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.blake2b(data.encode("utf-8"), digest_size=20).hexdigest()
+
+    def is_fresh(self, stage: str, key: str, outputs: list[Path]) -> bool:
+        record = self._stages.get(stage)
+        if record is None or record["key"] != key:
+            return False
+        for output in outputs:
+            if not output.exists() or self.hash_file(output) != record["outputs"].get(output.name):
+                return False
+        return True
+
+    def get(self, stage: str) -> dict[str, Any]:
+        return self._stages[stage].get("extra", {})
+
+    def record(self, stage: str, key: str, outputs: list[Path], **extra: Any) -> None:
+        self._stages[stage] = {
+            "key": key,
+            "outputs": {output.name: self.hash_file(output) for output in outputs},
+            "extra": extra,
+        }
+        self.save()
+
+    def save(self) -> None:
+        data = {"version": MANIFEST_VERSION, "files": self._files, "stages": self._stages}
+        self.path.write_text(json.dumps(data, indent=1, ensure_ascii=False), encoding="utf-8")
@@ -0,0 +1,347 @@
+"""Subtitle-only Matroska (.mks) writer."""
+from __future__ import annotations
+
+import hashlib
+import io
+import os
+import shutil
+import struct
+from collections.abc import Iterable
+from pathlib import Path
+
+from ass_parser import AssEvent
+from ass_parser.util import escape_ass_tag
+
+from ._metadata import __version__
+from .chapters import Chapter
+from .extended_ass import ExtendedAssFile
+from .profiling import traced
+from .writer import EVENTS_FORMAT, produce_script_info_lines, write_lines
+
+__all__ = ("write_mks",)
+# Element IDs, see https://www.matroska.org/technical/elements.html
+EBML = 0x1A45DFA3
+EBML_VERSION = 0x4286
+EBML_READ_VERSION = 0x42F7
+EBML_MAX_ID_LENGTH = 0x42F2
+EBML_MAX_SIZE_LENGTH = 0x42F3
+DOC_TYPE = 0x4282
+DOC_TYPE_VERSION = 0x4287
+DOC_TYPE_READ_VERSION = 0x4285
+SEGMENT = 0x18538067
+SEEK_HEAD = 0x114D9B74
+SEEK = 0x4DBB
+SEEK_ID = 0x53AB
+SEEK_POSITION = 0x53AC
+INFO = 0x1549A966
+SEGMENT_UID = 0x73A4
+TIMESTAMP_SCALE = 0x2AD7B1
+DURATION = 0x4489
+TITLE = 0x7BA9
+MUXING_APP = 0x4D80
+WRITING_APP = 0x5741
+TRACKS = 0x1654AE6B
+TRACK_ENTRY = 0xAE
+TRACK_NUMBER = 0xD7
+TRACK_UID = 0x73C5
+TRACK_TYPE = 0x83
+FLAG_DEFAULT = 0x88
+FLAG_FORCED = 0x55AA
+FLAG_LACING = 0x9C
+TRACK_NAME = 0x536E
+LANGUAGE = 0x22B59C
+CODEC_ID = 0x86
+CODEC_PRIVATE = 0x63A2
+CLUSTER = 0x1F43B675
+CLUSTER_TIMESTAMP = 0xE7
+BLOCK_GROUP = 0xA0
+BLOCK = 0xA1
+BLOCK_DURATION = 0x9B
+CUES = 0x1C53BB6B
+CUE_POINT = 0xBB
+CUE_TIME = 0xB3
+CUE_TRACK_POSITIONS = 0xB7
+CUE_TRACK = 0xF7
+CUE_CLUSTER_POSITION = 0xF1
+CHAPTERS = 0x1043A770
+EDITION_ENTRY = 0x45B9
+EDITION_UID = 0x45BC
+CHAPTER_ATOM = 0xB6
+CHAPTER_UID = 0x73C4
+CHAPTER_TIME_START = 0x91
+CHAPTER_DISPLAY = 0x80
+CHAP_STRING = 0x85
+CHAP_LANGUAGE = 0x437C
+ATTACHMENTS = 0x1941A469
+ATTACHED_FILE = 0x61A7
+FILE_NAME = 0x466E
+FILE_MEDIA_TYPE = 0x4660
+FILE_DATA = 0x465C
+FILE_UID = 0x46AE
+
+TRACK_TYPE_SUBTITLE = 0x11
+# Block timestamps are signed 16 bit offsets from the cluster timestamp, in milliseconds
+MAX_BLOCK_OFFSET = 0x7FFF
+FONT_MEDIA_TYPES = {".ttf": "font/ttf", ".otf": "font/otf", ".ttc": "font/collection", ".otc": "font/collection"}
+
+
+def encode_id(element_id: int) -> bytes:
+    return element_id.to_bytes((element_id.bit_length() + 7) // 8, "big")
+
+
+def encode_size(size: int, width: int | None = None) -> bytes:
+    """Encode an element size as an EBML variable size integer."""
+    if width is None:
+        width = 1
+        # all ones is reserved for unknown sizes
+        while size >= (1 << (7 * width)) - 1:
+            width += 1
+    if width > 8:
+        raise ValueError(f"Element too large: {size} bytes")
+    return ((1 << (7 * width)) | size).to_bytes(width, "big")
+
+
+def element(element_id: int, payload: bytes) -> bytes:
+    return encode_id(element_id) + encode_size(len(payload)) + payload
+
+
+def master(element_id: int, *children: bytes) -> bytes:
+    return element(element_id, b"".join(children))
+
+
+def uint(element_id: int, value: int, width: int | None = None) -> bytes:
+    if width is None:
+        width = max(1, (value.bit_length() + 7) // 8)
+    return element(element_id, value.to_bytes(width, "big"))
+
+
+def string(element_id: int, value: str) -> bytes:
+    return element(element_id, value.encode("utf-8"))
+
+
+def _uid(*parts: object) -> int:
+    """Stable non-zero 64 bit UID, so equal inputs give an equal file."""
+    digest = hashlib.blake2b(repr(parts).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") or 1
+
+
+def produce_codec_private(ass_file: ExtendedAssFile) -> bytes:
+    """Every section of the script except the events, which are stored as blocks."""
+    buffer = io.StringIO()
+    write_lines(buffer, produce_script_info_lines(ass_file))
+    buffer.write("\n")
+    write_lines(buffer, ass_file.project_garbage.produce_ass_lines())
+    buffer.write("\n")
+    write_lines(buffer, ass_file.styles.produce_ass_lines())
+    for section in ass_file.extra_sections:
+        buffer.write("\n")
+        write_lines(buffer, section.produce_ass_lines())
+    buffer.write(f"\n[{ass_file.events.name}]\n{EVENTS_FORMAT}\n")
+    return buffer.getvalue().encode("utf-8")
+
+
+def produce_block_data(read_order: int, event: AssEvent) -> bytes:
+    """Event as stored in a S_TEXT/ASS block, without its timestamps."""
+    text = event.text
+    if event.note:
+        text += "{NOTE:%s}" % escape_ass_tag(event.note.replace("\n", "\\N"))
+    values = (
+        str(read_order),
+        str(event.layer),
+        str(event.style_name),
+        str(event.actor),
+        str(event.margin_left),
+        str(event.margin_right),
+        str(event.margin_vertical),
+        str(event.effect),
+    )
+    return (",".join(value.replace(",", ";") for value in values) + "," + text).encode("utf-8")
+
+
+def produce_clusters(events: Iterable[AssEvent], track_number: int) -> list[tuple[int, bytes]]:
+    """Group the dialogue lines into clusters, returns (cluster timestamp, cluster) pairs.
+
+    Comments are dropped and negative timestamps and durations clamped to 0, like mkvmerge does.
+    """
+    blocks: list[tuple[int, int, bytes]] = []
+    for read_order, event in enumerate(event for event in events if not event.is_comment):
+        start = max(event.start, 0)
+        blocks.append((start, max(event.end - start, 0), produce_block_data(read_order, event)))
+    blocks.sort(key=lambda x: x[0])
+
+    clusters: list[tuple[int, bytes]] = []
+    cluster_start = 0
+    cluster_blocks: list[bytes] = []
+    for start, duration, data in blocks:
+        if cluster_blocks and start - cluster_start > MAX_BLOCK_OFFSET:
+            clusters.append((cluster_start, master(CLUSTER, uint(CLUSTER_TIMESTAMP, cluster_start), *cluster_blocks)))
+            cluster_blocks = []
+        if not cluster_blocks:
+            cluster_start = start
+        block = encode_size(track_number) + struct.pack(">hB", start - cluster_start, 0) + data
+        cluster_blocks.append(master(BLOCK_GROUP, element(BLOCK, block), uint(BLOCK_DURATION, duration)))
+    if cluster_blocks:
+        clusters.append((cluster_start, master(CLUSTER, uint(CLUSTER_TIMESTAMP, cluster_start), *cluster_blocks)))
+    return clusters
+
+
+def produce_chapters(chapters: list[Chapter], language: str) -> bytes:
+    atoms = [
+        master(
+            CHAPTER_ATOM,
+            uint(CHAPTER_UID, _uid("chapter", i, chapter.name, chapter.milisecond)),
+            uint(CHAPTER_TIME_START, max(chapter.milisecond, 0) * 1_000_000),
+            master(CHAPTER_DISPLAY, string(CHAP_STRING, chapter.name), string(CHAP_LANGUAGE, language)),
+        )
+        for i, chapter in enumerate(chapters)
+    ]
+    edition_uid = _uid("edition", [(chapter.name, chapter.milisecond) for chapter in chapters])
+    return master(CHAPTERS, master(EDITION_ENTRY, uint(EDITION_UID, edition_uid), *atoms))
+
+
+def produce_attachment_heads(attachments: list[Path]) -> list[tuple[bytes, Path]]:
+    """Everything of each AttachedFile element but the content of the file, which comes last."""
+    heads: list[tuple[bytes, Path]] = []
+    for attachment in attachments:
+        file_size = attachment.stat().st_size
+        media_type = FONT_MEDIA_TYPES.get(attachment.suffix.lower(), "application/octet-stream")
+        fields = (
+            string(FILE_NAME, attachment.name)
+            + string(FILE_MEDIA_TYPE, media_type)
+            + uint(FILE_UID, _uid("attachment", attachment.name, file_size))
+            + encode_id(FILE_DATA)
+            + encode_size(file_size)
+        )
+        heads.append((encode_id(ATTACHED_FILE) + encode_size(len(fields) + file_size) + fields, attachment))
+    return heads
+
+
+@traced()
+def write_mks(
+    target: Path,
+    ass_file: ExtendedAssFile,
+    chapters: list[Chapter] | None = None,
+    attachments: list[Path] | None = None,
+    title: str | None = None,
+    track_name: str | None = None,
+    language: str = "und",
+    default_track: bool = True,
+) -> None:
+    """Write `ass_file` as the only track of a Matroska file.
+
+    The events are stored as S_TEXT/ASS blocks and the rest of the script as
+    the codec private data. Attachments are copied from disk while writing.
+
+    :param target: path of the .mks file
+    :param ass_file: script to store
+    :param chapters: chapters, in the same language as the track
+    :param attachments: files to attach, usually fonts
+    :param title: segment title
+    :param track_name: name of the subtitle track
+    :param language: ISO 639-2 language code of the track and the chapters
+    :param default_track: whether the track is selected by default
+    """
+    chapters = chapters or []
+    attachments = attachments or []
+    app = f"SubPy/v{__version__}"
+
+    codec_private = produce_codec_private(ass_file)
+    track_fields = [
+        uint(TRACK_NUMBER, 1),
+        uint(TRACK_UID, _uid("track", codec_private)),
+        uint(TRACK_TYPE, TRACK_TYPE_SUBTITLE),
+        uint(FLAG_DEFAULT, int(default_track)),
+        uint(FLAG_FORCED, 0),
+        uint(FLAG_LACING, 0),
+        string(LANGUAGE, language),
+        string(CODEC_ID, "S_TEXT/ASS"),
+        element(CODEC_PRIVATE, codec_private),
+    ]
+    if track_name is not None:
+        track_fields.append(string(TRACK_NAME, track_name))
+    tracks = master(TRACKS, master(TRACK_ENTRY, *track_fields))
+
+    clusters = produce_clusters(ass_file.events, 1)
+    duration = max((max(event.end, 0) for event in ass_file.events if not event.is_comment), default=0)
+    segment_uid = hashlib.blake2b(repr(("segment", codec_private, title)).encode("utf-8"), digest_size=16).digest()
+    info_fields = [
+        element(SEGMENT_UID, segment_uid),
+        uint(TIMESTAMP_SCALE, 1_000_000),
+        element(DURATION, struct.pack(">d", float(duration))),
+        string(MUXING_APP, app),
+        string(WRITING_APP, app),
+    ]
+    if title is not None:
+        info_fields.append(string(TITLE, title))
+    info = master(INFO, *info_fields)
+    chapters_element = produce_chapters(chapters, language) if chapters else b""
+    attachment_heads = produce_attachment_heads(attachments)
+    attachments_size = sum(len(head) + path.stat().st_size for head, path in attachment_heads)
+    attachments_head = encode_id(ATTACHMENTS) + encode_size(attachments_size) if attachment_heads else b""
+
+    # Positions are relative to the start of the segment data, the seek head comes first and has a fixed size
+    def seek_head(positions: dict[int, int]) -> bytes:
+        seeks = [
+            master(SEEK, element(SEEK_ID, encode_id(element_id)), uint(SEEK_POSITION, position, 8))
+            for element_id, position in positions.items()
+        ]
+        return master(SEEK_HEAD, *seeks)
+
+    sections = [(INFO, len(info)), (TRACKS, len(tracks))]
+    if chapters_element:
+        sections.append((CHAPTERS, len(chapters_element)))
+    if attachment_heads:
+        sections.append((ATTACHMENTS, len(attachments_head) + attachments_size))
+    if clusters:
+        sections.append((CUES, 0))
+    position = len(seek_head({element_id: 0 for element_id, _ in sections}))
+    positions: dict[int, int] = {}
+    for element_id, size in sections:
+        positions[element_id] = position
+        position += size
+    cue_points = []
+    cluster_position = position
+    for cluster_start, cluster in clusters:
+        cue_points.append(
+            master(
+                CUE_POINT,
+                uint(CUE_TIME, cluster_start),
+                master(CUE_TRACK_POSITIONS, uint(CUE_TRACK, 1), uint(CUE_CLUSTER_POSITION, cluster_position)),
+            )
+        )
+        cluster_position += len(cluster)
+    cues = b""
+    if cue_points:
+        positions[CUES] = cluster_position
+        cues = master(CUES, *cue_points)
+    seek_head_element = seek_head(positions)
+    segment_size = cluster_position + len(cues)
+
+    temp_target = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+    with temp_target.open("wb") as fp:
+        fp.write(
+            master(
+                EBML,
+                uint(EBML_VERSION, 1),
+                uint(EBML_READ_VERSION, 1),
+                uint(EBML_MAX_ID_LENGTH, 4),
+                uint(EBML_MAX_SIZE_LENGTH, 8),
+                string(DOC_TYPE, "matroska"),
+                uint(DOC_TYPE_VERSION, 4),
+                uint(DOC_TYPE_READ_VERSION, 2),
+            )
+        )
+        fp.write(encode_id(SEGMENT) + encode_size(segment_size, 8))
+        fp.write(seek_head_element)
+        fp.write(info)
+        fp.write(tracks)
+        fp.write(chapters_element)
+        fp.write(attachments_head)
+        for head, path in attachment_heads:
+            fp.write(head)
+            with path.open("rb") as src:
+                shutil.copyfileobj(src, fp)
+        for _, cluster in clusters:
+            fp.write(cluster)
+        fp.write(cues)
+    os.replace(temp_target, target)
@@ -1,11 +1,32 @@
-from copy import copy
+import re
+from collections.abc import Callable, Iterable, Sequence
 from datetime import timedelta
-from typing import Set
+from itertools import chain
+from operator import attrgetter
 
-from ass_parser import AssEvent
+from ass_parser import AssEvent, AssStyle
 
+from .analysis import ScriptAnalysis, analyze_script
 from .chapters import Chapter
 from .extended_ass import ExtendedAssFile
+from .profiling import count, traced
+from .utils import make_event
+
+__all__ = (
+    "timedelta_to_miliseconds",
+    "parse_sync_timestamp",
+    "find_sync_point_from_chapter",
+    "fmt_style",
+    "rename_reset_tags",
+    "split_leading_comments",
+    "compute_sync_offset",
+    "prepare_merged_events",
+    "merge_many",
+    "merge_ass_and_sync",
+)
+OVERRIDE_BLOCK_PATTERN = re.compile(r"\{[^}]*\}")
+# \r followed by a style name, which ends at the next tag or at the end of the block
+RESET_TAG_PATTERN = re.compile(r"(\\\s*r)(\s*)([^\\(}]*?)(?=\s*(?:\\|$))")
 
 
 def timedelta_to_miliseconds(timedelta: timedelta):
@@ -35,89 +56,207 @@ def fmt_style(style_name: str, number: int):
     return f"{number}${style_name}"
 
 
-def merge_ass_and_sync(
-    target: ExtendedAssFile,
-    source: ExtendedAssFile,
-    target_sync: int | str | None = None,
-    bump_layer: int = 0,
-    number: int = 1,
-    *,
-    config: dict | None = None,
-):
-    """
-    Merge `source` into `target`, and sync it to `target_sync` if possible.
+def rename_reset_tags(text: str, rename: Callable[[str], str | None]) -> str:
+    """Rename the styles referenced by \\r tags in the override blocks of `text`.
+
+    :param text: event text
+    :param rename: returns the new name of a style, None to keep it
+    :return: the text with renamed references
     """
-    config = config or {}
-    # Parse sync time, and convert it to milliseconds
-    target_s: int | None = None
-    source_s: int | None = None
-    if target_sync is not None:
-        if isinstance(target_sync, int):
-            target_s = target_sync
-        else:
-            target_s = parse_sync_timestamp(target_sync)
-        for line in source.events:
-            if line.effect != "sync":
-                continue
-            source_s = line.start  # the sync point at the source file
 
-    # Calculate the difference between the two sync times
-    diff = 0
-    if target_s is not None and source_s is not None:
-        diff = target_s - source_s
-    comment_start_idx = 0
-    comment_found_at = -1
-    for i, line in enumerate(target.events):
-        if i == 0 and not line.is_comment:  # No comment at top of the file
+    def replace_tag(match: re.Match) -> str:
+        tag, space, name = match.groups()
+        if not name or (new_name := rename(name)) is None:
+            return match.group(0)
+        return f"{tag}{space}{new_name}"
+
+    def replace_block(match: re.Match) -> str:
+        return RESET_TAG_PATTERN.sub(replace_tag, match.group(0)[1:-1]).join("{}")
+
+    return OVERRIDE_BLOCK_PATTERN.sub(replace_block, text)
+
+
+def split_leading_comments(events: Iterable[AssEvent]) -> tuple[list[AssEvent], list[AssEvent]]:
+    """Split events into the block of consecutive comments at the top and the rest."""
+    events = list(events)
+    n_comments = 0
+    for line in events:
+        if not line.is_comment:
             break
-        # Check if comment and the found_at is not set
-        if line.is_comment and comment_found_at == -1:
-            comment_found_at = i
-            continue
-        # Check if comment and the jump between the comment is not 1
-        # If true, break loop
-        if line.is_comment and comment_found_at != -1:
-            if i - comment_found_at != 1:
-                break
-            comment_found_at = i
-    if comment_found_at != -1:
-        comment_start_idx = comment_found_at
-    used_styles: Set[str] = set()
+        n_comments += 1
+    return events[:n_comments], events[n_comments:]
+
+
+def compute_sync_offset(source_s: int | None, target_sync: int | str | None) -> int:
+    """Milliseconds to add to the events of a script so its sync line at `source_s` lands on `target_sync`."""
+    if target_sync is None or source_s is None:
+        return 0
+    # Parse sync time, and convert it to milliseconds
+    if isinstance(target_sync, int):
+        target_s = target_sync
+    else:
+        target_s = parse_sync_timestamp(target_sync)
+    # Calculate the difference between the two sync times
+    return target_s - source_s
+
+
+def prepare_merged_events(
+    target: ExtendedAssFile,
+    source: ExtendedAssFile,
+    analysis: ScriptAnalysis,
+    diff: int,
+    bump_layer: int,
+    number: int,
+    config: dict,
+) -> tuple[list[AssEvent], list[AssEvent]]:
+    """Build the events of `source` as they are merged into `target`, adding the styles they use to `target`.
+
+    :return: the moved comments and the other events
+    """
+    # Resolve every style once, the first style with a given name wins like in AssStyleList.get_by_name
+    source_styles: dict[str, AssStyle] = {}
+    for style in source.styles:
+        source_styles.setdefault(style.name, style)
     conf_skip_templater = config.get("yeettemplater", False)
+    conf_dedupe_styles = config.get("dedupestyles", True)
+    # Styles are added to the target in the order they are first used, so the output is reproducible
+    renamed_styles: dict[str, str] = {}
+
+    def rename_style(style_name: str) -> str | None:
+        if (new_style_name := renamed_styles.get(style_name)) is None:
+            if (style := source_styles.get(style_name)) is None:
+                return None
+            new_style_name = renamed_styles[style_name] = target.style_registry.add(
+                style, fmt_style(style_name, number), conf_dedupe_styles
+            )
+        return new_style_name
+
     comments_set: list[AssEvent] = []
-    for line in source.events:  # iter the source events
+    events_set: list[AssEvent] = []
+    for i, line in enumerate(source.events):  # iter the source events
         efx = line.effect
-        lx = copy(line)
-        if diff != 0:
-            lx.start = lx.start + diff
-            lx.end = lx.end + diff
-        lx.layer += bump_layer
-        # Append to target
+        text = line.text
+        actor = line.actor
+        template_kind = analysis.template_lines.get(i)
         if (
-            efx.startswith("code ")
-            or efx.startswith("template ")
-            or efx.startswith("mixin ")
+            template_kind == "code"
+            or template_kind == "template"
+            or template_kind == "mixin"
             and conf_skip_templater
-            and lx.is_comment
+            and line.is_comment
         ):
             # yeet out template
-            lx.set_text("{template has been removed, please see the original file}")
-            lx.effect = ""
-            lx.actor = "kfx-templater"
-        if (sgs := source.styles.get_by_name(lx.style_name)) is None:
-            raise ValueError(f"Style {lx.style_name} not found in source file")
-        used_styles.add(lx.style_name)
-        lx.style_name = fmt_style(lx.style_name, number)
+            text = "{template has been removed, please see the original file}"
+            efx = ""
+            actor = "kfx-templater"
+        new_style_name = rename_style(line.style_name)
+        if "\\r" in text:
+            text = rename_reset_tags(text, rename_style)
+        # Build the merged event directly instead of copying it and going through the observable setters
+        lx = make_event(
+            (
+                line.start + diff,
+                line.end + diff,
+                new_style_name,
+                actor,
+                text,
+                line.note,
+                efx,
+                line.layer + bump_layer,
+                line.margin_left,
+                line.margin_right,
+                line.margin_vertical,
+                line.is_comment,
+            )
+        )
         if line.is_comment and line.effect != "sync":
             comments_set.append(lx)
         else:
-            target.events.append(lx)
-    for comment in comments_set:
-        target.events.insert(comment_start_idx, comment)
-        comment_start_idx += 1
-    # copy style
-    for style in used_styles:
-        if (sgs := source.styles.get_by_name(style)) is not None:
-            sgs_cp = copy(sgs)
-            sgs_cp.name = fmt_style(sgs_cp.name, number)
-            target.styles.append(sgs_cp)
+            events_set.append(lx)
+    return comments_set, events_set
+
+
+@traced()
+def merge_many(
+    target: ExtendedAssFile,
+    sources: Iterable[tuple[ExtendedAssFile, int | str | None, int]],
+    first_number: int = 1,
+    *,
+    config: dict | None = None,
+    sort_by_start: bool = False,
+    analyses: Sequence[ScriptAnalysis] | None = None,
+):
+    """
+    Merge every `(source, target_sync, bump_layer)` of `sources` into `target`, numbering them from `first_number`.
+
+    The result is the same as merging them one by one with merge_ass_and_sync, but the event list of
+    `target` is only rebuilt once. Comments are moved to the comment block at the top of `target` and the
+    other events are appended, or sorted by start time with `sort_by_start`, events starting at the same time
+    keeping their order. `analyses` are the analyze_script results of the sources, if they are known.
+    """
+    config = config or {}
+    sources = list(sources)
+    if analyses is None:
+        analyses = [analyze_script(source) for source, _, _ in sources]
+    # Check everything before touching the target
+    for (source, _, _), analysis in zip(sources, analyses):
+        style_names = {style.name for style in source.styles}
+        for style_name in analysis.style_usage:
+            if style_name not in style_names:
+                raise ValueError(f"Style {style_name} not found in source file")
+
+    # The comments of each script used to be inserted before the last comment of the block at the top of
+    # the target, which grows with every merged script. `head` is that block, `body` everything after it.
+    head, rest = split_leading_comments(target.events)
+    body: list[list[AssEvent]] = [rest] if rest else []
+    for number, ((source, target_sync, bump_layer), analysis) in enumerate(zip(sources, analyses), start=first_number):
+        diff = compute_sync_offset(analysis.sync_start, target_sync)
+        comments_set, events_set = prepare_merged_events(target, source, analysis, diff, bump_layer, number, config)
+        if head:
+            head[-1:-1] = comments_set
+        else:
+            head = comments_set
+        if body:
+            body.append(events_set)
+        else:
+            # the whole target is one comment block, it continues with the leading comments of the new events
+            more_comments, events_set = split_leading_comments(events_set)
+            head.extend(more_comments)
+            if events_set:
+                body.append(events_set)
+
+    merged = list(chain.from_iterable(body))
+    if sort_by_start:
+        # scripts are rarely sorted themselves, so merging them as sorted runs isn't enough
+        merged.sort(key=attrgetter("start"))
+    events = head + merged
+    count("events merged", len(events) - len(target.events))
+    # AssEventList reindexes itself after every insertion, replace everything at once
+    target.events.clear()
+    target.events.extend(events)
+
+
+def merge_ass_and_sync(
+    target: ExtendedAssFile,
+    source: ExtendedAssFile,
+    target_sync: int | str | None = None,
+    bump_layer: int = 0,
+    number: int = 1,
+    *,
+    config: dict | None = None,
+    analysis: ScriptAnalysis | None = None,
+):
+    """
+    Merge `source` into `target`, and sync it to `target_sync` if possible.
+
+    The styles used by `source` are added to `target` as `{number}${name}`, unless `target` already has a
+    style with the same definition, which is then used instead. Set `dedupestyles` to False in `config` to
+    always add them.
+    """
+    merge_many(
+        target,
+        [(source, target_sync, bump_layer)],
+        number,
+        config=config,
+        analyses=[analysis] if analysis is not None else None,
+    )
@@ -0,0 +1,159 @@
+"""On-disk cache of parsed ASS files."""
+from __future__ import annotations
+
+import hashlib
+import os
+import pickle
+from dataclasses import fields
+from importlib import metadata
+from pathlib import Path
+from typing import Any
+
+from ass_parser import AssStyle
+from ass_parser.ass_sections import AssKeyValueMapping, AssStringTable
+
+from ._metadata import __version__
+from .extended_ass import ExtendedAssFile
+from .utils import event_values, hash_file, make_event
+
+__all__ = ("AssParseCache",)
+# Bump this whenever the snapshot format changes
+CACHE_VERSION = 1
+STYLE_FIELDS = tuple(f.name for f in fields(AssStyle) if not f.name.startswith("_"))
+
+
+def _ass_parser_version() -> str:
+    try:
+        return metadata.version("ass_parser")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def _snapshot(ass_file: ExtendedAssFile) -> tuple:
+    extra_sections: list[tuple[str, str, list]] = []
+    for section in ass_file.extra_sections:
+        if isinstance(section, AssStringTable):
+            extra_sections.append(("table", section.name, list(section)))
+        elif isinstance(section, AssKeyValueMapping):
+            extra_sections.append(("mapping", section.name, list(section.items())))
+        else:
+            raise TypeError(f"Cannot snapshot section {section.name} of type {type(section).__name__}")
+    return (
+        list(ass_file.script_info.items()),
+        list(ass_file.project_garbage.items()),
+        [tuple(getattr(style, name) for name in STYLE_FIELDS) for style in ass_file.styles],
+        [event_values(event) for event in ass_file.events],
+        extra_sections,
+    )
+
+
+def _restore(snapshot: tuple) -> ExtendedAssFile:
+    script_info, project_garbage, styles, events, extra_sections = snapshot
+    ass_file = ExtendedAssFile()
+    ass_file.script_info.update(script_info)
+    ass_file.project_garbage.update(project_garbage)
+    ass_file.styles.extend(AssStyle(**dict(zip(STYLE_FIELDS, style))) for style in styles)
+    ass_file.events.extend(map(make_event, events))
+    for kind, name, data in extra_sections:
+        section: AssStringTable | AssKeyValueMapping
+        if kind == "table":
+            section = AssStringTable(name=name)
+            section.extend(data)
+        else:
+            section = AssKeyValueMapping(name=name)
+            section.update(data)
+        ass_file.extra_sections.append(section)
+    return ass_file
+
+
+class AssParseCache:
+    """Directory of parsed ASS file snapshots.
+
+    Entries are keyed by the script path and validated against its size,
+    modification time and content hash. The directory is kept under
+    `max_size` bytes by evicting the least recently used entries. Entries
+    that can't be read for any reason are treated as a cache miss.
+    """
+
+    def __init__(self, folder: Path, max_size: int = 256 * 1024 * 1024) -> None:
+        folder.mkdir(parents=True, exist_ok=True)
+        self.folder = folder
+        self.max_size = max_size
+        self.version = (CACHE_VERSION, __version__, _ass_parser_version())
+
+    def _entry(self, path: Path) -> Path:
+        key = hashlib.blake2b(str(path.resolve()).encode("utf-8"), digest_size=16).hexdigest()
+        return self.folder / f"{key}.pickle"
+
+    def load(self, path: Path) -> ExtendedAssFile | None:
+        """Return the cached parse of `path`, or None if there is no valid entry."""
+        entry = self._entry(path)
+        try:
+            with entry.open("rb") as fp:
+                version, size, mtime, content_hash = pickle.load(fp)
+                stat = path.stat()
+                if version != self.version or size != stat.st_size:
+                    return None
+                touched = mtime != stat.st_mtime_ns
+                if touched and content_hash != hash_file(path):
+                    return None
+                data = fp.read()
+            ass_file = _restore(pickle.loads(data))
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # corrupted or incompatible entry, drop it and parse again
+            entry.unlink(missing_ok=True)
+            return None
+        if touched:
+            # same contents with a new mtime, record it so the file isn't hashed again next time
+            self._write(entry, (self.version, size, stat.st_mtime_ns, content_hash), data)
+        else:
+            # mark as recently used
+            os.utime(entry)
+        return ass_file
+
+    def stamp(self, path: Path) -> tuple[int, int, str]:
+        """Size, modification time and content hash of `path`, to be taken before it is read."""
+        stat = path.stat()
+        return stat.st_size, stat.st_mtime_ns, hash_file(path)
+
+    def store(self, path: Path, ass_file: ExtendedAssFile, stamp: tuple[int, int, str]) -> None:
+        """Store the parse of `path`.
+
+        :param stamp: the :meth:`stamp` of `path` taken before it was read, so that a file saved
+            during the parse doesn't get paired with the previous contents
+        """
+        try:
+            snapshot = _snapshot(ass_file)
+        except TypeError:
+            return
+        header: tuple[Any, ...] = (self.version, *stamp)
+        self._write(self._entry(path), header, pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL))
+        self._evict()
+
+    def _write(self, entry: Path, header: tuple[Any, ...], data: bytes) -> None:
+        temp_entry = entry.with_name(f"{entry.name}.{os.getpid()}.tmp")
+        with temp_entry.open("wb") as fp:
+            pickle.dump(header, fp, protocol=pickle.HIGHEST_PROTOCOL)
+            fp.write(data)
+        os.replace(temp_entry, entry)
+
+    def _evict(self) -> None:
+        entries = []
+        for entry in self.folder.glob("*.pickle"):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry))
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries, key=lambda x: x[0]):
+            if total <= self.max_size:
+                break
+            entry.unlink(missing_ok=True)
+            total -= size
+
+    def clear(self) -> None:
+        for entry in self.folder.glob("*.pickle"):
+            entry.unlink(missing_ok=True)
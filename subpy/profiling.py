@@ -0,0 +1,255 @@
+"""Spans and counters for profiling builds, exported as a summary table or a Chrome trace.
+
+Profiling is off until enable_profiling is called. While it is off, span returns a shared no-op
+context manager and count returns immediately, so instrumented code pays close to nothing.
+"""
+from __future__ import annotations
+
+import collections
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, ContextManager, TypeVar
+
+__all__ = (
+    "Profiler",
+    "SpanRecord",
+    "span",
+    "count",
+    "traced",
+    "enable_profiling",
+    "disable_profiling",
+    "get_profiler",
+)
+_NULL_SPAN = contextlib.nullcontext()
+TFunc = TypeVar("TFunc", bound=Callable[..., Any])
+
+
+@dataclass
+class SpanRecord:
+    name: str
+    #: wall clock start, in nanoseconds since the epoch
+    start: int
+    wall: int
+    cpu: int
+    pid: int
+    tid: int
+    #: highest memory traced by tracemalloc during the span, None without memory tracing
+    peak_memory: int | None = None
+    args: dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class CounterRecord:
+    name: str
+    #: wall clock time, in nanoseconds since the epoch
+    time: int
+    value: int
+    #: total of the counter in its process so far
+    total: int
+    pid: int
+
+
+class _Span:
+    __slots__ = ("profiler", "name", "args", "start", "cpu_start", "peak")
+
+    def __init__(self, profiler: Profiler, name: str, args: dict[str, Any]) -> None:
+        self.profiler = profiler
+        self.name = name
+        self.args = args
+
+    def __enter__(self) -> _Span:
+        profiler = self.profiler
+        stack = profiler._stack()
+        if profiler.trace_memory:
+            # tracemalloc has a single peak, carry it over to the enclosing span before reusing it
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        self.peak = 0
+        stack.append(self)
+        self.start = time.time_ns()
+        self.cpu_start = time.thread_time_ns()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        cpu = time.thread_time_ns() - self.cpu_start
+        end = time.time_ns()
+        profiler = self.profiler
+        stack = profiler._stack()
+        stack.pop()
+        peak_memory = None
+        if profiler.trace_memory:
+            peak_memory = max(self.peak, tracemalloc.get_traced_memory()[1])
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, peak_memory)
+            tracemalloc.reset_peak()
+        profiler.spans.append(
+            SpanRecord(
+                self.name,
+                self.start,
+                end - self.start,
+                cpu,
+                os.getpid(),
+                threading.get_ident(),
+                peak_memory,
+                self.args,
+            )
+        )
+
+
+class Profiler:
+    """Collects the spans and counters of the current process.
+
+    The records of other processes can be added with merge, e.g. the records of worker processes.
+    """
+
+    def __init__(self, trace_memory: bool = False) -> None:
+        self.trace_memory = trace_memory
+        self.spans: list[SpanRecord] = []
+        self.counters: list[CounterRecord] = []
+        #: totals of every process merged into this profiler
+        self.totals: collections.Counter[str] = collections.Counter()
+        self._totals: collections.Counter[str] = collections.Counter()
+        self._local = threading.local()
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _stack(self) -> list[_Span]:
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = []
+            return self._local.stack
+
+    def span(self, name: str, **args: Any) -> _Span:
+        return _Span(self, name, args)
+
+    def count(self, name: str, value: int = 1) -> None:
+        self._totals[name] += value
+        self.totals[name] += value
+        self.counters.append(CounterRecord(name, time.time_ns(), value, self._totals[name], os.getpid()))
+
+    def records(self) -> tuple[list[SpanRecord], list[CounterRecord]]:
+        """Records to merge into another profiler, they can be pickled."""
+        return self.spans, self.counters
+
+    def merge(self, records: tuple[list[SpanRecord], list[CounterRecord]]) -> None:
+        spans, counters = records
+        self.spans.extend(spans)
+        self.counters.extend(counters)
+        for counter in counters:
+            self.totals[counter.name] += counter.value
+
+    def summary(self) -> str:
+        """Table of the total time and highest memory of the spans by name, followed by the counters."""
+        rows: dict[str, list] = {}
+        for record in self.spans:
+            row = rows.setdefault(record.name, [0, 0, 0, None])
+            row[0] += 1
+            row[1] += record.wall
+            row[2] += record.cpu
+            if record.peak_memory is not None:
+                row[3] = max(row[3] or 0, record.peak_memory)
+        lines = [f"  {'Span':<28} {'Calls':>6} {'Wall':>9} {'CPU':>9} {'Peak memory':>12}"]
+        for name, (calls, wall, cpu, peak) in sorted(rows.items(), key=lambda x: -x[1][1]):
+            memory = f"{peak / 2**20:>10.1f}MB" if peak is not None else f"{'-':>12}"
+            lines.append(f"  {name:<28} {calls:>6} {wall / 1e9:>8.3f}s {cpu / 1e9:>8.3f}s {memory}")
+        if self.totals:
+            lines.append(f"  {'Counter':<28} {'Total':>6}")
+            lines.extend(f"  {name:<28} {total:>6}" for name, total in sorted(self.totals.items()))
+        return "\n".join(lines)
+
+    def chrome_trace(self) -> dict:
+        """Trace events of every record, as read by chrome://tracing and Perfetto."""
+        events: list[dict] = []
+        for record in self.spans:
+            args = {**record.args, "cpu_ms": record.cpu / 1e6}
+            if record.peak_memory is not None:
+                args["peak_memory"] = record.peak_memory
+            events.append(
+                {
+                    "name": record.name,
+                    "ph": "X",
+                    "ts": record.start / 1e3,
+                    "dur": record.wall / 1e3,
+                    "pid": record.pid,
+                    "tid": record.tid,
+                    "args": args,
+                }
+            )
+        for counter in self.counters:
+            events.append(
+                {
+                    "name": counter.name,
+                    "ph": "C",
+                    "ts": counter.time / 1e3,
+                    "pid": counter.pid,
+                    "args": {"value": counter.total},
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, path: Path) -> None:
+        path.write_text(json.dumps(self.chrome_trace()), encoding="utf-8")
+
+
+_profiler: Profiler | None = None
+
+
+def enable_profiling(trace_memory: bool = False) -> Profiler:
+    """Start recording the spans and counters of this process, with the memory traced by tracemalloc if asked."""
+    global _profiler
+    _profiler = Profiler(trace_memory)
+    return _profiler
+
+
+def disable_profiling() -> Profiler | None:
+    """Stop recording, returning the profiler that was in use."""
+    global _profiler
+    profiler, _profiler = _profiler, None
+    if profiler is not None and profiler.trace_memory:
+        tracemalloc.stop()
+    return profiler
+
+
+def get_profiler() -> Profiler | None:
+    return _profiler
+
+
+def span(name: str, **args: Any) -> ContextManager[Any]:
+    """Record the wall time, CPU time and peak memory of a block under `name`, with `args` in the trace."""
+    if _profiler is None:
+        return _NULL_SPAN
+    return _profiler.span(name, **args)
+
+
+def count(name: str, value: int = 1) -> None:
+    """Add `value` to the counter `name`."""
+    if _profiler is not None:
+        _profiler.count(name, value)
+
+
+def traced(name: str | None = None) -> Callable[[TFunc], TFunc]:
+    """Decorator recording every call of a function as a span, named after the function by default."""
+
+    def decorator(func: TFunc) -> TFunc:
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if _profiler is None:
+                return func(*args, **kwargs)
+            with _profiler.span(span_name):
+                return func(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
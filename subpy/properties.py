@@ -1,3 +1,11 @@
+from __future__ import annotations
+
+import fnmatch
+import hashlib
+import os
+import pickle
+import re
+from collections.abc import Iterator, Mapping
 from dataclasses import dataclass, field
 from pathlib import Path
 from string import Formatter
@@ -5,7 +13,20 @@ from typing import cast
 
 import yaml
 
-__all__ = ("read_and_parse_properties",)
+from .profiling import traced
+from .utils import hash_file
+
+__all__ = (
+    "DirectoryListings",
+    "EpisodeProperties",
+    "read_and_parse_properties",
+)
+# Bump this whenever the cached document changes
+CACHE_VERSION = 1
+# The C loader is only there when PyYAML was built against libyaml
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+GLOB_MAGIC_RE = re.compile(r"[*?[]")
+_formatter = Formatter()
 
 
 class _FormatDict(dict):
@@ -14,9 +35,8 @@ class _FormatDict(dict):
 
 
 def safe_format(s: str, d: dict):
-    formatter = Formatter()
     try:
-        return formatter.vformat(s, (), _FormatDict(d))
+        return _formatter.vformat(s, (), _FormatDict(d))
     except KeyError:
         return s
 
@@ -58,36 +78,79 @@ def walk_dot(dictionary: dict, dot_notation: str):
     return dictionary
 
 
-def expandpath(path_pattern) -> list[Path]:
-    p = Path(path_pattern)
-    return list(Path(p.parent).expanduser().glob(p.name))
+class DirectoryListings:
+    """File names of directories, listed once and shared by every glob pattern in them."""
 
+    def __init__(self) -> None:
+        self._names: dict[Path, list[str]] = {}
 
-def read_and_parse_properties(yaml_path: Path, base_path: Path) -> tuple[dict[str, Subtitle], dict]:
-    data_text = yaml_path.read_text()
-    pp = yaml.safe_load(data_text)
-    to_be_changed = list(filter(lambda x: x not in ["subs", "syncs", "merge"], list(pp.keys())))
-    update_this = {k: pp[k] for k in to_be_changed}
-    update_this.pop("subsfolder", None)
-    bulk_update_value(pp, update_this)
-    subs_base = pp["subs"]
-    merge_base = pp["merge"]
-    syncs_base = pp.get("syncs", {})
-    title_base = pp.get("titles", pp.get("title", {}))
-    subtitles: dict[str, Subtitle] = {}
-    for episode, subs_path in merge_base.items():
-        eps = f"{int(episode):02d}"
+    def names(self, folder: Path) -> list[str]:
+        try:
+            return self._names[folder]
+        except KeyError:
+            pass
+        try:
+            with os.scandir(folder) as entries:
+                names = [entry.name for entry in entries]
+        except OSError:
+            names = []
+        self._names[folder] = names
+        return names
+
+    def glob(self, folder: Path, pattern: str) -> list[Path]:
+        """Same as ``folder.glob(pattern)`` for a pattern without path separators."""
+        if not GLOB_MAGIC_RE.search(pattern):
+            path = folder / pattern
+            return [path] if path.exists() else []
+        return [folder / name for name in fnmatch.filter(self.names(folder), pattern)]
+
+
+def expandpath(path_pattern, listings: DirectoryListings | None = None) -> list[Path]:
+    p = Path(path_pattern)
+    if listings is None:
+        return list(Path(p.parent).expanduser().glob(p.name))
+    return listings.glob(Path(p.parent).expanduser(), p.name)
+
+
+class EpisodeProperties(Mapping[str, Subtitle]):
+    """Episodes of properties.yaml, each one resolved to a Subtitle on first access."""
+
+    def __init__(self, pp: dict, base_path: Path, listings: DirectoryListings | None = None) -> None:
+        self.base_path = base_path
+        self.listings = listings or DirectoryListings()
+        self._subsfolder = pp.get("subsfolder", "")
+        self._subs_base = pp["subs"]
+        self._syncs_base = pp.get("syncs", {})
+        self._title_base = pp.get("titles", pp.get("title", {}))
+        self._merge = {f"{int(episode):02d}": subs_path for episode, subs_path in pp["merge"].items()}
+        self._resolved: dict[str, Subtitle] = {}
+
+    def __getitem__(self, eps: str) -> Subtitle:
+        try:
+            return self._resolved[eps]
+        except KeyError:
+            subs_path = self._merge[eps]
+        subtitle = self._resolved[eps] = self._resolve(eps, subs_path)
+        return subtitle
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._merge)
+
+    def __len__(self) -> int:
+        return len(self._merge)
+
+    def _resolve(self, eps: str, subs_path: list[str]) -> Subtitle:
         scripts: dict[str, list[Path]] = {}
-        subsfolder = safe_format(pp.get("subsfolder", ""), {"EPISODE": eps})
+        subsfolder = safe_format(self._subsfolder, {"EPISODE": eps})
         for sub_path in subs_path:
-            fpath_r = cast(str, walk_dot(subs_base, sub_path))
+            fpath_r = cast(str, walk_dot(self._subs_base, sub_path))
             fpath = safe_format(fpath_r, {"EPISODE": eps, "subsfolder": subsfolder})
             fdot = str(sub_path.rsplit(".", 1)[-1])
             ssfdot: list[Path] = scripts.get(fdot, [])
-            sspath = base_path / str(fpath)
-            ssfdot.extend(expandpath(sspath))
+            sspath = self.base_path / str(fpath)
+            ssfdot.extend(expandpath(sspath, self.listings))
             scripts[fdot] = ssfdot
-        sync_data = syncs_base.get(eps, {})
+        sync_data = self._syncs_base.get(eps, {})
         new_sync_data: dict[str, SyncPoint] = {}
         for key, value in sync_data.items():
             if isinstance(value, str):
@@ -98,5 +161,81 @@ def read_and_parse_properties(yaml_path: Path, base_path: Path) -> tuple[dict[st
                 if syncn is None and syncch is None:
                     continue
                 new_sync_data[key] = SyncPoint(syncn or syncch or "-", syncch or syncn or "-")
-        subtitles[eps] = Subtitle(scripts, new_sync_data, title_base.get(eps, None))
-    return subtitles, pp
+        return Subtitle(scripts, new_sync_data, self._title_base.get(eps, None))
+
+
+def parse_properties_document(data_text: str) -> dict:
+    """Parse properties.yaml and expand the top level values in every other string."""
+    pp = yaml.load(data_text, Loader=YAML_LOADER)
+    to_be_changed = list(filter(lambda x: x not in ["subs", "syncs", "merge"], list(pp.keys())))
+    update_this = {k: pp[k] for k in to_be_changed}
+    update_this.pop("subsfolder", None)
+    bulk_update_value(pp, update_this)
+    return pp
+
+
+def load_properties_document(yaml_path: Path, cache_dir: Path | None = None) -> dict:
+    """Read properties.yaml with parse_properties_document, or from the cache if the file didn't change.
+
+    Cache entries are validated against the size, modification time and content hash of the file.
+    """
+    if cache_dir is None:
+        return parse_properties_document(yaml_path.read_text())
+    key = hashlib.blake2b(str(yaml_path.resolve()).encode("utf-8"), digest_size=16).hexdigest()
+    entry = cache_dir / f"{key}.pickle"
+    stat = yaml_path.stat()
+    content_hash: str | None = None
+    try:
+        data: bytes | None = None
+        with entry.open("rb") as fp:
+            version, size, mtime, cached_hash = pickle.load(fp)
+            if version == CACHE_VERSION and size == stat.st_size:
+                if mtime != stat.st_mtime_ns:
+                    content_hash = hash_file(yaml_path)
+                if mtime == stat.st_mtime_ns or content_hash == cached_hash:
+                    data = fp.read()
+        if data is not None:
+            pp = pickle.loads(data)
+            if mtime != stat.st_mtime_ns:
+                # same contents with a new mtime, record it so the file isn't hashed again next time
+                _write_cache_entry(entry, (CACHE_VERSION, stat.st_size, stat.st_mtime_ns, content_hash), data)
+            return pp
+    except FileNotFoundError:
+        pass
+    except Exception:
+        # corrupted or incompatible entry, parse again
+        entry.unlink(missing_ok=True)
+    if content_hash is None:
+        # hashed before reading, so that a file saved in between is not cached with the previous contents
+        content_hash = hash_file(yaml_path)
+    pp = parse_properties_document(yaml_path.read_text())
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    _write_cache_entry(
+        entry,
+        (CACHE_VERSION, stat.st_size, stat.st_mtime_ns, content_hash),
+        pickle.dumps(pp, protocol=pickle.HIGHEST_PROTOCOL),
+    )
+    return pp
+
+
+def _write_cache_entry(entry: Path, header: tuple, data: bytes) -> None:
+    temp_entry = entry.with_name(f"{entry.name}.{os.getpid()}.tmp")
+    with temp_entry.open("wb") as fp:
+        pickle.dump(header, fp)
+        fp.write(data)
+    os.replace(temp_entry, entry)
+
+
+@traced()
+def read_and_parse_properties(
+    yaml_path: Path, base_path: Path, cache_dir: Path | None = None
+) -> tuple[EpisodeProperties, dict]:
+    """Read properties.yaml, the episodes are resolved when they are first accessed.
+
+    :param yaml_path: path to properties.yaml
+    :param base_path: folder the script paths are relative to
+    :param cache_dir: where to cache the parsed document, if any
+    :return: the episodes by number, and the parsed document
+    """
+    pp = load_properties_document(yaml_path, cache_dir)
+    return EpisodeProperties(pp, base_path), pp
@@ -1,21 +1,47 @@
 """ASS file reading routines."""
 import io
 from pathlib import Path
-from typing import IO, TextIO, Union
+from typing import IO, TYPE_CHECKING, Optional, TextIO, Union
 
+from .analysis import ScriptAnalysis, analyze_script
 from .extended_ass import ExtendedAssFile
+from .lazy_ass import read_ass_lazy
+from .profiling import count, span
 
-__all__ = ("read_ass",)
+if TYPE_CHECKING:
+    from .parse_cache import AssParseCache
 
+__all__ = ("read_ass", "ScriptCache")
 
-def read_ass(source: Union[Path, IO[str], str]) -> ExtendedAssFile:
+
+def read_ass(
+    source: Union[Path, IO[str], str], cache: Optional["AssParseCache"] = None, lazy: bool = False
+) -> ExtendedAssFile:
     """Read ASS from the specified source.
 
     Extended for subpy.
 
     :param source: a string, a readable stream, or a path
+    :param cache: parse cache used when reading from a path
+    :param lazy: when reading from a path, memory-map the file and only parse events when they are accessed
     :return: parsed ASS file
     """
+    with span("read_ass", file=source.name if isinstance(source, Path) else "<stream>"):
+        if cache is not None and isinstance(source, Path):
+            if (cached := cache.load(source)) is not None:
+                count("parse cache hits")
+                return cached
+            stamp = cache.stamp(source)
+            ass_file = _read_ass(source, lazy)
+            cache.store(source, ass_file, stamp)
+            return ass_file
+        return _read_ass(source, lazy)
+
+
+def _read_ass(source: Union[Path, IO[str], str], lazy: bool) -> ExtendedAssFile:
+    if lazy and isinstance(source, Path):
+        return read_ass_lazy(source)
+
     ass_file = ExtendedAssFile()
     handle: Union[TextIO, IO[str]]
     if isinstance(source, str):
@@ -26,4 +52,48 @@ def read_ass(source: Union[Path, IO[str], str]) -> ExtendedAssFile:
             ass_file.consume_ass_stream(handle)
     else:
         ass_file.consume_ass_stream(source)
+    count("events parsed", len(ass_file.events))
     return ass_file
+
+
+class ScriptCache:
+    """In-memory cache of parsed ASS files, keyed by path and modification time.
+
+    The returned files are shared between callers, use :meth:`ExtendedAssFile.copy`
+    before modifying them. Their analyses are cached too, until the file is read again.
+    """
+
+    def __init__(self, disk_cache: Optional["AssParseCache"] = None) -> None:
+        self._scripts: dict[Path, tuple[int, ExtendedAssFile]] = {}
+        self._analyses: dict[Path, tuple[ExtendedAssFile, ScriptAnalysis]] = {}
+        self.disk_cache = disk_cache
+
+    def read(self, path: Path) -> ExtendedAssFile:
+        """Read and parse `path`, or return the cached file if it has not changed.
+
+        :param path: path to the ASS file
+        :return: parsed ASS file
+        """
+        key = path.resolve()
+        mtime = key.stat().st_mtime_ns
+        cached = self._scripts.get(key)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        ass_file = read_ass(path, self.disk_cache)
+        self._scripts[key] = (mtime, ass_file)
+        return ass_file
+
+    def analyze(self, path: Path) -> ScriptAnalysis:
+        """Analyze the events of `path`, see :func:`analyze_script`.
+
+        :param path: path to the ASS file
+        :return: analysis of the current content of the file
+        """
+        ass_file = self.read(path)
+        key = path.resolve()
+        cached = self._analyses.get(key)
+        if cached is not None and cached[0] is ass_file:
+            return cached[1]
+        analysis = analyze_script(ass_file)
+        self._analyses[key] = (ass_file, analysis)
+        return analysis
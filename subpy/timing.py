@@ -0,0 +1,164 @@
+"""Columnar view of event timings for bulk retiming."""
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_right
+from collections.abc import Sequence
+from fractions import Fraction
+from pathlib import Path
+from typing import Optional
+
+from ass_parser.ass_sections import AssEventList
+from ass_parser.observable_sequence_mixin import ObservableSequenceChangeEvent
+
+__all__ = (
+    "FrameTimes",
+    "EventColumns",
+)
+
+
+class FrameTimes:
+    """Start time of every video frame, either from a frame rate or from a timecodes file."""
+
+    def __init__(self, fps: Fraction | float | None = None, timecodes: Sequence[int] | None = None) -> None:
+        if (fps is None) == (timecodes is None):
+            raise ValueError("Either fps or timecodes is required")
+        if timecodes is not None and len(timecodes) < 2:
+            raise ValueError("At least two timecodes are required")
+        self.fps = Fraction(fps) if fps is not None else None
+        self.timecodes = array("q", timecodes) if timecodes is not None else None
+
+    @classmethod
+    def from_timecodes_file(cls, path: Path) -> "FrameTimes":
+        """Read a v2 timecodes file (one frame start time in milliseconds per line)."""
+        timecodes: list[int] = []
+        with path.open("r", encoding="utf-8") as fp:
+            for line in fp:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    timecodes.append(round(float(line)))
+        return cls(timecodes=timecodes)
+
+    def time_at(self, frame: int) -> int:
+        """Start time of `frame` in milliseconds."""
+        if self.fps is not None:
+            return round(frame * 1000 / self.fps)
+        assert self.timecodes is not None
+        if frame < 0:
+            return self.timecodes[0] + frame * (self.timecodes[1] - self.timecodes[0])
+        if frame >= len(self.timecodes):
+            # past the end, assume the duration of the last frame carries on
+            last = len(self.timecodes) - 1
+            return self.timecodes[last] + (frame - last) * (self.timecodes[last] - self.timecodes[last - 1])
+        return self.timecodes[frame]
+
+    def frame_at(self, ms: int) -> int:
+        """Frame shown at `ms` milliseconds."""
+        if self.fps is not None:
+            return int(ms * self.fps // 1000)
+        assert self.timecodes is not None
+        first, last = self.timecodes[0], len(self.timecodes) - 1
+        if ms < first:
+            return (ms - first) // (self.timecodes[1] - first)
+        if ms >= self.timecodes[last]:
+            return last + (ms - self.timecodes[last]) // (self.timecodes[last] - self.timecodes[last - 1])
+        return bisect_right(self.timecodes, ms) - 1
+
+    def shift(self, ms: int, frames: int) -> int:
+        """Move `ms` by `frames` frames, keeping its offset inside the frame."""
+        frame = self.frame_at(ms)
+        return self.time_at(frame + frames) + ms - self.time_at(frame)
+
+
+class EventColumns:
+    """Start, end, layer, comment flag and style of every event of a list, stored as columns.
+
+    Bulk operations work on the columns only. The new values are written to the
+    events by `commit()` (or when leaving the `with` block), directly into the
+    events and followed by a single change notification on the list instead of
+    one per modified field. The list must not be modified in the meantime.
+    """
+
+    def __init__(self, events: AssEventList) -> None:
+        self.events = events
+        self.start = array("q", (event.start for event in events))
+        self.end = array("q", (event.end for event in events))
+        self.layer = array("q", (event.layer for event in events))
+        self.is_comment = array("b", (event.is_comment for event in events))
+        style_ids: dict[str, int] = {}
+        self.style = array("l", (style_ids.setdefault(event.style_name, len(style_ids)) for event in events))
+        self.style_names = list(style_ids)
+        self._dirty: set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self.start)
+
+    def style_mask(self, *style_names: str) -> array:
+        """Mask of the events using one of `style_names`."""
+        wanted = {i for i, name in enumerate(self.style_names) if name in style_names}
+        return array("b", (style in wanted for style in self.style))
+
+    def _masked(self, column: array, values: list[int], mask: Optional[Sequence[int]]) -> array:
+        if mask is None:
+            return array(column.typecode, values)
+        return array(column.typecode, (new if selected else old for old, new, selected in zip(column, values, mask)))
+
+    def shift(self, ms: int, mask: Optional[Sequence[int]] = None) -> None:
+        """Shift start and end times by `ms` milliseconds."""
+        self.start = self._masked(self.start, [t + ms for t in self.start], mask)
+        self.end = self._masked(self.end, [t + ms for t in self.end], mask)
+        self._dirty.update(("start", "end"))
+
+    def shift_frames(self, frames: int, frame_times: FrameTimes, mask: Optional[Sequence[int]] = None) -> None:
+        """Shift start and end times by `frames` video frames."""
+        shift = frame_times.shift
+        self.start = self._masked(self.start, [shift(t, frames) for t in self.start], mask)
+        self.end = self._masked(self.end, [shift(t, frames) for t in self.end], mask)
+        self._dirty.update(("start", "end"))
+
+    def bump_layer(self, inc: int) -> None:
+        """Add `inc` to the layer of every line that isn't a comment, like incr_layer."""
+        self.layer = array(
+            "q", (layer if comment else layer + inc for layer, comment in zip(self.layer, self.is_comment))
+        )
+        self._dirty.add("layer")
+
+    def reset_layer(self) -> None:
+        """Set the layer of every line that isn't a comment to 0, like reset_layer."""
+        self.layer = array("q", (layer if comment else 0 for layer, comment in zip(self.layer, self.is_comment)))
+        self._dirty.add("layer")
+
+    def clip(self, range_start: int, range_end: int) -> list[int]:
+        """Clamp start and end times to `[range_start, range_end]`.
+
+        :return: indexes of the events left with no duration
+        """
+        self.start = array("q", (min(max(t, range_start), range_end) for t in self.start))
+        self.end = array("q", (min(max(t, range_start), range_end) for t in self.end))
+        self._dirty.update(("start", "end"))
+        return [i for i, (start, end) in enumerate(zip(self.start, self.end)) if end <= start]
+
+    def commit(self) -> None:
+        """Write the modified columns back to the events."""
+        if not self._dirty:
+            return
+        if len(self.events) != len(self):
+            raise RuntimeError("The event list was modified while using its columns")
+        columns = {name: getattr(self, name) for name in self._dirty}
+        changed = False
+        for i, event in enumerate(self.events):
+            attrs = event.__dict__
+            for name, column in columns.items():
+                if getattr(event, name) != column[i]:
+                    attrs[name] = column[i]
+                    changed = True
+        self._dirty.clear()
+        if changed:
+            self.events.changed.emit(ObservableSequenceChangeEvent())
+
+    def __enter__(self) -> "EventColumns":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.commit()
@@ -1,6 +1,24 @@
+import hashlib
+from pathlib import Path
+
 from ass_parser import AssEvent
 
-__all__ = ("incr_layer", "reset_layer")
+__all__ = ("incr_layer", "reset_layer", "event_values", "make_event")
+# AssEvent attributes as stored in its __dict__, text and note are properties backed by _text and _note
+EVENT_ATTRS = (
+    "start",
+    "end",
+    "style_name",
+    "actor",
+    "_text",
+    "_note",
+    "effect",
+    "layer",
+    "margin_left",
+    "margin_right",
+    "margin_vertical",
+    "is_comment",
+)
 
 
 def incr_layer(ev: AssEvent, inc: int = 0):
@@ -13,3 +31,40 @@ def reset_layer(ev: AssEvent):
     if ev.is_comment:
         return
     ev.layer = 0
+
+
+def event_values(ev: AssEvent) -> tuple:
+    """Return the fields of an event in EVENT_ATTRS order."""
+    return (
+        ev.start,
+        ev.end,
+        ev.style_name,
+        ev.actor,
+        ev.text,
+        ev.note,
+        ev.effect,
+        ev.layer,
+        ev.margin_left,
+        ev.margin_right,
+        ev.margin_vertical,
+        ev.is_comment,
+    )
+
+
+def make_event(values: tuple) -> AssEvent:
+    """Create a detached event from fields in EVENT_ATTRS order.
+
+    Bypasses the observable __setattr__, which is safe since nobody can be subscribed to the new event yet.
+    """
+    ev = AssEvent.__new__(AssEvent)
+    ev.__dict__.update(zip(EVENT_ATTRS, values))
+    return ev
+
+
+def hash_file(path: str | Path) -> str:
+    """Content hash of a file, as used by the caches."""
+    hasher = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as fp:
+        while chunk := fp.read(1 << 20):
+            hasher.update(chunk)
+    return hasher.hexdigest()
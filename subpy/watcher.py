@@ -0,0 +1,225 @@
+"""Waiting for changes to input files, with inotify on Linux and polling elsewhere."""
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from collections.abc import Iterable
+from pathlib import Path
+
+__all__ = ("FileWatcher",)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = (
+    IN_MODIFY
+    | IN_ATTRIB
+    | IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+)
+# wd, mask, cookie, length of the name that follows
+INOTIFY_EVENT = struct.Struct("iIII")
+
+
+class _Inotify:
+    def __init__(self, retry_interval: float) -> None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+        self._libc = libc
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.retry_interval = retry_interval
+        self._wanted: set[Path] = set()
+        self._folders: dict[int, Path] = {}
+        self._wds: dict[Path, int] = {}
+
+    def watch(self, folders: set[Path]) -> None:
+        self._wanted = set(folders)
+        for folder in set(self._wds) - folders:
+            self._libc.inotify_rm_watch(self.fd, self._wds.pop(folder))
+        self._folders = {wd: folder for folder, wd in self._wds.items()}
+        self._add_missing()
+
+    def _add_missing(self) -> bool:
+        """Watch the wanted folders that are not watched yet, True if any was added."""
+        added = False
+        for folder in self._wanted - set(self._wds):
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(folder), WATCH_MASK)
+            if wd >= 0:
+                self._wds[folder] = wd
+                self._folders[wd] = folder
+                added = True
+        return added
+
+    def _drop(self, wd: int) -> None:
+        if (folder := self._folders.pop(wd, None)) is not None:
+            del self._wds[folder]
+
+    def read(self, timeout: float | None) -> set[Path] | None:
+        """Changed paths, None if events may have been missed."""
+        if len(self._wds) < len(self._wanted):
+            # missing folders are retried, files may have been created before the watch was
+            if self._add_missing():
+                return None
+            timeout = self.retry_interval if timeout is None else min(timeout, self.retry_interval)
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return set()
+        changes: set[Path] = set()
+        try:
+            data = os.read(self.fd, 1 << 16)
+        except BlockingIOError:
+            return changes
+        lost = False
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                return None
+            if mask & IN_MOVE_SELF and wd in self._folders:
+                # the watch follows the moved folder, not its path
+                self._libc.inotify_rm_watch(self.fd, wd)
+                self._drop(wd)
+                lost = True
+            elif mask & IN_IGNORED:
+                # the folder was deleted or unmounted, its watch is gone
+                lost |= wd in self._folders
+                self._drop(wd)
+            elif (folder := self._folders.get(wd)) is not None and name:
+                changes.add(folder / os.fsdecode(name))
+        return None if lost else changes
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class _Poller:
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self._folders: set[Path] = set()
+        self._snapshot: dict[Path, tuple[int, int]] = {}
+
+    def _scan(self) -> dict[Path, tuple[int, int]]:
+        snapshot: dict[Path, tuple[int, int]] = {}
+        for folder in self._folders:
+            try:
+                entries = list(os.scandir(folder))
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                snapshot[Path(entry.path)] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def watch(self, folders: set[Path]) -> None:
+        self._folders = folders
+        self._snapshot = self._scan()
+
+    def read(self, timeout: float | None) -> set[Path] | None:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            snapshot = self._scan()
+            changes = {
+                path
+                for path in snapshot.keys() | self._snapshot.keys()
+                if snapshot.get(path) != self._snapshot.get(path)
+            }
+            self._snapshot = snapshot
+            if changes:
+                return changes
+            if deadline is not None and (remaining := deadline - time.monotonic()) <= 0:
+                return changes
+            time.sleep(self.interval if deadline is None else min(self.interval, remaining))
+
+
+class FileWatcher:
+    """Waits for changes to a set of files and folders.
+
+    Folders are watched for changes to any of their entries, not recursively. A watched folder
+    that is missing, deleted or moved away is watched again once it exists. Changes are
+    debounced: once something changed, waiting goes on until nothing changed for `debounce`
+    seconds, so an editor saving a file in several steps gives a single change.
+
+    :param debounce: quiet time in seconds after the last change
+    :param poll_interval: time in seconds between two scans when polling, or between two
+        attempts to watch a missing folder with inotify
+    :param use_inotify: use inotify where available, otherwise poll the modification times
+    """
+
+    def __init__(self, debounce: float = 0.3, poll_interval: float = 0.5, use_inotify: bool = True) -> None:
+        self.debounce = debounce
+        self.files: set[Path] = set()
+        self.folders: set[Path] = set()
+        self._backend: _Inotify | _Poller
+        try:
+            if not use_inotify or not sys.platform.startswith("linux"):
+                raise OSError("inotify is not used")
+            self._backend = _Inotify(poll_interval)
+        except OSError:
+            self._backend = _Poller(poll_interval)
+
+    @property
+    def method(self) -> str:
+        return "inotify" if isinstance(self._backend, _Inotify) else "polling"
+
+    def watch(self, files: Iterable[Path], folders: Iterable[Path] = ()) -> None:
+        """Replace the watched files and folders."""
+        self.files = {Path(os.path.abspath(path)) for path in files}
+        self.folders = {Path(os.path.abspath(path)) for path in folders}
+        self._backend.watch(self.folders | {path.parent for path in self.files})
+
+    def _relevant(self, changes: set[Path] | None) -> set[Path]:
+        if changes is None:
+            # events were lost, assume everything changed
+            return self.files | self.folders
+        return {path for path in changes if path in self.files or path.parent in self.folders}
+
+    def wait(self, timeout: float | None = None) -> set[Path]:
+        """Wait for changes to the watched files or to the entries of the watched folders.
+
+        :param timeout: seconds to wait for a first change, forever if None
+        :return: the changed paths, empty on timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        changes: set[Path] = set()
+        while not changes:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return changes
+            changes = self._relevant(self._backend.read(remaining))
+        quiet_until = time.monotonic() + self.debounce
+        while (remaining := quiet_until - time.monotonic()) > 0:
+            if more := self._relevant(self._backend.read(remaining)):
+                changes |= more
+                quiet_until = time.monotonic() + self.debounce
+        return changes
+
+    def close(self) -> None:
+        if isinstance(self._backend, _Inotify):
+            self._backend.close()
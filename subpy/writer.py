@@ -1,37 +1,115 @@
+import io
 import re
+from collections.abc import Iterable, Iterator
 from pathlib import Path
+from typing import IO, Union
+
+from ass_parser import AssEvent
+from ass_parser.ass_sections import AssEventList
+from ass_parser.util import escape_ass_tag, ms_to_ass_timestamp
 
 from .extended_ass import ExtendedAssFile
+from .profiling import traced
 
 __all__ = ("write_ass",)
 bubblesub_time_re = re.compile(r"{TIME:(?P<start>-?\d+),(?P<end>-?\d+)}", re.MULTILINE)
+# Characters str.splitlines() breaks on, the old writer split the events section with it
+line_break_re = re.compile(r"[\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]")
+EVENTS_FORMAT = "Format: Layer,Start,End,Style,Name,MarginL,MarginR,MarginV,Effect,Text"
+
+
+def produce_event_line(event: AssEvent) -> str:
+    """Serialize an event like AssEventList does, without the {TIME:...} tag."""
+    text = event.text
+    if event.note:
+        text += "{NOTE:%s}" % escape_ass_tag(event.note.replace("\n", "\\N"))
+    values = (
+        str(event.layer),
+        ms_to_ass_timestamp(event.start),
+        ms_to_ass_timestamp(event.end),
+        str(event.style_name),
+        str(event.actor),
+        str(event.margin_left),
+        str(event.margin_right),
+        str(event.margin_vertical),
+        str(event.effect),
+    )
+    return (
+        ("Comment: " if event.is_comment else "Dialogue: ")
+        + ",".join(value.replace(",", ";") for value in values)
+        + ","
+        + text
+    )
+
+
+def produce_events_lines(events: AssEventList) -> Iterator[str]:
+    yield f"[{events.name}]"
+    if len(events):
+        yield EVENTS_FORMAT
+        yield from map(produce_event_line, events)
+
+
+def write_lines(fp: IO[str], lines: Iterable[str], strip_time: bool = False) -> None:
+    """Write section lines one by one, like "\\n".join(lines).rstrip() + "\\n" would.
+
+    :param fp: text stream to write to
+    :param lines: section lines, none of them blank
+    :param strip_time: remove {TIME:...} tags, splitting lines like str.splitlines() does
+    """
+    iterator = iter(lines)
+    line = next(iterator)
+    while True:
+        next_line = next(iterator, None)
+        is_last = next_line is None
+        if is_last:
+            line = line.rstrip()
+        if strip_time:
+            if line_break_re.search(line):
+                line = "\n".join((line if is_last else line + "\n").splitlines())
+            if "{TIME:" in line:
+                line = bubblesub_time_re.sub("", line)
+        fp.write(line)
+        fp.write("\n")
+        if is_last:
+            return
+        line = next_line
+
+
+def produce_script_info_lines(ass_data: ExtendedAssFile) -> Iterator[str]:
+    for to_write in ass_data.script_info.produce_ass_lines():
+        yield to_write
+        if to_write.startswith("["):
+            yield "; Script generated by SubPy for Aegisub"
+            yield "; Aegisub: http://www.aegisub.org/"
+
+
+def write_ass_stream(ass_data: ExtendedAssFile, fp: IO[str]) -> None:
+    # BOM header since sometimes it fuckes UTF-8 up
+    fp.write("\ufeff")
+    write_lines(fp, produce_script_info_lines(ass_data))
+    fp.write("\n")
+    write_lines(fp, ass_data.project_garbage.produce_ass_lines())
+    fp.write("\n")
+    write_lines(fp, ass_data.styles.produce_ass_lines())
+    fp.write("\n")
+    write_lines(fp, produce_events_lines(ass_data.events), strip_time=True)
+    for section in ass_data.extra_sections:
+        fp.write("\n")
+        write_lines(fp, section.produce_ass_lines())
 
 
-def rewrite_events_list(events_str: str):
-    # Remove the {TIME:...} tags
-    new_events = []
-    for line in events_str.splitlines():
-        new_events.append(bubblesub_time_re.sub("", line))
-    return "\n".join(new_events)
-
-
-def write_ass(ass_data: ExtendedAssFile, path: Path) -> None:
-    """Write an ASS file to disk."""
-    with path.open("w", encoding="utf-8") as fp:
-        # BOM header since sometimes it fuckes UTF-8 up
-        fp.write("\ufeff")
-        script_info: list[str] = []
-        for to_write in ass_data.script_info.produce_ass_lines():
-            if to_write.startswith("["):
-                script_info.append(to_write)
-                script_info.append("; Script generated by SubPy for Aegisub")
-                script_info.append("; Aegisub: http://www.aegisub.org/")
-                continue
-            script_info.append(to_write)
-        fp.write("\n".join(script_info).rstrip() + "\n\n")
-        fp.write(ass_data.project_garbage.to_ass_string().rstrip() + "\n\n")
-        fp.write(ass_data.styles.to_ass_string().rstrip() + "\n\n")
-        fp.write(rewrite_events_list(ass_data.events.to_ass_string().rstrip()) + "\n")
-        for section in ass_data.extra_sections:
-            fp.write("\n")
-            fp.write(section.to_ass_string().rstrip() + "\n")
+@traced()
+def write_ass(ass_data: ExtendedAssFile, target: Union[Path, IO[str], IO[bytes]]) -> None:
+    """Write an ASS file to disk or to an open text or binary stream."""
+    if isinstance(target, Path):
+        with target.open("w", encoding="utf-8") as fp:
+            write_ass_stream(ass_data, fp)
+    elif isinstance(target, io.TextIOBase) or hasattr(target, "encoding"):
+        write_ass_stream(ass_data, target)  # type: ignore[arg-type]
+    else:
+        fp = io.TextIOWrapper(target, encoding="utf-8", newline="")  # type: ignore[arg-type]
+        try:
+            write_ass_stream(ass_data, fp)
+            fp.flush()
+        finally:
+            fp.detach()
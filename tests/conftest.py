@@ -0,0 +1,29 @@
+"""Fixtures shared by the tests, built with the generators of the benchmark corpus."""
+from pathlib import Path
+
+import pytest
+
+from benchmarks.corpus import (
+    generate_dialog_script,
+    generate_font_folder,
+    generate_kfx_script,
+    generate_styles_script,
+)
+
+
+@pytest.fixture(scope="session")
+def corpus_scripts() -> dict[str, str]:
+    """A small script of every kind in the benchmark corpus, by name."""
+    return {
+        "dialog": generate_dialog_script(300),
+        "kfx": generate_kfx_script(2_000),
+        "styles": generate_styles_script(100),
+    }
+
+
+@pytest.fixture(scope="session")
+def corpus_fonts(tmp_path_factory) -> Path:
+    """Folder of the fonts of two families of the benchmark corpus, Bench Sans 00 and Bench Sans 01."""
+    folder = tmp_path_factory.mktemp("fonts")
+    generate_font_folder(folder, families=2)
+    return folder
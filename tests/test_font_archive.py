@@ -0,0 +1,68 @@
+import os
+import zipfile
+
+import pytest
+
+from subpy.font_archive import FontArchiveStore, write_font_archive
+
+
+@pytest.fixture
+def fonts(tmp_path):
+    folder = tmp_path / "fonts"
+    folder.mkdir()
+    paths = []
+    for index, name in enumerate(["b.ttf", "a.otf", "é.ttf"]):
+        path = folder / name
+        path.write_bytes(os.urandom(1000) + bytes(20_000 * (index + 1)))
+        paths.append(path)
+    return paths
+
+
+def read_members(path) -> dict[str, bytes]:
+    with zipfile.ZipFile(path) as zf:
+        assert zf.testzip() is None
+        return {info.filename: zf.read(info) for info in zf.infolist()}
+
+
+def test_write_font_archive(tmp_path, fonts):
+    store = FontArchiveStore(tmp_path / "store")
+    first, second = tmp_path / "first.zip", tmp_path / "second.zip"
+    write_font_archive(first, fonts, store, comment=b"fonts")
+    write_font_archive(second, fonts, store, comment=b"fonts")
+
+    assert first.read_bytes() == second.read_bytes()
+    assert read_members(first) == {font.name: font.read_bytes() for font in fonts}
+    with zipfile.ZipFile(first) as zf:
+        assert [info.filename for info in zf.infolist()] == ["a.otf", "b.ttf", "é.ttf"]
+        assert zf.comment == b"fonts"
+
+
+class EvictingStore(FontArchiveStore):
+    """Store whose entries are evicted by another build right after they are returned."""
+
+    def entries(self, *args, **kwargs):
+        entries = super().entries(*args, **kwargs)
+        self.clear()
+        return entries
+
+
+def test_write_font_archive_restores_evicted_entries(tmp_path, fonts):
+    expected = tmp_path / "expected.zip"
+    write_font_archive(expected, fonts, FontArchiveStore(tmp_path / "expected"))
+
+    target = tmp_path / "evicted.zip"
+    write_font_archive(target, fonts, EvictingStore(tmp_path / "store"))
+
+    assert target.read_bytes() == expected.read_bytes()
+
+
+def test_evict_least_recently_used(tmp_path, fonts):
+    store = FontArchiveStore(tmp_path / "store")
+    entries = store.entries(fonts, ["0", "1", "2"], 6)
+    for age, entry in enumerate(reversed(entries)):
+        os.utime(entry.path, (1_000_000 - age, 1_000_000 - age))
+
+    store.max_size = entries[1].path.stat().st_size + entries[2].path.stat().st_size
+    store.evict()
+
+    assert [entry.path.exists() for entry in entries] == [False, True, True]
@@ -0,0 +1,64 @@
+import os
+import shutil
+
+import pytest
+
+from subpy.font_cache import FontCache
+from subpy.fonts import find_fonts
+
+
+@pytest.fixture
+def font_folder(corpus_fonts, tmp_path):
+    folder = tmp_path / "fonts"
+    shutil.copytree(corpus_fonts, folder)
+    return folder
+
+
+def coverage(collection):
+    return {(font.fontfile, font.font_number): font.codepoints for font in collection.fonts}
+
+
+def test_lazy_entries_are_a_miss_without_lazy(font_folder, tmp_path):
+    with FontCache(tmp_path / "fonts.sqlite3") as cache:
+        lazy, font_files = find_fonts(font_folder, cache, lazy=True, jobs=1)
+        assert all(font.info.lazy for font in lazy.fonts)
+        fontfile = str(font_files[0])
+        assert cache.load(fontfile) is None
+        assert cache.load(fontfile, lazy=True) is not None
+
+        eager, _ = find_fonts(font_folder, cache, jobs=1)
+        assert not any(font.info.lazy for font in eager.fonts)
+        infos, error = cache.load(fontfile)
+        assert error is None and not any(info.lazy for info in infos)
+
+
+def test_store_loaded_coverage(font_folder, tmp_path):
+    with FontCache(tmp_path / "fonts.sqlite3") as cache:
+        collection, font_files = find_fonts(font_folder, cache, lazy=True, jobs=1)
+        assert collection.loaded_coverage() == []
+        used = collection.fonts[0]
+        codepoints = used.codepoints
+        assert codepoints
+        assert collection.loaded_coverage() == [used.fontfile]
+        assert collection.store_coverage(cache) == 1
+        assert collection.loaded_coverage() == []
+        assert collection.store_coverage(cache) == 0
+
+        (info,), _ = cache.load(used.fontfile)
+        assert info.codepoints == codepoints
+        # the other fonts are still lazy, a lazy run reads the stored coverage
+        again, _ = find_fonts(font_folder, cache, lazy=True, jobs=1)
+        assert [font.info.lazy for font in again.fonts] == [font.fontfile != used.fontfile for font in again.fonts]
+        assert coverage(again)[used.fontfile, 0] == codepoints
+        assert coverage(again) == coverage(find_fonts(font_folder, jobs=1)[0])
+
+
+def test_store_coverage_skips_changed_files(font_folder, tmp_path):
+    with FontCache(tmp_path / "fonts.sqlite3") as cache:
+        collection, _ = find_fonts(font_folder, cache, lazy=True, jobs=1)
+        used = collection.fonts[0]
+        assert used.codepoints
+        stat = os.stat(used.fontfile)
+        os.utime(used.fontfile, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        assert collection.store_coverage(cache) == 0
+        assert cache.load(used.fontfile) is None
@@ -0,0 +1,48 @@
+from fontTools.ttLib import TTFont
+
+from benchmarks.corpus import script_text, style_line
+from subpy.analysis import analyze_script
+from subpy.font_subset import FontSubsetCache, subset_fonts
+from subpy.fonts import FontValidator, find_fonts
+from subpy.reader import read_ass
+
+# a drawing followed by text, part of it in a font only used on this line
+MIXED_LINE = (
+    r"Dialogue: 0,0:00:00.00,0:00:01.00,Default,,0,0,0,," r"{\p1}m 0 0 l 100 0 100 100{\p0}Sign {\fnBench Sans 01}ab"
+)
+
+
+def mixed_script():
+    return read_ass(script_text([style_line("Default", "Bench Sans 00")], [MIXED_LINE], "Mixed"))
+
+
+def test_font_usage_keeps_text_of_lines_with_drawings(corpus_fonts):
+    fonts, _ = find_fonts(corpus_fonts, jobs=1)
+    doc = mixed_script()
+    validator = FontValidator(doc, fonts)
+    analyze_script(doc, [validator], default_visitors=())
+
+    usage = {
+        (font_name, font.fontfile.rsplit("/", 1)[-1]): chars
+        for (font_name, font), chars in validator.font_usage().items()
+    }
+    assert usage == {
+        ("bench sans 00", "BenchSans00-Regular.ttf"): set("Sign "),
+        ("bench sans 01", "BenchSans01-Regular.ttf"): set("ab"),
+    }
+    # the line is still left out of the warnings
+    assert not any(validator.report.values())
+
+
+def test_subset_fonts_of_lines_with_drawings(corpus_fonts, tmp_path):
+    fonts, _ = find_fonts(corpus_fonts, jobs=1)
+    doc = mixed_script()
+    validator = FontValidator(doc, fonts)
+    analyze_script(doc, [validator], default_visitors=())
+
+    subset_doc, subset_files = subset_fonts(doc, validator.font_usage(), FontSubsetCache(tmp_path))
+
+    assert len(subset_files) == 2
+    cmaps = [set(TTFont(str(path))["cmap"].getBestCmap()) for path in subset_files]
+    assert {ord(char) for char in "Sign ab"} <= set().union(*cmaps)
+    assert r"\p1" in subset_doc.events[0].text
@@ -0,0 +1,90 @@
+import os
+import re
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from benchmarks.corpus import generate_dialog_script, generate_kfx_script
+
+ROOT = Path(__file__).parent.parent
+# only the packing commands may pull these in
+HEAVY_MODULES = ("fontTools", "pymkv", "concurrent.futures")
+PACKING_MODULES = ("subpy.fonts", "subpy.font_cache", "subpy.font_subset", "subpy.font_archive", "subpy.matroska")
+# cumulative `import main` time, importing fontTools and pymkv eagerly about doubles it and goes over.
+# Raise it with SUBPY_IMPORT_BUDGET_MS on slow machines.
+IMPORT_BUDGET_US = int(os.environ.get("SUBPY_IMPORT_BUDGET_MS", "250")) * 1000
+IMPORT_TIME_RE = re.compile(r"^import time:\s+\d+ \|\s+(\d+) \| ( *)(\S+)$", re.MULTILINE)
+
+CHECK_MODULES = """
+import sys
+loaded = [name for name in {modules!r} if name in sys.modules]
+assert not loaded, f"imported {{loaded}}"
+"""
+RUN_MAIN = """
+import runpy, sys
+sys.argv = ["main.py", *{argv!r}]
+try:
+    runpy.run_path("main.py", run_name="__main__")
+except SystemExit as exc:
+    assert not exc.code, exc.code
+"""
+
+PROPERTIES = """basename: "Show - "
+subsfolder: "{EPISODE}"
+subs:
+  dialog: "{subsfolder}/dialog.ass"
+  ts: "{subsfolder}/ts.ass"
+merge:
+  1: [dialog, ts]
+"""
+
+
+def run_python(code: str, cwd: Path = ROOT, *options: str) -> subprocess.CompletedProcess:
+    env = {**os.environ, "PYTHONPATH": str(ROOT)}
+    return subprocess.run([sys.executable, *options, "-c", code], cwd=cwd, env=env, capture_output=True, text=True)
+
+
+@pytest.mark.parametrize("argv", [None, ["merge", "--help"]], ids=["import", "merge-help"])
+def test_main_skips_heavy_imports(argv):
+    code = "import main" if argv is None else RUN_MAIN.format(argv=argv)
+    result = run_python(code + CHECK_MODULES.format(modules=HEAVY_MODULES + PACKING_MODULES))
+    assert result.returncode == 0, result.stderr
+
+
+def test_merge_skips_heavy_imports(tmp_path):
+    shutil.copy(ROOT / "main.py", tmp_path / "main.py")
+    (tmp_path / "properties.yaml").write_text(PROPERTIES)
+    (tmp_path / "01").mkdir()
+    (tmp_path / "01" / "dialog.ass").write_text(generate_dialog_script(50), encoding="utf-8")
+    (tmp_path / "01" / "ts.ass").write_text(generate_kfx_script(50), encoding="utf-8")
+
+    code = RUN_MAIN.format(argv=["merge", "1"]) + CHECK_MODULES.format(modules=HEAVY_MODULES + PACKING_MODULES)
+    result = run_python(code, tmp_path)
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert (tmp_path / "final" / "Show - 01.merged.ass").is_file()
+
+
+def import_times(output: str) -> list[tuple[int, str]]:
+    """Cumulative time in microseconds and name of the modules in -X importtime output, nested ones indented."""
+    return [(int(cumulative), indent + name) for cumulative, indent, name in IMPORT_TIME_RE.findall(output)]
+
+
+def main_time(times: list[tuple[int, str]]) -> int:
+    return next(time for time, name in times if name == "main")
+
+
+def test_import_time_budget():
+    runs = []
+    for _ in range(5):
+        result = run_python("import main", ROOT, "-X", "importtime")
+        assert result.returncode == 0, result.stderr
+        runs.append(import_times(result.stderr))
+    # the fastest run is the least noisy one
+    times = min(runs, key=main_time)
+    summary = "\n".join(f"{time / 1000:8.1f}ms {name}" for time, name in sorted(times, reverse=True)[:15])
+    assert main_time(times) <= IMPORT_BUDGET_US, f"import main took {main_time(times) / 1000:.1f}ms:\n{summary}"
+    heavy = [name for _, name in times if name.strip().startswith(HEAVY_MODULES)]
+    assert not heavy, f"import main imported {heavy}"
@@ -0,0 +1,73 @@
+import dataclasses
+
+import pytest
+from ass_parser import CorruptAssLineError
+
+from subpy import lazy_ass
+from subpy.lazy_ass import LazyAssEventList
+from subpy.reader import read_ass
+
+EXTRA_EVENTS = [
+    r"Dialogue: 0,0:00:01.00,0:00:02.00,Default,,0,0,0,,{TIME:1004,2009}precise{NOTE:a\Nnote}",
+    r"Comment: 1,0:00:03.00,0:00:04.00,Default,,0,0,0,,{TIME:9999,4001}not refined",
+]
+
+
+def event_values(ass_file) -> list[tuple]:
+    return [
+        tuple(getattr(event, field.name) for field in dataclasses.fields(event) if not field.name.startswith("_"))
+        for event in ass_file.events
+    ]
+
+
+@pytest.fixture(params=["dialog", "kfx", "styles"])
+def script(request, corpus_scripts) -> str:
+    # the corpus scripts end with the events section
+    return corpus_scripts[request.param].rstrip("\n") + "\n" + "\n".join(EXTRA_EVENTS) + "\n"
+
+
+@pytest.mark.parametrize(
+    "encode",
+    [
+        pytest.param(lambda text: text.encode("utf-8"), id="lf"),
+        pytest.param(lambda text: ("\N{BOM}" + text).encode("utf-8"), id="bom"),
+        pytest.param(lambda text: text.replace("\n", "\r\n").encode("utf-8"), id="crlf"),
+        pytest.param(lambda text: text.replace("\n", "\r").encode("utf-8"), id="cr"),
+    ],
+)
+@pytest.mark.parametrize("copy_size", [lazy_ass.COPY_SIZE, 0], ids=["copied", "mapped"])
+def test_lazy_events_equal_eager_events(tmp_path, monkeypatch, script, encode, copy_size):
+    monkeypatch.setattr(lazy_ass, "COPY_SIZE", copy_size)
+    path = tmp_path / "script.ass"
+    path.write_bytes(encode(script))
+
+    eager = read_ass(path)
+    lazy = read_ass(path, lazy=True)
+
+    assert event_values(lazy) == event_values(eager)
+    assert [event.index for event in lazy.events] == list(range(len(eager.events)))
+    assert dict(lazy.script_info.items()) == dict(eager.script_info.items())
+    assert [style.name for style in lazy.styles] == [style.name for style in eager.styles]
+
+
+def test_lazy_events_are_parsed_on_access(tmp_path, corpus_scripts):
+    path = tmp_path / "script.ass"
+    path.write_text(corpus_scripts["dialog"], encoding="utf-8")
+
+    events = read_ass(path, lazy=True).events
+    assert isinstance(events, LazyAssEventList)
+    assert events.materialized == 0
+    assert events[-1].parent is events
+    assert events.materialized == 1
+
+
+def test_lazy_corrupt_event_is_reported_on_access(tmp_path, corpus_scripts):
+    path = tmp_path / "script.ass"
+    path.write_text(corpus_scripts["dialog"] + "Dialogue: 0,bad\n", encoding="utf-8")
+    with pytest.raises(CorruptAssLineError) as expected:
+        read_ass(path)
+
+    events = read_ass(path, lazy=True).events
+    with pytest.raises(CorruptAssLineError) as error:
+        events[-1]
+    assert str(error.value) == str(expected.value)
@@ -0,0 +1,248 @@
+import dataclasses
+import struct
+from pathlib import Path
+
+import pytest
+from ass_parser.util import ms_to_ass_timestamp
+
+from subpy.chapters import get_chapters_from_ass
+from subpy.matroska import write_mks
+from subpy.reader import read_ass
+from subpy.writer import EVENTS_FORMAT
+
+# Element IDs of the elements checked below, see https://www.matroska.org/technical/elements.html
+EBML = 0x1A45DFA3
+DOC_TYPE = 0x4282
+SEGMENT = 0x18538067
+SEEK_HEAD = 0x114D9B74
+SEEK = 0x4DBB
+SEEK_ID = 0x53AB
+SEEK_POSITION = 0x53AC
+INFO = 0x1549A966
+TITLE = 0x7BA9
+DURATION = 0x4489
+TRACKS = 0x1654AE6B
+TRACK_ENTRY = 0xAE
+TRACK_NUMBER = 0xD7
+TRACK_NAME = 0x536E
+LANGUAGE = 0x22B59C
+CODEC_ID = 0x86
+CODEC_PRIVATE = 0x63A2
+CLUSTER = 0x1F43B675
+CLUSTER_TIMESTAMP = 0xE7
+BLOCK_GROUP = 0xA0
+BLOCK = 0xA1
+BLOCK_DURATION = 0x9B
+CUES = 0x1C53BB6B
+CUE_POINT = 0xBB
+CUE_TIME = 0xB3
+CUE_TRACK_POSITIONS = 0xB7
+CUE_CLUSTER_POSITION = 0xF1
+CHAPTERS = 0x1043A770
+EDITION_ENTRY = 0x45B9
+CHAPTER_ATOM = 0xB6
+CHAPTER_TIME_START = 0x91
+CHAPTER_DISPLAY = 0x80
+CHAP_STRING = 0x85
+ATTACHMENTS = 0x1941A469
+ATTACHED_FILE = 0x61A7
+FILE_NAME = 0x466E
+FILE_MEDIA_TYPE = 0x4660
+FILE_DATA = 0x465C
+
+
+@dataclasses.dataclass
+class Element:
+    """An EBML element of `data`, with its payload at data[start:end]."""
+
+    id: int
+    offset: int
+    start: int
+    end: int
+    data: bytes
+
+    @property
+    def payload(self) -> bytes:
+        return self.data[self.start : self.end]
+
+    def children(self) -> list["Element"]:
+        return read_elements(self.data, self.start, self.end)
+
+    def child(self, element_id: int) -> "Element":
+        (child,) = self.all(element_id)
+        return child
+
+    def all(self, element_id: int) -> list["Element"]:
+        return [child for child in self.children() if child.id == element_id]
+
+    def uint(self) -> int:
+        return int.from_bytes(self.payload, "big")
+
+    def text(self) -> str:
+        return self.payload.decode("utf-8")
+
+
+def read_vint(data: bytes, position: int, keep_marker: bool) -> tuple[int, int]:
+    """Read an EBML variable size integer, returns its value and the position after it."""
+    length = 9 - data[position].bit_length()
+    value = int.from_bytes(data[position : position + length], "big")
+    if not keep_marker:
+        value &= (1 << (7 * length)) - 1
+    return value, position + length
+
+
+def read_elements(data: bytes, start: int, end: int) -> list[Element]:
+    elements = []
+    position = start
+    while position < end:
+        element_id, payload_start = read_vint(data, position, keep_marker=True)
+        size, payload_start = read_vint(data, payload_start, keep_marker=False)
+        elements.append(Element(element_id, position, payload_start, payload_start + size, data))
+        position = payload_start + size
+    assert position == end
+    return elements
+
+
+def read_mks(path: Path) -> tuple[Element, Element]:
+    data = path.read_bytes()
+    header, segment = read_elements(data, 0, len(data))
+    assert (header.id, segment.id) == (EBML, SEGMENT)
+    return header, segment
+
+
+@pytest.fixture
+def script(corpus_scripts):
+    ass_file = read_ass(corpus_scripts["dialog"])
+    # a note, a negative start and a comma in a field exercise the block data
+    ass_file.events[1].note = "a note"
+    ass_file.events[2].start = -500
+    ass_file.events[3].actor = "one, two"
+    return ass_file
+
+
+@pytest.fixture
+def attachments(tmp_path):
+    fonts = []
+    for name, data in [("Font.ttf", b"\x00\x01\x00\x00ttf" * 100), ("Other.otf", b"OTTO" * 1000), ("x.bin", b"x")]:
+        path = tmp_path / name
+        path.write_bytes(data)
+        fonts.append(path)
+    return fonts
+
+
+def test_write_mks_round_trip(tmp_path, script, attachments):
+    chapters = list(get_chapters_from_ass(script).values())
+    target = tmp_path / "out.mks"
+    write_mks(target, script, chapters, attachments, title="Title", track_name="Track", language="ind")
+    header, segment = read_mks(target)
+    assert header.child(DOC_TYPE).text() == "matroska"
+
+    # every SeekHead position points at the top-level element it names
+    top_level = {element.offset - segment.start: element for element in segment.children()}
+    seeks = {
+        int.from_bytes(seek.child(SEEK_ID).payload, "big"): seek.child(SEEK_POSITION).uint()
+        for seek in segment.child(SEEK_HEAD).all(SEEK)
+    }
+    assert set(seeks) == {INFO, TRACKS, CHAPTERS, ATTACHMENTS, CUES}
+    for element_id, position in seeks.items():
+        assert top_level[position].id == element_id
+
+    info = segment.child(INFO)
+    assert info.child(TITLE).text() == "Title"
+    events = [event for event in script.events if not event.is_comment]
+    assert struct.unpack(">d", info.child(DURATION).payload)[0] == max(event.end for event in events)
+
+    track = segment.child(TRACKS).child(TRACK_ENTRY)
+    assert track.child(TRACK_NUMBER).uint() == 1
+    assert track.child(CODEC_ID).text() == "S_TEXT/ASS"
+    assert track.child(LANGUAGE).text() == "ind"
+    assert track.child(TRACK_NAME).text() == "Track"
+
+    atoms = segment.child(CHAPTERS).child(EDITION_ENTRY).all(CHAPTER_ATOM)
+    assert [
+        (atom.child(CHAPTER_DISPLAY).child(CHAP_STRING).text(), atom.child(CHAPTER_TIME_START).uint() // 1_000_000)
+        for atom in atoms
+    ] == [(chapter.name, chapter.milisecond) for chapter in chapters]
+
+    assert [
+        (
+            attached.child(FILE_NAME).text(),
+            attached.child(FILE_MEDIA_TYPE).text(),
+            attached.child(FILE_DATA).payload,
+        )
+        for attached in segment.child(ATTACHMENTS).all(ATTACHED_FILE)
+    ] == [
+        ("Font.ttf", "font/ttf", attachments[0].read_bytes()),
+        ("Other.otf", "font/otf", attachments[1].read_bytes()),
+        ("x.bin", "application/octet-stream", b"x"),
+    ]
+
+    # every cue points at a cluster starting at the cue time
+    clusters = {element.offset - segment.start: element for element in segment.all(CLUSTER)}
+    assert len(clusters) > 1
+    cue_points = segment.child(CUES).all(CUE_POINT)
+    assert [
+        (cue.child(CUE_TIME).uint(), cue.child(CUE_TRACK_POSITIONS).child(CUE_CLUSTER_POSITION).uint())
+        for cue in cue_points
+    ] == [(cluster.child(CLUSTER_TIMESTAMP).uint(), position) for position, cluster in clusters.items()]
+
+    # the script rebuilt from the codec private data and the blocks has the events of the input
+    lines: list[tuple[int, str]] = []
+    for cluster in clusters.values():
+        cluster_start = cluster.child(CLUSTER_TIMESTAMP).uint()
+        for group in cluster.all(BLOCK_GROUP):
+            block = group.child(BLOCK).payload
+            track_number, position = read_vint(block, 0, keep_marker=False)
+            assert track_number == 1
+            (offset,) = struct.unpack_from(">h", block, position)
+            start = cluster_start + offset
+            end = start + group.child(BLOCK_DURATION).uint()
+            read_order, layer, fields = block[position + 3 :].decode("utf-8").split(",", 2)
+            timestamps = f"{ms_to_ass_timestamp(start)},{ms_to_ass_timestamp(end)}"
+            lines.append((int(read_order), f"Dialogue: {layer},{timestamps},{fields}"))
+    codec_private = track.child(CODEC_PRIVATE).text()
+    assert codec_private.startswith("[Script Info]\n")
+    assert codec_private.endswith(f"\n[Events]\n{EVENTS_FORMAT}\n")
+    rebuilt = read_ass(codec_private + "\n".join(line for _, line in sorted(lines)) + "\n")
+
+    assert [style.name for style in rebuilt.styles] == [style.name for style in script.styles]
+    assert dict(rebuilt.script_info.items()) == dict(script.script_info.items())
+    expected_events = [
+        (
+            max(event.start, 0),
+            event.end,
+            event.style_name,
+            event.actor.replace(",", ";"),
+            event.text,
+            event.note,
+            event.layer,
+        )
+        for event in events
+    ]
+    assert [
+        (event.start, event.end, event.style_name, event.actor, event.text, event.note, event.layer)
+        for event in rebuilt.events
+    ] == expected_events
+
+
+def test_write_mks_without_extras(tmp_path, script):
+    target = tmp_path / "out.mks"
+    write_mks(target, script)
+    _, segment = read_mks(target)
+    seeks = {int.from_bytes(seek.child(SEEK_ID).payload, "big") for seek in segment.child(SEEK_HEAD).all(SEEK)}
+    assert seeks == {INFO, TRACKS, CUES}
+    assert not segment.all(CHAPTERS) and not segment.all(ATTACHMENTS)
+
+
+def test_write_mks_clamps_negative_duration(tmp_path):
+    script = read_ass(
+        "[Script Info]\nScriptType: v4.00+\n\n[Events]\n"
+        "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text\n"
+        "Dialogue: 0,0:00:05.00,0:00:04.00,Default,,0,0,0,,Ends before it starts\n"
+    )
+    target = tmp_path / "out.mks"
+    write_mks(target, script)
+    _, segment = read_mks(target)
+    cluster = segment.child(CLUSTER)
+    assert cluster.child(CLUSTER_TIMESTAMP).uint() == 5000
+    assert cluster.child(BLOCK_GROUP).child(BLOCK_DURATION).uint() == 0
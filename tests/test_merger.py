@@ -0,0 +1,249 @@
+import io
+import random
+import re
+from copy import copy
+
+import pytest
+from ass_parser import AssEvent
+
+from benchmarks.corpus import generate_dialog_script, generate_kfx_script, generate_styles_script
+from subpy.extended_ass import ExtendedAssFile
+from subpy.merger import fmt_style, merge_ass_and_sync, merge_many, parse_sync_timestamp, split_leading_comments
+from subpy.reader import read_ass
+from subpy.utils import event_values
+from subpy.writer import write_ass
+
+RESET_TAG = re.compile(r"\\r[^\\}]*")
+KEEP_STYLES = {"dedupestyles": False}
+
+
+def reference_merge_ass_and_sync(
+    target: ExtendedAssFile,
+    source: ExtendedAssFile,
+    target_sync: int | str | None = None,
+    bump_layer: int = 0,
+    number: int = 1,
+    *,
+    config: dict | None = None,
+):
+    """merge_ass_and_sync before it was made linear, except for the order of the copied styles.
+
+    The used styles were copied in set order, which changes between runs. They are copied in first-use order here.
+    """
+    config = config or {}
+    # Parse sync time, and convert it to milliseconds
+    target_s: int | None = None
+    source_s: int | None = None
+    if target_sync is not None:
+        if isinstance(target_sync, int):
+            target_s = target_sync
+        else:
+            target_s = parse_sync_timestamp(target_sync)
+        for line in source.events:
+            if line.effect != "sync":
+                continue
+            source_s = line.start  # the sync point at the source file
+
+    # Calculate the difference between the two sync times
+    diff = 0
+    if target_s is not None and source_s is not None:
+        diff = target_s - source_s
+    comment_start_idx = 0
+    comment_found_at = -1
+    for i, line in enumerate(target.events):
+        if i == 0 and not line.is_comment:  # No comment at top of the file
+            break
+        # Check if comment and the found_at is not set
+        if line.is_comment and comment_found_at == -1:
+            comment_found_at = i
+            continue
+        # Check if comment and the jump between the comment is not 1
+        # If true, break loop
+        if line.is_comment and comment_found_at != -1:
+            if i - comment_found_at != 1:
+                break
+            comment_found_at = i
+    if comment_found_at != -1:
+        comment_start_idx = comment_found_at
+    used_styles: dict[str, None] = {}
+    conf_skip_templater = config.get("yeettemplater", False)
+    comments_set: list[AssEvent] = []
+    for line in source.events:  # iter the source events
+        efx = line.effect
+        lx = copy(line)
+        if diff != 0:
+            lx.start = lx.start + diff
+            lx.end = lx.end + diff
+        lx.layer += bump_layer
+        # Append to target
+        if (
+            efx.startswith("code ")
+            or efx.startswith("template ")
+            or efx.startswith("mixin ")
+            and conf_skip_templater
+            and lx.is_comment
+        ):
+            # yeet out template
+            lx.set_text("{template has been removed, please see the original file}")
+            lx.effect = ""
+            lx.actor = "kfx-templater"
+        if (sgs := source.styles.get_by_name(lx.style_name)) is None:
+            raise ValueError(f"Style {lx.style_name} not found in source file")
+        used_styles[lx.style_name] = None
+        lx.style_name = fmt_style(lx.style_name, number)
+        if line.is_comment and line.effect != "sync":
+            comments_set.append(lx)
+        else:
+            target.events.append(lx)
+    for comment in comments_set:
+        target.events.insert(comment_start_idx, comment)
+        comment_start_idx += 1
+    # copy style
+    for style in used_styles:
+        if (sgs := source.styles.get_by_name(style)) is not None:
+            sgs_cp = copy(sgs)
+            sgs_cp.name = fmt_style(sgs_cp.name, number)
+            target.styles.append(sgs_cp)
+
+
+def dump(ass_file: ExtendedAssFile) -> str:
+    output = io.StringIO()
+    write_ass(ass_file, output)
+    return output.getvalue()
+
+
+@pytest.fixture(scope="module")
+def scripts() -> dict[str, str]:
+    # smaller than the shared corpus, the reference inserts events one by one.
+    # \r references are renamed by the merge since dedupestyles, see test_reset_tags_and_duplicate_styles
+    return {
+        "dialog": RESET_TAG.sub("", generate_dialog_script(200)),
+        "kfx": RESET_TAG.sub("", generate_kfx_script(600)),
+        "styles": RESET_TAG.sub("", generate_styles_script(60)),
+    }
+
+
+MERGES = [
+    pytest.param("dialog", [("kfx", None, 0)], id="dialog+kfx"),
+    pytest.param("dialog", [("kfx", 90_000, 50), ("styles", "0:01:00.500", 0)], id="dialog+kfx+styles-synced"),
+    pytest.param("styles", [("dialog", "0:00:10.000", 50), ("kfx", 1234, 0)], id="styles+dialog+kfx"),
+    pytest.param("kfx", [("kfx", None, 0), ("dialog", 5_000, 10)], id="kfx+kfx+dialog"),
+]
+
+
+@pytest.mark.parametrize("yeettemplater", [False, True])
+@pytest.mark.parametrize("target_name, sources", MERGES)
+def test_merge_ass_and_sync_matches_reference(scripts, target_name, sources, yeettemplater):
+    config = {**KEEP_STYLES, "yeettemplater": yeettemplater}
+    expected = read_ass(scripts[target_name])
+    merged = read_ass(scripts[target_name])
+    for number, (source_name, target_sync, bump_layer) in enumerate(sources, start=1):
+        reference_merge_ass_and_sync(
+            expected, read_ass(scripts[source_name]), target_sync, bump_layer, number, config=config
+        )
+        merge_ass_and_sync(merged, read_ass(scripts[source_name]), target_sync, bump_layer, number, config=config)
+    assert dump(merged) == dump(expected)
+
+
+@pytest.mark.parametrize("target_name, sources", MERGES)
+def test_merge_many_matches_reference(scripts, target_name, sources):
+    expected = read_ass(scripts[target_name])
+    for number, (source_name, target_sync, bump_layer) in enumerate(sources, start=1):
+        reference_merge_ass_and_sync(
+            expected, read_ass(scripts[source_name]), target_sync, bump_layer, number, config=KEEP_STYLES
+        )
+    merged = read_ass(scripts[target_name])
+    merge_many(
+        merged,
+        [(read_ass(scripts[source_name]), target_sync, bump_layer) for source_name, target_sync, bump_layer in sources],
+        config=KEEP_STYLES,
+    )
+    assert dump(merged) == dump(expected)
+
+
+@pytest.mark.parametrize("target_name, sources", MERGES)
+def test_merge_many_sort_by_start(scripts, target_name, sources):
+    def read_shuffled(name: str) -> ExtendedAssFile:
+        ass_file = read_ass(scripts[name])
+        events = list(ass_file.events)
+        random.Random(name).shuffle(events)
+        ass_file.events.clear()
+        ass_file.events.extend(events)
+        return ass_file
+
+    merged = {}
+    for sort_by_start in (False, True):
+        merged[sort_by_start] = read_shuffled(target_name)
+        merge_many(
+            merged[sort_by_start],
+            [(read_shuffled(name), target_sync, bump_layer) for name, target_sync, bump_layer in sources],
+            config=KEEP_STYLES,
+            sort_by_start=sort_by_start,
+        )
+    head, rest = split_leading_comments(merged[False].events)
+    expected = head + sorted(rest, key=lambda event: event.start)
+    assert list(map(event_values, merged[True].events)) == list(map(event_values, expected))
+
+
+def test_merge_reports_missing_style_before_changing_target(scripts):
+    source = read_ass(scripts["dialog"])
+    source.events[-1].style_name = "Missing"
+    target = read_ass(scripts["styles"])
+    before = dump(target)
+    with pytest.raises(ValueError, match="Style Missing not found"):
+        merge_ass_and_sync(target, source)
+    assert dump(target) == before
+
+
+STYLE_FORMAT = (
+    "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, "
+    "Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, "
+    "MarginR, MarginV, Encoding"
+)
+EVENT_FORMAT = "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text"
+STYLE_VALUES = "20,&H00FFFFFF,&H000000FF,&H00000000,&H00000000,0,0,0,0,100,100,0,0,1,2,0,2,10,10,10,1"
+
+
+def small_script(styles: dict[str, str], events: list[str]) -> str:
+    return "\n".join(
+        [
+            "[Script Info]",
+            "ScriptType: v4.00+",
+            "",
+            "[V4+ Styles]",
+            STYLE_FORMAT,
+            *(f"Style: {name},{font},{STYLE_VALUES}" for name, font in styles.items()),
+            "",
+            "[Events]",
+            EVENT_FORMAT,
+            *(f"Dialogue: 0,0:00:00.00,0:00:01.00,{line}" for line in events),
+            "",
+        ]
+    )
+
+
+def test_reset_tags_and_duplicate_styles():
+    target_text = small_script({"Default": "Arial", "Sign": "Arial"}, ["Default,,0,0,0,,target"])
+    source_text = small_script(
+        {"Default": "Arial", "Sign": "Impact"},
+        ["Sign,,0,0,0,,{\\rDefault}default {\\blur2\\r Sign}sign {\\rUnknown\\i1}unknown"],
+    )
+
+    # The reference keeps \r pointing at the target's own styles and always copies the used styles
+    expected = read_ass(target_text)
+    reference_merge_ass_and_sync(expected, read_ass(source_text), config=KEEP_STYLES)
+    assert [style.name for style in expected.styles] == ["Default", "Sign", "1$Sign"]
+    assert expected.events[-1].text == "{\\rDefault}default {\\blur2\\r Sign}sign {\\rUnknown\\i1}unknown"
+
+    # \r references follow the renamed styles, references to unknown styles are kept
+    merged = read_ass(target_text)
+    merge_ass_and_sync(merged, read_ass(source_text), config=KEEP_STYLES)
+    assert [style.name for style in merged.styles] == ["Default", "Sign", "1$Sign", "1$Default"]
+    assert merged.events[-1].style_name == "1$Sign"
+    assert merged.events[-1].text == "{\\r1$Default}default {\\blur2\\r 1$Sign}sign {\\rUnknown\\i1}unknown"
+
+    # With dedupestyles, the identical Default of the target is reused and the different Sign is still copied
+    deduped = read_ass(target_text)
+    merge_ass_and_sync(deduped, read_ass(source_text))
+    assert [style.name for style in deduped.styles] == ["Default", "Sign", "1$Sign"]
+    assert deduped.events[-1].text == "{\\rDefault}default {\\blur2\\r 1$Sign}sign {\\rUnknown\\i1}unknown"
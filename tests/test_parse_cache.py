@@ -0,0 +1,57 @@
+import os
+
+import subpy.parse_cache
+import subpy.reader
+from subpy.parse_cache import AssParseCache
+from subpy.reader import read_ass
+from subpy.utils import hash_file
+
+SCRIPT = """[Script Info]
+ScriptType: v4.00+
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+Dialogue: 0,0:00:01.00,0:00:02.00,Default,,0,0,0,,{text}
+"""
+
+
+def test_cache_hit(tmp_path):
+    cache = AssParseCache(tmp_path / "cache")
+    path = tmp_path / "script.ass"
+    path.write_text(SCRIPT.format(text="first"))
+    assert read_ass(path, cache).events[0].text == "first"
+    assert cache.load(path).events[0].text == "first"
+    path.write_text(SCRIPT.format(text="other"))
+    assert cache.load(path) is None
+    assert read_ass(path, cache).events[0].text == "other"
+
+
+def test_save_during_parse(tmp_path, monkeypatch):
+    cache = AssParseCache(tmp_path / "cache")
+    path = tmp_path / "script.ass"
+    path.write_text(SCRIPT.format(text="first"))
+    read = subpy.reader._read_ass
+
+    def read_then_save(source, lazy):
+        ass_file = read(source, lazy)
+        path.write_text(SCRIPT.format(text="saved during the parse"))
+        return ass_file
+
+    monkeypatch.setattr(subpy.reader, "_read_ass", read_then_save)
+    assert read_ass(path, cache).events[0].text == "first"
+    monkeypatch.undo()
+    assert read_ass(path, cache).events[0].text == "saved during the parse"
+
+
+def test_touched_file_is_hashed_once(tmp_path, monkeypatch):
+    cache = AssParseCache(tmp_path / "cache")
+    path = tmp_path / "script.ass"
+    path.write_text(SCRIPT.format(text="first"))
+    read_ass(path, cache)
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    hashed = []
+    monkeypatch.setattr(subpy.parse_cache, "hash_file", lambda p: hashed.append(p) or hash_file(p))
+    assert cache.load(path).events[0].text == "first"
+    assert cache.load(path).events[0].text == "first"
+    assert hashed == [path]
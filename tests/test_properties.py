@@ -0,0 +1,112 @@
+import os
+import pickle
+
+import pytest
+
+import subpy.properties
+from subpy.properties import DirectoryListings, EpisodeProperties, load_properties_document, read_and_parse_properties
+from subpy.utils import hash_file
+
+PROPERTIES = """basename: "Show - "
+subsfolder: "{EPISODE}"
+subs:
+  dialog: "{subsfolder}/dialog.ass"
+  ts: "{subsfolder}/ts*.ass"
+  common:
+    op: "common/op.ass"
+merge:
+  1: [dialog, ts, common.op]
+  2: [dialog, ts]
+syncs:
+  "01":
+    op: {chapter: Opening}
+titles:
+  "02": "Second"
+"""
+
+
+@pytest.fixture
+def project(tmp_path):
+    for name in ("01/dialog.ass", "01/ts1.ass", "01/ts2.ass", "01/ts.txt", "02/dialog.ass", "common/op.ass"):
+        (tmp_path / name).parent.mkdir(exist_ok=True)
+        (tmp_path / name).write_text("")
+    (tmp_path / "properties.yaml").write_text(PROPERTIES)
+    return tmp_path
+
+
+@pytest.mark.parametrize(
+    "pattern", ["*", "*.ass", "ts*.ass", "ts?.ass", "[dt]*", "dialog.ass", "missing.ass", "*.mkv", ".*", "sub"]
+)
+def test_directory_listings_glob(tmp_path, pattern):
+    for name in ("dialog.ass", "ts1.ass", "ts2.ass", "TS3.ass", ".hidden.ass", "notes.txt"):
+        (tmp_path / name).write_text("")
+    (tmp_path / "sub").mkdir()
+    listings = DirectoryListings()
+    assert listings.glob(tmp_path, pattern) == list(tmp_path.glob(pattern))
+    assert listings.glob(tmp_path / "missing", pattern) == list((tmp_path / "missing").glob(pattern))
+
+
+def test_episodes_are_resolved_on_access(project, monkeypatch):
+    resolved = []
+    resolve = EpisodeProperties._resolve
+    monkeypatch.setattr(
+        EpisodeProperties, "_resolve", lambda self, eps, subs: resolved.append(eps) or resolve(self, eps, subs)
+    )
+    properties, pp = read_and_parse_properties(project / "properties.yaml", project)
+    assert list(properties) == ["01", "02"] and len(properties) == 2
+    assert resolved == []
+
+    episode = properties["01"]
+    assert properties["01"] is episode
+    assert resolved == ["01"]
+    assert episode.scripts == {
+        "dialog": [project / "01/dialog.ass"],
+        "ts": list(project.glob("01/ts*.ass")),
+        "op": [project / "common/op.ass"],
+    }
+    assert episode.syncs["op"].chapter == "Opening"
+    assert properties["02"].title == "Second"
+    assert resolved == ["01", "02"]
+    with pytest.raises(KeyError):
+        properties["03"]
+
+
+def count_calls(monkeypatch, name: str) -> list:
+    calls = []
+    function = getattr(subpy.properties, name)
+    monkeypatch.setattr(subpy.properties, name, lambda *args: calls.append(args) or function(*args))
+    return calls
+
+
+def test_properties_cache(project, monkeypatch):
+    yaml_path = project / "properties.yaml"
+    cache_dir = project / "cache"
+    parses = count_calls(monkeypatch, "parse_properties_document")
+    hashes = count_calls(monkeypatch, "hash_file")
+    expected = load_properties_document(yaml_path)
+    assert len(parses) == 1
+
+    assert load_properties_document(yaml_path, cache_dir) == expected
+    assert load_properties_document(yaml_path, cache_dir) == expected
+    assert len(parses) == 2 and len(hashes) == 1
+
+    # touched: hashed once, then the new mtime is known
+    stat = yaml_path.stat()
+    os.utime(yaml_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert load_properties_document(yaml_path, cache_dir) == expected
+    assert load_properties_document(yaml_path, cache_dir) == expected
+    assert len(parses) == 2 and len(hashes) == 2
+
+    # same size and mtime but different contents
+    stat = yaml_path.stat()
+    yaml_path.write_text(PROPERTIES.replace("Second", "Secund"))
+    os.utime(yaml_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2_000_000_000))
+    assert load_properties_document(yaml_path, cache_dir)["titles"]["02"] == "Secund"
+    assert len(parses) == 3
+
+    (entry,) = cache_dir.glob("*.pickle")
+    entry.write_bytes(b"corrupted")
+    assert load_properties_document(yaml_path, cache_dir)["titles"]["02"] == "Secund"
+    assert len(parses) == 4
+    with entry.open("rb") as fp:
+        assert pickle.load(fp)[1:] == (yaml_path.stat().st_size, yaml_path.stat().st_mtime_ns, hash_file(yaml_path))
@@ -0,0 +1,37 @@
+import dataclasses
+import io
+
+import ass_parser
+import pytest
+
+from subpy.reader import read_ass
+
+
+def row_values(row) -> tuple:
+    return tuple(getattr(row, field.name) for field in dataclasses.fields(row) if not field.name.startswith("_"))
+
+
+@pytest.mark.parametrize("name", ["dialog", "kfx", "styles"])
+def test_read_ass_matches_ass_parser(corpus_scripts, name):
+    text = corpus_scripts[name]
+    expected = ass_parser.read_ass(io.StringIO(text))
+    ass_file = read_ass(text)
+
+    assert [row_values(event) for event in ass_file.events] == [row_values(event) for event in expected.events]
+    assert [row_values(style) for style in ass_file.styles] == [row_values(style) for style in expected.styles]
+    assert dict(ass_file.script_info.items()) == dict(expected.script_info.items())
+    # rows inserted at once are indexed and owned like rows appended one by one
+    assert [event.index for event in ass_file.events] == list(range(len(expected.events)))
+    assert all(event.parent is ass_file.events for event in ass_file.events)
+    assert [style.index for style in ass_file.styles] == list(range(len(expected.styles)))
+
+
+def test_read_ass_keeps_corrupt_line_errors():
+    text = (
+        "[Events]\nFormat: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text\nDialogue: 0,bad\n"
+    )
+    with pytest.raises(ass_parser.CorruptAssLineError) as expected:
+        ass_parser.read_ass(io.StringIO(text))
+    with pytest.raises(ass_parser.CorruptAssLineError) as error:
+        read_ass(text)
+    assert str(error.value) == str(expected.value)
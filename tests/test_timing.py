@@ -0,0 +1,138 @@
+from fractions import Fraction
+
+import pytest
+
+from benchmarks.corpus import event_line, script_text, style_line
+from subpy.reader import read_ass
+from subpy.timing import EventColumns, FrameTimes
+
+TIMECODES = "# timecode format v2\n0\n41.708\n83.417\n\n125.125\n166.833\n"
+NTSC = Fraction(24000, 1001)
+
+
+@pytest.fixture
+def timecodes(tmp_path):
+    path = tmp_path / "timecodes.txt"
+    path.write_text(TIMECODES)
+    return FrameTimes.from_timecodes_file(path)
+
+
+def test_frame_times_arguments():
+    with pytest.raises(ValueError):
+        FrameTimes()
+    with pytest.raises(ValueError):
+        FrameTimes(fps=24, timecodes=[0, 42])
+    with pytest.raises(ValueError):
+        FrameTimes(timecodes=[0])
+
+
+def test_fps():
+    frame_times = FrameTimes(fps=NTSC)
+    assert [frame_times.time_at(frame) for frame in (-1, 0, 1, 24)] == [-42, 0, 42, 1001]
+    assert [frame_times.frame_at(ms) for ms in (-1, 0, 41, 42, 1000, 1001)] == [-1, 0, 0, 1, 23, 24]
+    assert frame_times.shift(1010, -24) == 9
+    assert frame_times.shift(9, 24) == 1010
+
+
+def test_timecodes(timecodes):
+    assert list(timecodes.timecodes) == [0, 42, 83, 125, 167]
+    # before the first and after the last timecode, the first and last frame durations carry on
+    assert [timecodes.time_at(frame) for frame in (-2, -1, 0, 4, 5, 7)] == [-84, -42, 0, 167, 209, 293]
+    frames = {-43: -2, -42: -1, -1: -1, 0: 0, 41: 0, 42: 1, 124: 2, 167: 4, 208: 4, 209: 5}
+    assert {ms: timecodes.frame_at(ms) for ms in frames} == frames
+    assert all(timecodes.frame_at(timecodes.time_at(frame)) == frame for frame in range(-5, 10))
+
+
+def test_timecodes_shift(timecodes):
+    assert timecodes.shift(50, 1) == 91
+    assert timecodes.shift(50, -2) == -34
+    assert timecodes.shift(200, 2) == 284
+    assert timecodes.shift(timecodes.shift(50, 3), -3) == 50
+
+
+@pytest.fixture
+def ass_file():
+    return read_ass(
+        script_text(
+            [style_line("Default", "Bench Sans 00"), style_line("Sign", "Bench Sans 01")],
+            [
+                event_line(0, 0, "Default", "comment", effect="note"),
+                event_line(1000, 2000, "Default", "first", layer=1),
+                event_line(1500, 3000, "Sign", "sign", layer=2),
+                event_line(4000, 5000, "Default", "last"),
+            ],
+            "Timing",
+        )
+    )
+
+
+def timings(ass_file):
+    return [(event.start, event.end, event.layer) for event in ass_file.events]
+
+
+def test_shift_with_mask(ass_file):
+    columns = EventColumns(ass_file.events)
+    columns.shift(500, columns.style_mask("Sign"))
+    columns.shift(-100)
+    columns.commit()
+    assert timings(ass_file) == [(-100, -100, 0), (900, 1900, 1), (1900, 3400, 2), (3900, 4900, 0)]
+
+
+def test_shift_frames_with_mask(ass_file, timecodes):
+    with EventColumns(ass_file.events) as columns:
+        columns.shift_frames(2, timecodes, columns.style_mask("Default"))
+    expected = [
+        (timecodes.shift(start, 2), timecodes.shift(end, 2), layer) if i != 2 else (start, end, layer)
+        for i, (start, end, layer) in enumerate([(0, 0, 0), (1000, 2000, 1), (1500, 3000, 2), (4000, 5000, 0)])
+    ]
+    assert timings(ass_file) == expected
+    assert timings(ass_file)[0] == (83, 83, 0)
+
+
+def test_layers_skip_comments(ass_file):
+    with EventColumns(ass_file.events) as columns:
+        columns.bump_layer(50)
+    assert [layer for _, _, layer in timings(ass_file)] == [0, 51, 52, 50]
+    with EventColumns(ass_file.events) as columns:
+        columns.reset_layer()
+    assert [layer for _, _, layer in timings(ass_file)] == [0, 0, 0, 0]
+
+
+def test_clip(ass_file):
+    with EventColumns(ass_file.events) as columns:
+        assert columns.clip(1800, 4000) == [0, 3]
+    assert timings(ass_file) == [(1800, 1800, 0), (1800, 2000, 1), (1800, 3000, 2), (4000, 4000, 0)]
+
+
+def test_commit_emits_a_single_change(ass_file):
+    changes = []
+    ass_file.events.changed.subscribe(changes.append)
+    ass_file.events.items_modified.subscribe(changes.append)
+    columns = EventColumns(ass_file.events)
+    columns.shift(0)
+    columns.commit()
+    assert changes == []
+    columns.shift(10)
+    columns.bump_layer(1)
+    columns.commit()
+    assert len(changes) == 1
+    assert timings(ass_file)[1] == (1010, 2010, 2)
+    # nothing left to write
+    columns.commit()
+    assert len(changes) == 1
+
+
+def test_commit_checks_the_list(ass_file):
+    columns = EventColumns(ass_file.events)
+    columns.shift(10)
+    del ass_file.events[0]
+    with pytest.raises(RuntimeError):
+        columns.commit()
+
+
+def test_exception_skips_commit(ass_file):
+    with pytest.raises(KeyError):
+        with EventColumns(ass_file.events) as columns:
+            columns.shift(10)
+            raise KeyError
+    assert timings(ass_file)[1] == (1000, 2000, 1)
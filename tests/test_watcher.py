@@ -0,0 +1,70 @@
+import shutil
+
+import pytest
+
+from subpy.watcher import FileWatcher
+
+
+@pytest.fixture(params=["inotify", "polling"])
+def watcher(request):
+    watcher = FileWatcher(debounce=0.05, poll_interval=0.05, use_inotify=request.param == "inotify")
+    if watcher.method != request.param:
+        pytest.skip(f"{request.param} is not available")
+    yield watcher
+    watcher.close()
+
+
+@pytest.fixture
+def folder(tmp_path):
+    folder = tmp_path / "episode"
+    folder.mkdir()
+    (folder / "dialog.ass").write_text("a")
+    return folder
+
+
+def test_wait_times_out(watcher, folder):
+    watcher.watch([folder / "dialog.ass"], [folder])
+    assert watcher.wait(0.2) == set()
+
+
+def test_file_change(watcher, folder, tmp_path):
+    watched = folder / "dialog.ass"
+    other = folder / "other.ass"
+    other.write_text("a")
+    watcher.watch([watched])
+    other.write_text("bb")
+    watched.write_text("bb")
+    # the second write lands within the debounce time
+    watched.write_text("ccc")
+    assert watcher.wait(5) == {watched}
+
+
+def test_folder_entry_change(watcher, folder, tmp_path):
+    (tmp_path / "fonts").mkdir()
+    watcher.watch([], [folder])
+    (tmp_path / "fonts" / "ignored.ttf").write_text("a")
+    (folder / "font.ttf").write_text("a")
+    assert watcher.wait(5) == {folder / "font.ttf"}
+
+
+def test_folder_recreated(watcher, folder):
+    watcher.watch([], [folder])
+    shutil.rmtree(folder)
+    assert watcher.wait(5)
+    folder.mkdir()
+    (folder / "dialog.ass").write_text("b")
+    assert watcher.wait(5)
+    # the recreated folder is watched again
+    (folder / "dialog.ass").write_text("cc")
+    assert watcher.wait(5) == {folder / "dialog.ass"}
+
+
+def test_missing_folder_created(watcher, tmp_path):
+    folder = tmp_path / "later"
+    watcher.watch([], [folder])
+    assert watcher.wait(0.2) == set()
+    folder.mkdir()
+    (folder / "dialog.ass").write_text("a")
+    assert watcher.wait(5)
+    (folder / "dialog.ass").write_text("bb")
+    assert watcher.wait(5) == {folder / "dialog.ass"}
@@ -0,0 +1,74 @@
+import io
+import re
+from pathlib import Path
+
+import pytest
+
+from subpy.extended_ass import ExtendedAssFile
+from subpy.reader import read_ass
+from subpy.writer import write_ass
+
+DATA = Path(__file__).parent / "data"
+# written by the writer before it streamed the sections, see modify
+REFERENCES = {"writer_expected.ass": False, "writer_expected_no_events.ass": True}
+bubblesub_time_re = re.compile(r"{TIME:(?P<start>-?\d+),(?P<end>-?\d+)}", re.MULTILINE)
+
+
+def modify(ass_file: ExtendedAssFile) -> None:
+    """What the reader can't produce from writer_input.ass."""
+    events = ass_file.events
+    events[1].text = "{TIME:1000,2500}" + events[1].text
+    events[3].actor = "one, two"
+    events[4].text += "\rbare CR"
+    events[5].note = "two\nlines"
+    events[6].text += "\r\n"
+    events[-1].text += "{TIME:15000,16000}   "
+
+
+def reference_write_ass(ass_data: ExtendedAssFile) -> str:
+    """write_ass before it streamed the sections, writing to a string."""
+
+    def rewrite_events_list(events_str: str):
+        new_events = []
+        for line in events_str.splitlines():
+            new_events.append(bubblesub_time_re.sub("", line))
+        return "\n".join(new_events)
+
+    fp = io.StringIO()
+    fp.write("\ufeff")
+    script_info: list[str] = []
+    for to_write in ass_data.script_info.produce_ass_lines():
+        if to_write.startswith("["):
+            script_info.append(to_write)
+            script_info.append("; Script generated by SubPy for Aegisub")
+            script_info.append("; Aegisub: http://www.aegisub.org/")
+            continue
+        script_info.append(to_write)
+    fp.write("\n".join(script_info).rstrip() + "\n\n")
+    fp.write(ass_data.project_garbage.to_ass_string().rstrip() + "\n\n")
+    fp.write(ass_data.styles.to_ass_string().rstrip() + "\n\n")
+    fp.write(rewrite_events_list(ass_data.events.to_ass_string().rstrip()) + "\n")
+    for section in ass_data.extra_sections:
+        fp.write("\n")
+        fp.write(section.to_ass_string().rstrip() + "\n")
+    return fp.getvalue()
+
+
+@pytest.mark.parametrize("name, no_events", REFERENCES.items())
+def test_write_ass_matches_stored_reference(tmp_path, name, no_events):
+    ass_file = read_ass(DATA / "writer_input.ass")
+    modify(ass_file)
+    if no_events:
+        ass_file.events.clear()
+    target = tmp_path / "out.ass"
+    write_ass(ass_file, target)
+    assert target.read_bytes() == (DATA / name).read_bytes()
+
+
+@pytest.mark.parametrize("name", ["dialog", "kfx", "styles"])
+def test_write_ass_matches_reference_writer(corpus_scripts, name):
+    ass_file = read_ass(corpus_scripts[name])
+    expected = reference_write_ass(ass_file)
+    binary = io.BytesIO()
+    write_ass(ass_file, binary)
+    assert binary.getvalue().decode("utf-8") == expected